@@ -7,15 +7,21 @@ Este script coordina la ejecución de todos los procesos en el orden correcto:
 3. Carga de dimensiones y hechos en la base de datos postgres dedicada al análisis de ventas y actividad (Data Warehouse) 
 """
 
+import argparse
+import os
 import time
 from pulseras_inteligentes.utils.etl_funcs import configurar_logger, registrar_ejecucion_proceso
 
 # Módulos de ingesta de datos del sistema operacional
 from pulseras_inteligentes.sistema_operacional.ingesta_sensor_mongo.gen_data_scripts import (
     generar_registros_aplicacion,
-    generar_registros_sensores
+    generar_registros_sensores,
+    generar_registros_frecuencia_cardiaca
 )
 
+# Gestión de índices de MongoDB
+from pulseras_inteligentes.sistema_operacional.ingesta_sensor_mongo import indices_mongo
+
 # Módulos ETL del sistema operacional
 from pulseras_inteligentes.sistema_operacional.ingesta_sensor_mongo.etl_scripts import (
     etl_insertar_usuarios
@@ -24,6 +30,7 @@ from pulseras_inteligentes.sistema_operacional.ingesta_sensor_mongo.etl_scripts
 from pulseras_inteligentes.datawarehouse.etl_scripts import (
     etl_cargar_dim_fecha,
     etl_cargar_dim_usuario,
+    etl_actualizar_dim_usuario,
     etl_cargar_hechos_pagos,
     etl_cargar_hechos_actividad
 )
@@ -31,6 +38,10 @@ from pulseras_inteligentes.datawarehouse.etl_scripts import (
 # Configuración del logger para el script principal
 logger = configurar_logger("ETL_PRINCIPAL")
 
+# La generación de frecuencia cardíaca por minuto es opcional: la primera ejecución genera
+# 24 documentos horarios por usuario y día
+GENERAR_FRECUENCIA_CARDIACA = os.getenv("GENERAR_FRECUENCIA_CARDIACA", "false").lower() == "true"
+
 def ejecutar_proceso(nombre, funcion):
     """
     Ejecuta un proceso específico con registro de tiempo y resultado.
@@ -53,16 +64,26 @@ def ejecutar_proceso(nombre, funcion):
         registrar_ejecucion_proceso(nombre, "ERROR", f"Error: {str(e)}, Tiempo: {tiempo_ejecucion}s")
         raise
 
-def main():
+def main(generar_frecuencia_cardiaca=None):
     """
     Función principal que coordina la ejecución de todos los procesos ETL
     siguiendo el flujo definido para el sistema.
+    
+    Args:
+        generar_frecuencia_cardiaca (bool): Si es True, genera también la frecuencia cardíaca
+            por minuto. Si es None se usa GENERAR_FRECUENCIA_CARDIACA.
     """
+    if generar_frecuencia_cardiaca is None:
+        generar_frecuencia_cardiaca = GENERAR_FRECUENCIA_CARDIACA
     logger.info("INICIANDO FLUJO ETL COMPLETO DEL SISTEMA")
     inicio_total = time.time()
     
     try:
         
+        # Los índices de MongoDB se aseguran antes de cualquier carga o consulta (sin explain,
+        # que ejecuta cada consulta frecuente; se obtiene con la línea de comandos de indices_mongo)
+        ejecutar_proceso("ASEGURAR_INDICES_MONGO", lambda: indices_mongo.main(explicar=False))
+        
         # FASE 1: CARGA DE DATOS OPERACIONALES A MONGODB
         logger.info("FASE 1: Carga de datos operacionales de usuarios a MongoDB")
         ejecutar_proceso("ETL_INSERTAR_USUARIOS", etl_insertar_usuarios.main)
@@ -71,12 +92,15 @@ def main():
         logger.info("FASE 2: Generación de datos de sensores y aplicación")
         ejecutar_proceso("GENERAR_REGISTROS_APLICACION", generar_registros_aplicacion.main)
         ejecutar_proceso("GENERAR_REGISTROS_SENSORES", generar_registros_sensores.main)
+        if generar_frecuencia_cardiaca:
+            ejecutar_proceso("GENERAR_REGISTROS_FRECUENCIA_CARDIACA", generar_registros_frecuencia_cardiaca.main)
         
         # FASE 3: CARGA DE DIMENSIONES Y HECHOS EN BASE DE DATOS DE ANÁLISIS DE VENTAS  
         logger.info("FASE 3: Carga de dimensiones y hechos en modelo dimensional de ventas")
-        # Nota: La dimensión fecha es costosa y solo se ejecuta cuando es necesario
+        # Nota: La dimensión fecha solo inserta las fechas faltantes del rango
         ejecutar_proceso("ETL_CARGAR_DIM_FECHA", etl_cargar_dim_fecha.main)
         ejecutar_proceso("ETL_CARGAR_DIM_USUARIO", etl_cargar_dim_usuario.main)
+        ejecutar_proceso("ETL_ACTUALIZAR_DIM_USUARIO", etl_actualizar_dim_usuario.main)
         ejecutar_proceso("ETL_CARGAR_HECHOS_ACTIVIDAD", etl_cargar_hechos_actividad.main)
         ejecutar_proceso("ETL_CARGAR_HECHOS_PAGOS", etl_cargar_hechos_pagos.main)
         
@@ -90,4 +114,8 @@ def main():
         logger.error(f"ERROR EN FLUJO ETL: {str(e)}. Tiempo transcurrido: {tiempo_total} minutos")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    argumentos = argparse.ArgumentParser(description="Flujo ETL completo del sistema de pulseras inteligentes")
+    argumentos.add_argument("--frecuencia-cardiaca", action="store_true", default=None,
+                            help="Genera también la frecuencia cardíaca por minuto (GENERAR_FRECUENCIA_CARDIACA)")
+    args = argumentos.parse_args()
+    main(generar_frecuencia_cardiaca=args.frecuencia_cardiaca)
\ No newline at end of file
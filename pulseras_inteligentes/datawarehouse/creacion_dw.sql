@@ -31,9 +31,73 @@ CREATE TABLE "dim_usuario" (
 	"fecha_nacimiento" DATE NOT NULL
 );
 
+-- Historial de versiones de usuarios (SCD tipo 2), cargado por etl_actualizar_dim_usuario en modo 'hash'
+CREATE TABLE "dim_usuario_historial" (
+	"id_version" SERIAL PRIMARY KEY,
+	"id_usuario" INTEGER NOT NULL,
+	"nombre" VARCHAR(50) NOT NULL,
+	"genero" VARCHAR(50) NOT NULL,
+	"fecha_registro" TIMESTAMP NOT NULL,
+	"fecha_nacimiento" DATE NOT NULL,
+	"hash_fila" CHAR(16) NOT NULL,
+	"valido_desde" TIMESTAMP NOT NULL,
+	"valido_hasta" TIMESTAMP,
+	"es_actual" BOOLEAN NOT NULL DEFAULT TRUE,
+	CONSTRAINT uq_usuario_historial_version UNIQUE ("id_usuario", "valido_desde")
+);
+
+-- Una sola versión vigente por usuario
+CREATE UNIQUE INDEX idx_usuario_historial_actual ON "dim_usuario_historial" ("id_usuario") WHERE "es_actual";
+
+-- Aplica un lote de versiones de usuarios (SCD tipo 2) en una única transacción: cierra la versión
+-- vigente de cada usuario cuyo hash cambió, inserta su nueva versión y actualiza dim_usuario. Si algo
+-- falla no se aplica nada del lote, de modo que ningún usuario queda sin versión vigente. Volver a
+-- aplicar el mismo lote no tiene efecto. Se invoca desde el cliente con rpc('aplicar_versiones_dim_usuario').
+CREATE OR REPLACE FUNCTION aplicar_versiones_dim_usuario(p_versiones JSONB)
+RETURNS INTEGER AS $$
+DECLARE
+    v_insertadas INTEGER;
+BEGIN
+    CREATE TEMP TABLE tmp_versiones ON COMMIT DROP AS
+    SELECT * FROM jsonb_to_recordset(p_versiones) AS v(
+        id_usuario INTEGER, nombre VARCHAR(50), genero VARCHAR(50), fecha_registro TIMESTAMP,
+        fecha_nacimiento DATE, hash_fila CHAR(16), valido_desde TIMESTAMP
+    );
+
+    UPDATE dim_usuario_historial h
+    SET valido_hasta = v.valido_desde, es_actual = FALSE
+    FROM tmp_versiones v
+    WHERE h.id_usuario = v.id_usuario AND h.es_actual AND h.hash_fila <> v.hash_fila;
+
+    INSERT INTO dim_usuario_historial (id_usuario, nombre, genero, fecha_registro, fecha_nacimiento,
+                                       hash_fila, valido_desde, valido_hasta, es_actual)
+    SELECT v.id_usuario, v.nombre, v.genero, v.fecha_registro, v.fecha_nacimiento,
+           v.hash_fila, v.valido_desde, NULL, TRUE
+    FROM tmp_versiones v
+    WHERE NOT EXISTS (
+        SELECT 1 FROM dim_usuario_historial h WHERE h.id_usuario = v.id_usuario AND h.es_actual
+    )
+    ON CONFLICT (id_usuario, valido_desde) DO NOTHING;
+    GET DIAGNOSTICS v_insertadas = ROW_COUNT;
+
+    -- dim_usuario mantiene siempre la versión vigente
+    INSERT INTO dim_usuario (id_usuario, nombre, genero, fecha_registro, fecha_nacimiento)
+    SELECT v.id_usuario, v.nombre, v.genero, v.fecha_registro, v.fecha_nacimiento
+    FROM tmp_versiones v
+    ON CONFLICT (id_usuario) DO UPDATE SET
+        nombre = EXCLUDED.nombre,
+        genero = EXCLUDED.genero,
+        fecha_registro = EXCLUDED.fecha_registro,
+        fecha_nacimiento = EXCLUDED.fecha_nacimiento;
+
+    DROP TABLE tmp_versiones;
+    RETURN v_insertadas;
+END;
+$$ LANGUAGE plpgsql;
+
 CREATE TABLE "dim_fecha" (
 	"id_fecha" SERIAL PRIMARY KEY,
-	"fecha" TIMESTAMP NOT NULL,
+	"fecha" TIMESTAMP NOT NULL UNIQUE,
 	"dia" INTEGER NOT NULL,
 	"mes" INTEGER NOT NULL,
 	"trimestre" INTEGER NOT NULL,
@@ -43,6 +107,7 @@ CREATE TABLE "dim_fecha" (
 
 CREATE TABLE "hechos_pagos" (
 	"id_hecho" SERIAL PRIMARY KEY,
+	"id_pago" INTEGER NOT NULL,
 	"id_usuario" INTEGER NOT NULL,
 	"id_plan" INTEGER NOT NULL,
 	"id_metodo_pago" INTEGER NOT NULL,
@@ -54,7 +119,9 @@ CREATE TABLE "hechos_pagos" (
     CONSTRAINT fk_plan FOREIGN KEY ("id_plan") REFERENCES "dim_plan"("id_plan"),
     CONSTRAINT fk_metodo_pago FOREIGN KEY ("id_metodo_pago") REFERENCES "dim_metodo_pago"("id_metodo_pago"),
     CONSTRAINT fk_estado_pago FOREIGN KEY ("id_estado_pago") REFERENCES "dim_estado_pago"("id_estado"),
-    CONSTRAINT fk_fecha FOREIGN KEY ("id_fecha") REFERENCES "dim_fecha"("id_fecha")
+    CONSTRAINT fk_fecha FOREIGN KEY ("id_fecha") REFERENCES "dim_fecha"("id_fecha"),
+    -- Un hecho por pago de origen: volver a cargar un pago no lo duplica
+    CONSTRAINT uq_hechos_pagos_pago UNIQUE ("id_pago")
 );
 
 CREATE TABLE "hechos_actividad" (
@@ -69,6 +136,38 @@ CREATE TABLE "hechos_actividad" (
 );
 
 
+-- CHECKPOINTS DE LAS CARGAS DE HECHOS
+-- Marca exacta del último registro de origen cargado por cada proceso (ver utils/checkpoints.py)
+CREATE TABLE "etl_checkpoints" (
+    "proceso" TEXT PRIMARY KEY,
+    "ultima_marca_tiempo" TIMESTAMP,        -- Timestamp de origen del último registro
+    "ultimo_id" BIGINT,                     -- Clave numérica del último registro (p. ej. id_pago)
+    "ultima_clave" TEXT,                    -- Desempate entre registros con el mismo timestamp (p. ej. _id de MongoDB)
+    "fecha_actualizacion" TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Avanza el checkpoint de un proceso solo si la nueva marca (marca de tiempo, id, clave) es mayor
+-- que la guardada, en una única sentencia. Se invoca desde el cliente con rpc('avanzar_checkpoint_etl').
+CREATE OR REPLACE FUNCTION avanzar_checkpoint_etl(
+    p_proceso TEXT,
+    p_ultima_marca_tiempo TIMESTAMP DEFAULT NULL,
+    p_ultimo_id BIGINT DEFAULT NULL,
+    p_ultima_clave TEXT DEFAULT NULL
+)
+RETURNS SETOF etl_checkpoints AS $$
+    INSERT INTO etl_checkpoints AS c (proceso, ultima_marca_tiempo, ultimo_id, ultima_clave, fecha_actualizacion)
+    VALUES (p_proceso, p_ultima_marca_tiempo, p_ultimo_id, p_ultima_clave, CURRENT_TIMESTAMP)
+    ON CONFLICT (proceso) DO UPDATE SET
+        ultima_marca_tiempo = GREATEST(c.ultima_marca_tiempo, EXCLUDED.ultima_marca_tiempo),
+        ultimo_id = GREATEST(c.ultimo_id, EXCLUDED.ultimo_id),
+        ultima_clave = EXCLUDED.ultima_clave,
+        fecha_actualizacion = CURRENT_TIMESTAMP
+    WHERE (COALESCE(EXCLUDED.ultima_marca_tiempo, '-infinity'), COALESCE(EXCLUDED.ultimo_id, -1), COALESCE(EXCLUDED.ultima_clave, ''))
+        > (COALESCE(c.ultima_marca_tiempo, '-infinity'), COALESCE(c.ultimo_id, -1), COALESCE(c.ultima_clave, ''))
+    RETURNING c.*;
+$$ LANGUAGE sql;
+
+
 -- TABLA DE LOGS PARA AUDITORÍA
 CREATE TABLE log_eventos (
     "id_log" SERIAL PRIMARY KEY,
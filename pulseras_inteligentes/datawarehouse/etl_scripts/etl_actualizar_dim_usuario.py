@@ -4,10 +4,40 @@ para análisis de negocio.
 
 Este script extrae la información actualizada de usuarios desde la base de datos operacional
 y realiza las actualizaciones pertinentes en la dimensión de usuarios de la base de datos dimensionala.
+
+Admite dos modos de detección de cambios:
+
+- 'log': toma los usuarios con UPDATE en log_eventos de la base operacional y sobrescribe su fila.
+- 'hash': calcula un hash de los atributos seguidos de todos los usuarios de origen y lo compara con
+  el de la versión vigente en dim_usuario_historial. Solo los usuarios cuyo hash cambió se escriben,
+  como una nueva versión (SCD tipo 2) que cierra la anterior en la misma transacción (función
+  aplicar_versiones_dim_usuario); dim_usuario conserva la versión actual.
 """
 
+import argparse
+import hashlib
+import os
+from datetime import datetime
+import pandas as pd
 from pulseras_inteligentes.utils.conexiones_db import conectar_db_transacciones, conectar_DW
 from pulseras_inteligentes.utils.etl_funcs import manejo_errores_proceso, logger
+from pulseras_inteligentes.utils.extraccion_paginada import extraer_paginado, agrupar_en_lotes
+from pulseras_inteligentes.utils.carga_lotes import cargar_por_lotes, TAMANO_LOTE_CARGA_DEFECTO
+from pulseras_inteligentes.utils.reintentos import ejecutar_con_reintentos
+
+# IDs por filtro in_, para no exceder el largo de la URL
+TAMANO_LOTE_IDS = 200
+
+# Modos de detección de cambios
+MODO_LOG = "log"
+MODO_HASH = "hash"
+MODO_ACTUALIZACION_DIM_USUARIO = os.getenv("MODO_ACTUALIZACION_DIM_USUARIO", MODO_LOG)
+
+# Atributos cuyo cambio genera una nueva versión del usuario
+COLUMNAS_SEGUIDAS = ["nombre", "genero", "fecha_registro", "fecha_nacimiento"]
+
+# Separador de los atributos al calcular el hash (carácter de control separador de unidad)
+SEPARADOR_HASH = "\x1f"
 
 
 def extraer_ultima_fecha_actualizacion_dim_usuarios(db_dw):
@@ -66,45 +96,42 @@ def obtener_usuarios_actualizados_por_fecha(db_transacciones, ultima_fecha_actua
         list: Lista de diccionarios con datos de usuarios actualizados.
     """
     try:
-        
-        # Extraer los IDs de usuarios que han sido actualizados
-        respuesta_logs = (
-            db_transacciones.table("log_eventos")
-            .select("clave_primaria")
-            .eq("tabla_afectada", "usuarios")
-            .eq("operacion", "UPDATE")
-            .gt("fecha_operacion", ultima_fecha_actualizacion)
-            .execute()
+        # Extraer los IDs de usuarios que han sido actualizados (paginando por id_log)
+        logs_actualizacion = extraer_paginado(
+            db_transacciones, "log_eventos", "id_log, clave_primaria", clave="id_log",
+            filtros=lambda consulta: consulta.eq("tabla_afectada", "usuarios")
+                                             .eq("operacion", "UPDATE")
+                                             .gt("fecha_operacion", ultima_fecha_actualizacion)
         )
         
-        if not respuesta_logs.data:
+        # Extraer los IDs únicos de usuarios actualizados
+        ids_usuarios_actualizados = sorted({int(log["clave_primaria"]) for log in logs_actualizacion})
+        
+        if not ids_usuarios_actualizados:
             logger.info("No se encontraron usuarios actualizados después de la fecha especificada.")
             return []
         
-        # Extraer los IDs únicos de usuarios actualizados
-        ids_usuarios_actualizados = list(set([
-            int(log["clave_primaria"]) for log in respuesta_logs.data
-        ]))
-        
         logger.info(f"Encontrados {len(ids_usuarios_actualizados)} usuarios con actualizaciones.")
         
-        # Obtener los datos actuales de estos usuarios
-        respuesta_usuarios = (
-            db_transacciones.table("usuarios")
-            .select(
-                """
-                id_usuario,
-                nombre,
-                genero:genero(genero),
-                fecha_registro,
-                fecha_nacimiento
-                """
+        # Obtener los datos actuales de estos usuarios, en lotes de IDs
+        usuarios_actualizados = []
+        for inicio in range(0, len(ids_usuarios_actualizados), TAMANO_LOTE_IDS):
+            respuesta_usuarios = (
+                db_transacciones.table("usuarios")
+                .select(
+                    """
+                    id_usuario,
+                    nombre,
+                    genero:genero(genero),
+                    fecha_registro,
+                    fecha_nacimiento
+                    """
+                )
+                .in_("id_usuario", ids_usuarios_actualizados[inicio:inicio + TAMANO_LOTE_IDS])
+                .execute()
             )
-            .in_("id_usuario", ids_usuarios_actualizados)
-            .execute()
-        )
+            usuarios_actualizados.extend(respuesta_usuarios.data)
         
-        usuarios_actualizados = respuesta_usuarios.data
         logger.info(f"Extraídos {len(usuarios_actualizados)} usuarios actualizados desde la base operacional.")
         return usuarios_actualizados
         
@@ -113,87 +140,286 @@ def obtener_usuarios_actualizados_por_fecha(db_transacciones, ultima_fecha_actua
         return []
 
 
-def actualizar_dim_usuario(db_dw, usuarios_a_actualizar):
+def extraer_ids_existentes_dim_usuario(db_dw, ids_usuarios):
+    """
+    Obtiene cuáles de los IDs indicados existen en la dimensión de usuarios.
+    
+    Args:
+        db_dw: Conexión a la base de datos del Data Warehouse.
+        ids_usuarios (list): IDs de usuario a verificar.
+        
+    Returns:
+        set: IDs de usuario presentes en dim_usuario.
+    """
+    ids_existentes = set()
+    for inicio in range(0, len(ids_usuarios), TAMANO_LOTE_IDS):
+        respuesta = (
+            db_dw.table("dim_usuario")
+            .select("id_usuario")
+            .in_("id_usuario", ids_usuarios[inicio:inicio + TAMANO_LOTE_IDS])
+            .execute()
+        )
+        ids_existentes.update(fila["id_usuario"] for fila in respuesta.data)
+    return ids_existentes
+
+
+def actualizar_dim_usuario(db_dw, usuarios_a_actualizar, tamano_lote=TAMANO_LOTE_CARGA_DEFECTO):
     """
     Actualiza los registros de usuarios en la dimensión de usuarios del Data Warehouse.
     
+    La existencia de los usuarios se verifica para todo el conjunto a la vez y los
+    cambios se aplican con upserts por lotes sobre id_usuario.
+    
     Args:
         db_dw: Conexión a la base de datos del Data Warehouse.
         usuarios_a_actualizar (list): Lista de diccionarios con datos actualizados de usuarios.
+        tamano_lote (int): Número de usuarios por petición.
         
     Returns:
         int: Número de usuarios actualizados correctamente.
     """
-    contador_exito = 0
-    contador_error = 0
+    # Verificar que los usuarios existen en la dimensión antes de actualizar
+    ids_existentes = extraer_ids_existentes_dim_usuario(
+        db_dw, [usuario["id_usuario"] for usuario in usuarios_a_actualizar]
+    )
     
+    filas = []
+    contador_inexistentes = 0
     for usuario in usuarios_a_actualizar:
-        try:
-            # Verificar que el usuario existe en la dimensión antes de actualizar
-            respuesta_verificacion = (
-                db_dw.table("dim_usuario")
-                .select("id_usuario")
-                .eq("id_usuario", usuario["id_usuario"])
-                .execute()
-            )
-            
-            if not respuesta_verificacion.data:
-                logger.warning(f"Usuario ID {usuario['id_usuario']} no existe en dim_usuario. Saltando actualización.")
-                contador_error += 1
-                continue
-            
-            # Realizar la actualización
-            respuesta_actualizacion = (
-                db_dw.table("dim_usuario")
-                .update({
-                    "nombre": usuario["nombre"],
-                    "genero": usuario["genero"]["genero"],
-                    "fecha_registro": usuario["fecha_registro"],
-                    "fecha_nacimiento": usuario["fecha_nacimiento"]
-                })
-                .eq("id_usuario", usuario["id_usuario"])
-                .execute()
-            )
-            
-            if respuesta_actualizacion.data:
-                logger.info(f"Usuario {usuario['nombre']} (ID: {usuario['id_usuario']}) actualizado en dim_usuario.")
-                contador_exito += 1
-            else:
-                logger.warning(f"No se pudo actualizar el usuario {usuario['nombre']} (ID: {usuario['id_usuario']}).")
-                contador_error += 1
-                
-        except Exception as e:
-            logger.error(f"Error al actualizar usuario {usuario.get('nombre', 'Sin nombre')} (ID: {usuario.get('id_usuario', 'Sin ID')}) en dim_usuario: {e}")
-            contador_error += 1
+        if usuario["id_usuario"] not in ids_existentes:
+            logger.warning(f"Usuario ID {usuario['id_usuario']} no existe en dim_usuario. Saltando actualización.")
+            contador_inexistentes += 1
+            continue
+        
+        filas.append({
+            "id_usuario": usuario["id_usuario"],
+            "nombre": usuario["nombre"],
+            "genero": usuario["genero"]["genero"],
+            "fecha_registro": usuario["fecha_registro"],
+            "fecha_nacimiento": usuario["fecha_nacimiento"]
+        })
+    
+    contador_exito, contador_error = cargar_por_lotes(db_dw, "dim_usuario", filas, on_conflict="id_usuario",
+                                                      tamano_lote=tamano_lote)
+    contador_error += contador_inexistentes
     
     logger.info(f"Dimensión Usuarios actualizada: {contador_exito} usuarios actualizados correctamente, {contador_error} errores.")
     return contador_exito
 
 
-def main():
+def normalizar_usuarios(usuarios):
+    """
+    Construye un DataFrame con los atributos seguidos en una representación comparable.
+    
+    Las fechas se llevan a texto ISO sin fracción de segundos y el género embebido de la
+    base operacional ({"genero": ...}) se aplana, de modo que la misma fila produce el
+    mismo hash venga del origen o del Data Warehouse.
+    
+    Args:
+        usuarios (Iterable[dict]): Usuarios con id_usuario y los atributos seguidos.
+        
+    Returns:
+        pd.DataFrame: Columnas id_usuario y COLUMNAS_SEGUIDAS, como texto.
+    """
+    df = pd.DataFrame(list(usuarios), columns=["id_usuario"] + COLUMNAS_SEGUIDAS)
+    df["genero"] = df["genero"].map(lambda genero: genero.get("genero") if isinstance(genero, dict) else genero)
+    df["fecha_registro"] = pd.to_datetime(df["fecha_registro"], format="ISO8601").dt.strftime("%Y-%m-%dT%H:%M:%S")
+    df["fecha_nacimiento"] = pd.to_datetime(df["fecha_nacimiento"], format="ISO8601").dt.strftime("%Y-%m-%d")
+    df[COLUMNAS_SEGUIDAS] = df[COLUMNAS_SEGUIDAS].fillna("").astype(str)
+    df["id_usuario"] = df["id_usuario"].astype("int64")
+    return df
+
+
+def calcular_hash_filas(df):
+    """
+    Calcula el hash de los atributos seguidos de cada fila.
+    
+    El hash se guarda en dim_usuario_historial, por lo que debe ser estable entre versiones de
+    las librerías: se usa BLAKE2b de 8 bytes sobre los atributos unidos por SEPARADOR_HASH.
+    
+    Args:
+        df (pd.DataFrame): Usuarios normalizados con normalizar_usuarios.
+        
+    Returns:
+        pd.Series: Hash de cada fila como texto hexadecimal de 16 caracteres.
+    """
+    hashes = [
+        hashlib.blake2b(SEPARADOR_HASH.join(valores).encode("utf-8"), digest_size=8).hexdigest()
+        for valores in zip(*(df[columna] for columna in COLUMNAS_SEGUIDAS))
+    ]
+    return pd.Series(hashes, index=df.index, dtype=object)
+
+
+def extraer_usuarios_fuente(db_transacciones):
+    """
+    Extrae todos los usuarios de la base operacional con sus atributos seguidos.
+    
+    Args:
+        db_transacciones: Conexión a la base de datos operacional.
+        
+    Returns:
+        pd.DataFrame: Usuarios normalizados con la columna hash_fila.
+    """
+    usuarios = extraer_paginado(
+        db_transacciones,
+        "usuarios",
+        "id_usuario, nombre, genero:genero(genero), fecha_registro, fecha_nacimiento",
+        clave="id_usuario",
+        prefetch=True
+    )
+    df = normalizar_usuarios(usuarios)
+    df["hash_fila"] = calcular_hash_filas(df)
+    return df
+
+
+def extraer_versiones_actuales(db_dw):
+    """
+    Extrae el hash de la versión vigente de cada usuario en dim_usuario_historial.
+    
+    Args:
+        db_dw: Conexión a la base de datos del Data Warehouse.
+        
+    Returns:
+        pd.DataFrame: Columnas id_usuario, id_version y hash_fila.
+    """
+    versiones = extraer_paginado(
+        db_dw,
+        "dim_usuario_historial",
+        "id_version, id_usuario, hash_fila",
+        clave="id_version",
+        filtros=lambda consulta: consulta.eq("es_actual", True),
+        prefetch=True
+    )
+    return pd.DataFrame(list(versiones), columns=["id_version", "id_usuario", "hash_fila"])
+
+
+def detectar_cambios(fuente, actuales):
+    """
+    Compara los hashes de origen con los de las versiones vigentes.
+    
+    Args:
+        fuente (pd.DataFrame): Usuarios de origen con hash_fila.
+        actuales (pd.DataFrame): Versiones vigentes con id_version y hash_fila.
+        
+    Returns:
+        pd.DataFrame: Usuarios nuevos o modificados, con id_version_anterior (NaN si no tenían versión).
+    """
+    comparacion = fuente.merge(
+        actuales.rename(columns={"id_version": "id_version_anterior", "hash_fila": "hash_anterior"}),
+        on="id_usuario",
+        how="left"
+    )
+    return comparacion[comparacion["hash_fila"] != comparacion["hash_anterior"]]
+
+
+def aplicar_versiones_scd2(db_dw, cambios, fecha_proceso, tamano_lote=TAMANO_LOTE_CARGA_DEFECTO):
+    """
+    Escribe las nuevas versiones de los usuarios modificados y cierra las anteriores.
+    
+    Cada lote se aplica con la función aplicar_versiones_dim_usuario del Data Warehouse, que en
+    una sola transacción cierra la versión vigente, inserta la nueva y actualiza dim_usuario. Si
+    un lote falla no se cierra ninguna versión de ese lote, y reintentar el proceso no duplica
+    versiones. La primera versión de un usuario es válida desde su fecha de registro.
+    
+    Args:
+        db_dw: Conexión a la base de datos del Data Warehouse.
+        cambios (pd.DataFrame): Resultado de detectar_cambios.
+        fecha_proceso (str): Fecha de inicio de validez de las versiones de usuarios modificados.
+        tamano_lote (int): Número de usuarios por petición.
+        
+    Returns:
+        int: Número de versiones nuevas cargadas.
+    """
+    modificados = cambios["id_version_anterior"].notna()
+    
+    versiones = cambios[["id_usuario"] + COLUMNAS_SEGUIDAS + ["hash_fila"]].copy()
+    versiones["valido_desde"] = cambios["fecha_registro"].where(~modificados, fecha_proceso)
+    
+    cargadas = 0
+    for lote in agrupar_en_lotes(versiones.to_dict("records"), tamano_lote):
+        respuesta = ejecutar_con_reintentos(
+            lambda: db_dw.rpc("aplicar_versiones_dim_usuario", {"p_versiones": lote}).execute(),
+            "aplicar_versiones_dim_usuario"
+        )
+        cargadas += respuesta.data or 0
+    
+    logger.info(f"Historial de usuarios: {int((~modificados).sum())} usuarios nuevos, "
+                f"{int(modificados.sum())} usuarios modificados, {cargadas} versiones cargadas.")
+    return cargadas
+
+
+def actualizar_dim_usuario_scd2(db_transacciones, db_dw, tamano_lote=TAMANO_LOTE_CARGA_DEFECTO):
+    """
+    Detecta por hash los usuarios modificados y registra sus nuevas versiones.
+    
+    Args:
+        db_transacciones: Conexión a la base de datos operacional.
+        db_dw: Conexión a la base de datos del Data Warehouse.
+        tamano_lote (int): Número de filas por petición.
+        
+    Returns:
+        int: Número de versiones nuevas cargadas.
+    """
+    fecha_proceso = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+    
+    fuente = extraer_usuarios_fuente(db_transacciones)
+    actuales = extraer_versiones_actuales(db_dw)
+    cambios = detectar_cambios(fuente, actuales)
+    
+    logger.info(f"Comparación por hash: {len(fuente)} usuarios de origen, {len(actuales)} versiones vigentes, "
+                f"{len(cambios)} usuarios con cambios.")
+    if cambios.empty:
+        return 0
+    
+    return aplicar_versiones_scd2(db_dw, cambios, fecha_proceso, tamano_lote)
+
+
+def main(modo=None, tamano_lote=TAMANO_LOTE_CARGA_DEFECTO):
     """
     Función principal que coordina el proceso ETL de actualizacion de la dimensión de usuarios.
+    
+    Args:
+        modo (str): 'log' o 'hash'. Si es None se usa MODO_ACTUALIZACION_DIM_USUARIO.
+        tamano_lote (int): Número de filas por petición.
     """
     nombre_proceso = "ETL_ACTUALIZAR_DIM_USUARIO"
+    modo = modo or MODO_ACTUALIZACION_DIM_USUARIO
+    if modo not in (MODO_LOG, MODO_HASH):
+        raise ValueError(f"Modo de actualización desconocido: {modo}")
     
     with manejo_errores_proceso(nombre_proceso):
         # Conexiones a bases de datos
         db_transacciones = conectar_db_transacciones()
         db_dw = conectar_DW()
         
-        # Verificación de la última fecha de inserción
+        if modo == MODO_HASH:
+            versiones_cargadas = actualizar_dim_usuario_scd2(db_transacciones, db_dw, tamano_lote)
+            logger.info(f"{nombre_proceso}: Proceso completado con éxito. {versiones_cargadas} versiones nuevas.")
+            return
+        
+        # Verificación de la última fecha de actualización
         ultima_fecha_actualizacion = extraer_ultima_fecha_actualizacion_dim_usuarios(db_dw)
         
+        # Fecha por defecto si nunca se actualizó la dimensión
+        if not ultima_fecha_actualizacion:
+            ultima_fecha_actualizacion = "2000-01-01T00:00:00Z"
+            logger.info(f"Usando fecha por defecto para primera actualización: {ultima_fecha_actualizacion}")
+        
         # Extraer usuarios actualizados desde la base de datos operacional
         usuarios_actualizados = obtener_usuarios_actualizados_por_fecha(db_transacciones, ultima_fecha_actualizacion)
         
         # Actualización de usuarios en la dimensión
         if usuarios_actualizados:
-            actualizar_dim_usuario(db_dw, usuarios_actualizados)
+            actualizar_dim_usuario(db_dw, usuarios_actualizados, tamano_lote)
             logger.info(f"{nombre_proceso}: Proceso completado con éxito.")
         else:
             logger.info("No hay usuarios para actualizar en la dimensión.")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    argumentos = argparse.ArgumentParser(description="Actualización de la dimensión de usuarios")
+    argumentos.add_argument("--modo", choices=[MODO_LOG, MODO_HASH], default=None,
+                            help="Detección de cambios por log_eventos o por hash con historial SCD2")
+    argumentos.add_argument("--tamano-lote", type=int, default=TAMANO_LOTE_CARGA_DEFECTO, help="Filas por petición")
+    args = argumentos.parse_args()
+    main(modo=args.modo, tamano_lote=args.tamano_lote)
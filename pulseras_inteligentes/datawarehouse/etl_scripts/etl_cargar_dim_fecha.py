@@ -5,16 +5,28 @@ para análisis de ventas.
 Este script genera un rango de fechas para un período específico y las inserta
 en la tabla de dimensión de fechas de la base de datos dimensional, incluyendo atributos
 como día, mes, trimestre y año para facilitar consultas analíticas.
+
+Solo se insertan las fechas del rango que todavía no existen en dim_fecha, mediante
+upserts por lotes, por lo que volver a ejecutarlo con la dimensión completa no escribe nada.
 """
 
+import argparse
 import pandas as pd
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import Optional, Set
 from pulseras_inteligentes.utils.conexiones_db import conectar_DW
 from pulseras_inteligentes.utils.etl_funcs import manejo_errores_proceso, logger
+from pulseras_inteligentes.utils.extraccion_paginada import extraer_paginado
+from pulseras_inteligentes.utils.carga_lotes import cargar_por_lotes
+
+# Número de fechas por petición de upsert
+TAMANO_LOTE_FECHAS = 500
+
+# Primer año de la dimensión por defecto
+ANIO_INICIO_DEFECTO = 2025
 
 
-def generar_fechas_desde_hasta(desde_anio: int, hasta_anio: int) -> List[Dict[str, Any]]:
+def generar_fechas_desde_hasta(desde_anio: int, hasta_anio: int) -> pd.DataFrame:
     """
     Genera un rango de fechas entre los años especificados.
     
@@ -23,75 +35,80 @@ def generar_fechas_desde_hasta(desde_anio: int, hasta_anio: int) -> List[Dict[st
         hasta_anio: Año de fin (inclusive).
         
     Returns:
-        List[Dict[str, Any]]: Lista de diccionarios con datos de fechas y sus atributos.
+        pd.DataFrame: Una fila por fecha con las columnas fecha, dia, mes, trimestre y anio.
     """
     try:
         # Generar fechas diarias para el rango de años
         fechas = pd.date_range(start=f"{desde_anio}-01-01", end=f"{hasta_anio}-12-31", freq="D")
         
-        lista_dict_fechas = []
+        # Atributos calculados por columna para todo el rango
+        dim_fechas = pd.DataFrame({
+            "fecha": fechas,
+            "dia": fechas.day,
+            "mes": fechas.month,
+            "trimestre": fechas.quarter,
+            "anio": fechas.year
+        })
         
-        # Crear diccionario con atributos para cada fecha
-        for fecha in fechas:
-            fecha = fecha.to_pydatetime()
-            
-            lista_dict_fechas.append({
-                "fecha": fecha,
-                "dia": fecha.day,
-                "mes": fecha.month,
-                "trimestre": (fecha.month - 1) // 3 + 1,
-                "anio": fecha.year
-            })
-        
-        logger.info(f"Generadas {len(lista_dict_fechas)} fechas desde {desde_anio} hasta {hasta_anio}")
-        return lista_dict_fechas
+        logger.info(f"Generadas {len(dim_fechas)} fechas desde {desde_anio} hasta {hasta_anio}")
+        return dim_fechas
     except Exception as e:
         logger.error(f"Error al generar fechas: {e}")
         raise
 
 
-def insertar_dim_fecha(db_dw, fechas: List[Dict[str, Any]]) -> int:
+def extraer_fechas_existentes(db_dw, desde_anio: int, hasta_anio: int) -> Set[str]:
     """
-    Inserta fechas en la tabla de dimensión de fecha.
+    Obtiene las fechas del rango que ya existen en la dimensión de fecha.
     
     Args:
         db_dw: Conexión a la base de datos.
-        fechas: Lista de diccionarios con datos de fechas.
+        desde_anio: Año de inicio.
+        hasta_anio: Año de fin (inclusive).
         
     Returns:
-        int: Número de fechas insertadas correctamente.
+        Set[str]: Fechas existentes en formato YYYY-MM-DD.
+    """
+    filas = extraer_paginado(
+        db_dw, "dim_fecha", "id_fecha, fecha", clave="id_fecha",
+        filtros=lambda consulta: consulta.gte("anio", desde_anio).lte("anio", hasta_anio)
+    )
+    fechas_existentes = {fila["fecha"][:10] for fila in filas}
+    logger.info(f"Dimensión Fecha: {len(fechas_existentes)} fechas existentes entre {desde_anio} y {hasta_anio}")
+    return fechas_existentes
+
+
+def insertar_dim_fecha(db_dw, fechas: pd.DataFrame, tamano_lote: int = TAMANO_LOTE_FECHAS) -> int:
     """
-    contador_exito = 0
-    contador_error = 0
+    Inserta fechas en la tabla de dimensión de fecha mediante upserts por lotes.
     
-    for fecha in fechas:
-        try:
-            db_dw.table("dim_fecha").insert(
-                {
-                    "fecha": fecha["fecha"].isoformat(),
-                    "dia": fecha["dia"],
-                    "mes": fecha["mes"],
-                    "trimestre": fecha["trimestre"],
-                    "anio": fecha["anio"]
-                }
-            ).execute()
-            contador_exito += 1
-            
-            # Logging detallado cada 100 fechas para no saturar los logs
-            if contador_exito % 100 == 0:
-                logger.debug(f"Insertadas {contador_exito} fechas hasta ahora")
-                
-        except Exception as e:
-            logger.warning(f"Error al insertar fecha {fecha['fecha'].isoformat()}: {e}")
-            contador_error += 1
+    Las fechas que ya existen (restricción única sobre fecha) se ignoran, por lo que
+    la operación es idempotente.
+    
+    Args:
+        db_dw: Conexión a la base de datos.
+        fechas: DataFrame con las columnas fecha, dia, mes, trimestre y anio.
+        tamano_lote: Número de fechas por petición.
+        
+    Returns:
+        int: Número de fechas enviadas correctamente.
+    """
+    registros = fechas.assign(fecha=fechas["fecha"].dt.strftime("%Y-%m-%dT%H:%M:%S")).to_dict("records")
+    
+    contador_exito, contador_error = cargar_por_lotes(db_dw, "dim_fecha", registros, on_conflict="fecha",
+                                                      tamano_lote=tamano_lote, ignorar_duplicados=True)
     
     logger.info(f"Dimensión Fecha: {contador_exito} fechas insertadas, {contador_error} errores")
     return contador_exito
 
 
-def main():
+def main(desde_anio: int = ANIO_INICIO_DEFECTO, hasta_anio: Optional[int] = None):
     """
     Función principal que coordina la carga de la dimensión de fecha.
+    
+    Args:
+        desde_anio: Año de inicio del rango.
+        hasta_anio: Año de fin del rango, inclusive (por defecto, el año actual).
     """
     nombre_proceso = "ETL_CARGAR_DIM_FECHA"
     
@@ -100,20 +117,27 @@ def main():
         db_dw = conectar_DW()
         
         try:
-            # Definir años para generar fechas (configurables según necesidad)
-            desde_anio = 2025
-            hasta_anio = 2025
+            if hasta_anio is None:
+                hasta_anio = max(desde_anio, datetime.now().year)
             
             logger.info(f"Iniciando carga de dimensión fecha desde {desde_anio} hasta {hasta_anio}")
             
             # Generar fechas para el rango especificado
             fechas = generar_fechas_desde_hasta(desde_anio, hasta_anio)
             
+            # Solo se insertan las fechas que faltan en la dimensión
+            fechas_existentes = extraer_fechas_existentes(db_dw, desde_anio, hasta_anio)
+            faltantes = fechas[~fechas["fecha"].dt.strftime("%Y-%m-%d").isin(fechas_existentes)]
+            
+            if faltantes.empty:
+                logger.info(f"{nombre_proceso}: La dimensión fecha ya está completa para el rango.")
+                return
+            
             # Insertar fechas en la dimensión
-            total_insertadas = insertar_dim_fecha(db_dw, fechas)
+            total_insertadas = insertar_dim_fecha(db_dw, faltantes)
             
             # Resumen final
-            logger.info(f"{nombre_proceso}: Proceso completado con éxito. {total_insertadas} de {len(fechas)} fechas insertadas.")
+            logger.info(f"{nombre_proceso}: Proceso completado con éxito. {total_insertadas} de {len(faltantes)} fechas faltantes insertadas.")
             
         except Exception as e:
             logger.error(f"Error en proceso ETL de dimensión fecha: {e}")
@@ -121,4 +145,8 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    argumentos = argparse.ArgumentParser(description="Carga de la dimensión fecha")
+    argumentos.add_argument("--desde", type=int, default=ANIO_INICIO_DEFECTO, help="Año de inicio")
+    argumentos.add_argument("--hasta", type=int, default=None, help="Año de fin, inclusive (por defecto, el actual)")
+    args = argumentos.parse_args()
+    main(desde_anio=args.desde, hasta_anio=args.hasta)
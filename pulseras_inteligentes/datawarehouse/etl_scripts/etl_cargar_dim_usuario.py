@@ -7,8 +7,11 @@ y la carga en la dimensión de usuarios de la base de datos dimensional, conside
 los usuarios nuevos desde la última carga.
 """
 
+import argparse
 from pulseras_inteligentes.utils.conexiones_db import conectar_db_transacciones, conectar_DW
 from pulseras_inteligentes.utils.etl_funcs import manejo_errores_proceso, logger
+from pulseras_inteligentes.utils.extraccion_paginada import extraer_paginado, TAMANO_PAGINA_DEFECTO
+from pulseras_inteligentes.utils.carga_lotes import cargar_por_lotes, TAMANO_LOTE_CARGA_DEFECTO
 
 def extraer_ultima_fecha_insercion_dim_usuarios(db_dw):
     """
@@ -53,78 +56,75 @@ def extraer_ultima_fecha_insercion_dim_usuarios(db_dw):
         logger.error(f"Error al extraer última fecha de inserción en dim_usuario desde log_eventos: {e}")
         raise
 
-def extraer_usuarios_por_fecha(db_transacciones, fecha_registro):
+def extraer_usuarios_por_fecha(db_transacciones, fecha_registro, tamano_pagina=TAMANO_PAGINA_DEFECTO):
     """
     Extrae usuarios de la base de datos operacional que fueron registrados
     después de la fecha especificada.
     
+    Los usuarios se leen paginando por id_usuario y se entregan como un flujo.
+    
     Args:
         db_transacciones: Conexión a la base de datos operacional.
         fecha_registro (str): Fecha de registro a partir de la cual extraer usuarios.
+        tamano_pagina (int): Número de usuarios por consulta.
         
     Returns:
-        list: Lista de diccionarios con datos de usuarios.
+        Iterator[dict]: Iterador de diccionarios con datos de usuarios.
     """
-    try:
-        respuesta = (
-            db_transacciones.table("usuarios")
-            .select(
-                """
+    return extraer_paginado(
+        db_transacciones,
+        "usuarios",
+        """
                 id_usuario,
                 nombre,
                 genero:genero(genero),
                 fecha_registro,
                 fecha_nacimiento
-                """
-            )
-            .gt("fecha_registro", fecha_registro)
-            .execute()
-        )
-        
-        usuarios = respuesta.data
-        logger.info(f"Extraídos {len(usuarios)} usuarios nuevos desde la base operacional.")
-        return usuarios
-    except Exception as e:
-        logger.error(f"Error al extraer usuarios por fecha: {e}")
-        raise
+                """,
+        clave="id_usuario",
+        filtros=lambda consulta: consulta.gt("fecha_registro", fecha_registro),
+        tamano_pagina=tamano_pagina,
+        prefetch=True
+    )
 
-def insertar_usuarios_dim(db_dw, usuarios):
+def insertar_usuarios_dim(db_dw, usuarios, tamano_lote=TAMANO_LOTE_CARGA_DEFECTO):
     """
     Inserta usuarios en la dimensión de usuarios de la base de datos dimensional.
     
+    Los usuarios se envían en lotes con upsert sobre id_usuario, por lo que una
+    carga interrumpida puede volver a ejecutarse sin duplicar registros.
+    
     Args:
         db_dw: Conexión a la base de datos.
-        usuarios (list): Lista de diccionarios con datos de usuarios a insertar.
+        usuarios (Iterable[dict]): Usuarios a insertar.
+        tamano_lote (int): Número de usuarios por petición.
         
     Returns:
         int: Número de usuarios insertados correctamente.
     """
-    contador_exito = 0
-    contador_error = 0
+    filas = (
+        {
+            "id_usuario": usuario["id_usuario"],
+            "nombre": usuario["nombre"],
+            "genero": usuario["genero"]["genero"],
+            "fecha_registro": usuario["fecha_registro"],
+            "fecha_nacimiento": usuario["fecha_nacimiento"],
+        }
+        for usuario in usuarios
+    )
     
-    for usuario in usuarios:
-        try:
-            db_dw.table("dim_usuario").insert(
-                {
-                    "id_usuario": usuario["id_usuario"],
-                    "nombre": usuario["nombre"],
-                    "genero": usuario["genero"]["genero"],
-                    "fecha_registro": usuario["fecha_registro"],
-                    "fecha_nacimiento": usuario["fecha_nacimiento"],
-                }
-            ).execute()
-            logger.info(f"Usuario {usuario['nombre']} (ID: {usuario['id_usuario']}) insertado en dim_usuario.")
-            contador_exito += 1
-        except Exception as e:
-            logger.error(f"Error al insertar usuario {usuario['nombre']} (ID: {usuario['id_usuario']}) en dim_usuario: {e}")
-            contador_error += 1
+    contador_exito, contador_error = cargar_por_lotes(db_dw, "dim_usuario", filas, on_conflict="id_usuario",
+                                                      tamano_lote=tamano_lote)
     
     logger.info(f"Dimensión Usuarios: {contador_exito} usuarios insertados, {contador_error} errores.")
     return contador_exito
 
-def main():
+def main(tamano_lote=TAMANO_LOTE_CARGA_DEFECTO):
     """
     Función principal que coordina el proceso ETL de carga de la dimensión de usuarios.
+    
+    Args:
+        tamano_lote (int): Número de usuarios por petición de upsert.
     """
     nombre_proceso = "ETL_CARGAR_DIM_USUARIO"
     
@@ -141,15 +141,17 @@ def main():
             ultima_fecha_registro = "2000-01-01T00:00:00Z"
             logger.info(f"Usando fecha por defecto para primera carga: {ultima_fecha_registro}")
         
-        # Extracción de usuarios nuevos
+        # Extracción de usuarios nuevos (flujo paginado)
         usuarios_nuevos = extraer_usuarios_por_fecha(db_transacciones, ultima_fecha_registro)
         
-        # Inserción de usuarios en la dimensión
-        if usuarios_nuevos:
-            insertar_usuarios_dim(db_dw, usuarios_nuevos)
+        # Inserción de usuarios en la dimensión a medida que se extraen
+        if insertar_usuarios_dim(db_dw, usuarios_nuevos, tamano_lote):
             logger.info(f"{nombre_proceso}: Proceso completado con éxito.")
         else:
             logger.info("No hay usuarios nuevos para insertar en la dimensión.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    argumentos = argparse.ArgumentParser(description="Carga de la dimensión de usuarios")
+    argumentos.add_argument("--tamano-lote", type=int, default=TAMANO_LOTE_CARGA_DEFECTO, help="Usuarios por petición")
+    args = argumentos.parse_args()
+    main(tamano_lote=args.tamano_lote)
\ No newline at end of file
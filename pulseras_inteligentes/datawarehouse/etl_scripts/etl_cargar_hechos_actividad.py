@@ -6,20 +6,121 @@ obtiene los IDs correspondientes de la dimensión de actividad y fecha,
 y carga los registros en la tabla de hechos de actividad en el Data Warehouse.
 """
 
-from datetime import datetime
+from datetime import datetime, timezone
+import argparse
+import os
+from bson import ObjectId
 from pulseras_inteligentes.utils.conexiones_db import conectar_db_sensor_pulsera, conectar_DW
+from pulseras_inteligentes.sistema_operacional.ingesta_sensor_mongo.almacenamiento_sensor import (
+    buscar_registros_sensor,
+    etapas_registros_sensor,
+    filtro_posicion,
+    iterar_registros_sensor
+)
 from pulseras_inteligentes.utils.etl_funcs import (
-    extraer_ultima_fecha_insercion_hechos, 
-    obtener_id_fecha, 
-    extraer_hora_fecha,
+    extraer_fechas_y_horas,
+    registrar_estadisticas_fechas,
     manejo_errores_proceso,
     logger
 )
+from pulseras_inteligentes.utils.checkpoints import leer_checkpoint_o_legado, avanzar_checkpoint
+from pulseras_inteligentes.utils.escritor_hechos import EscritorHechos, TAMANO_LOTE_HECHOS_DEFECTO
+from pulseras_inteligentes.utils.cliente_dw_async import EscritorHechosAsync
+from pulseras_inteligentes.utils.cache_dimensiones import obtener_cache_fechas, obtener_cache_dimension
+from pulseras_inteligentes.utils.extraccion_paginada import agrupar_en_lotes
+from pulseras_inteligentes.utils.pipeline_etapas import ejecutar_pipeline
+
+# Tipos de dato de la dimensión de actividad
+TIPO_DATO_BIOMETRICO = "Dato Biométrico"
+TIPO_DATO_APLICACION = "Dato Aplicación"
+
+# Si está activo, las actividades que no existen en dim_actividad se insertan automáticamente
+AUTO_INSERTAR_ACTIVIDADES = os.getenv("AUTO_INSERTAR_ACTIVIDADES", "false").lower() == "true"
+
+# Modos de extracción desde MongoDB:
+# - 'global': un cursor por colección con todos los documentos nuevos, agrupados por usuario en memoria.
+# - 'por_usuario': dos consultas por cada usuario de usuarios_sensor (comportamiento original).
+# - 'agregacion': un único pipeline de agregación que une ambas colecciones ($unionWith, MongoDB 4.4+)
+#   y calcula en el servidor la fecha, la hora y el nombre de la actividad de cada registro.
+MODO_EXTRACCION_GLOBAL = "global"
+MODO_EXTRACCION_POR_USUARIO = "por_usuario"
+MODO_EXTRACCION_AGREGACION = "agregacion"
+MODO_EXTRACCION_ACTIVIDAD = os.getenv("MODO_EXTRACCION_ACTIVIDAD", MODO_EXTRACCION_GLOBAL)
+
+# Número de documentos que se agrupan por usuario a la vez en el modo global
+TAMANO_BLOQUE_EXTRACCION = 5000
+
+# Hilos de carga del pipeline concurrente de extracción, transformación y carga (modos
+# 'global' y 'agregacion'). Con 0 los bloques se procesan en secuencia en el hilo principal.
+CARGADORES_HECHOS_ACTIVIDAD = int(os.getenv("CARGADORES_HECHOS_ACTIVIDAD", "0"))
+
+# Escritor de hechos_actividad:
+# - 'sincrono': EscritorHechos con el cliente de Supabase, una petición a la vez por escritor.
+# - 'asincrono': EscritorHechosAsync, que envía varios lotes a la vez por un pool de conexiones HTTP.
+ESCRITOR_SINCRONO = "sincrono"
+ESCRITOR_ASINCRONO = "asincrono"
+ESCRITOR_HECHOS_ACTIVIDAD = os.getenv("ESCRITOR_HECHOS_ACTIVIDAD", ESCRITOR_SINCRONO)
+
+# Procesos de los checkpoints en etl_checkpoints (timestamp y _id del último documento cargado)
+PROCESO_CHECKPOINT_SENSOR = "ETL_CARGAR_HECHOS_ACTIVIDAD_SENSOR"
+PROCESO_CHECKPOINT_APLICACION = "ETL_CARGAR_HECHOS_ACTIVIDAD_APLICACION"
+
+# Origen de las filas del pipeline de agregación: tipo de dato de la actividad y proceso de su checkpoint
+ORIGEN_SENSOR = "sensor"
+ORIGEN_APLICACION = "aplicacion"
+TIPO_DATO_POR_ORIGEN = {ORIGEN_SENSOR: TIPO_DATO_BIOMETRICO, ORIGEN_APLICACION: TIPO_DATO_APLICACION}
+PROCESO_CHECKPOINT_POR_ORIGEN = {ORIGEN_SENSOR: PROCESO_CHECKPOINT_SENSOR, ORIGEN_APLICACION: PROCESO_CHECKPOINT_APLICACION}
+
+def crear_escritor_actividad(db_dw, tipo_escritor, tamano_lote, al_confirmar=None):
+    """
+    Crea el escritor por lotes de hechos_actividad del tipo indicado.
+    
+    Args:
+        db_dw: Conexión al Data Warehouse (la usa el escritor síncrono).
+        tipo_escritor (str): ESCRITOR_SINCRONO o ESCRITOR_ASINCRONO.
+        tamano_lote (int): Número de hechos por petición de inserción.
+        al_confirmar: Función opcional que recibe cada marca cuyas filas ya se escribieron.
+        
+    Returns:
+        EscritorHechos: Escritor de hechos_actividad.
+    """
+    if tipo_escritor == ESCRITOR_ASINCRONO:
+        return EscritorHechosAsync("hechos_actividad", tamano_lote=tamano_lote, al_confirmar=al_confirmar)
+    return EscritorHechos(db_dw, "hechos_actividad", tamano_lote=tamano_lote, al_confirmar=al_confirmar)
+
+def posicion_desde_checkpoint(checkpoint):
+    """
+    Convierte un checkpoint de etl_checkpoints en la posición de lectura en MongoDB.
+    
+    Args:
+        checkpoint (dict): Checkpoint con ultima_marca_tiempo y ultima_clave.
+        
+    Returns:
+        tuple: Timestamp (datetime) y _id de desempate (o None) del último documento cargado.
+    """
+    marca_tiempo = checkpoint["ultima_marca_tiempo"]
+    if isinstance(marca_tiempo, str):
+        marca_tiempo = datetime.fromisoformat(marca_tiempo.replace("Z", "+00:00"))
+    # MongoDB devuelve los timestamps en UTC sin zona horaria
+    if marca_tiempo.tzinfo is not None:
+        marca_tiempo = marca_tiempo.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    ultima_clave = checkpoint["ultima_clave"]
+    if ultima_clave and ObjectId.is_valid(ultima_clave):
+        ultima_clave = ObjectId(ultima_clave)
+    return marca_tiempo, ultima_clave or None
+
+def marca_documento(documento):
+    """
+    Devuelve la posición (timestamp, _id) de un documento, usada como marca del checkpoint.
+    """
+    return documento["timestamp"], documento.get("_id")
 
 def extraer_actividad_fisica(db_sensor_pulsera, id_usuario, fecha_base):
     """
     Extrae registros de actividad física para un usuario desde MongoDB,
-    posteriores a una fecha determinada.
+    posteriores a una fecha determinada. Funciona con cualquier modo de
+    almacenamiento de datos de sensores (documento, timeseries o buckets).
     
     Args:
         db_sensor_pulsera: Conexión a la base de datos MongoDB.
@@ -30,13 +131,7 @@ def extraer_actividad_fisica(db_sensor_pulsera, id_usuario, fecha_base):
         list: Lista de documentos con datos de actividad física.
     """
     try:
-        datos_db_sensor = db_sensor_pulsera.pulseras_inteligentes.datos_sensor
-        
-        actividades = list(datos_db_sensor.find({
-            "id_usuario": id_usuario,
-            "tipo_registro": "actividad", 
-            "timestamp": {"$gt": fecha_base}
-        }))
+        actividades = buscar_registros_sensor(db_sensor_pulsera, "actividad", fecha_base, id_usuario=id_usuario)
         
         logger.debug(f"Extraídos {len(actividades)} registros de actividad física para usuario {id_usuario}")
         return actividades
@@ -71,131 +166,470 @@ def extraer_actividad_aplicacion(db_sensor_pulsera, id_usuario, fecha_base):
         logger.error(f"Error al extraer actividad de aplicación para usuario {id_usuario}: {e}")
         return []
 
-def obtener_id_actividad(db_dw, nombre_actividad):
+def iterar_actividad_fisica(db_sensor_pulsera, fecha_base, desde_id=None):
     """
-    Obtiene el ID de una actividad desde la dimensión de actividad.
+    Recorre con un único cursor los registros de actividad física de todos los usuarios
+    posteriores a una posición, ordenados por timestamp y _id. Funciona con cualquier modo
+    de almacenamiento de datos de sensores.
+    
+    Args:
+        db_sensor_pulsera: Conexión a la base de datos MongoDB.
+        fecha_base (datetime): Fecha a partir de la cual extraer registros.
+        desde_id: _id de desempate para los registros con timestamp igual a fecha_base (opcional).
+        
+    Returns:
+        Iterator[dict]: Registros con _id, id_usuario, timestamp y datos.tipo_actividad.
+    """
+    return iterar_registros_sensor(
+        db_sensor_pulsera, "actividad", fecha_base, campos_datos=["tipo_actividad"], ordenar=True, desde_id=desde_id
+    )
+
+def iterar_actividad_aplicacion(db_sensor_pulsera, fecha_base, desde_id=None):
+    """
+    Recorre con un único cursor los registros de uso de aplicación de todos los usuarios
+    posteriores a una posición, ordenados por timestamp y _id.
+    
+    Args:
+        db_sensor_pulsera: Conexión a la base de datos MongoDB.
+        fecha_base (datetime): Fecha a partir de la cual extraer registros.
+        desde_id: _id de desempate para los registros con timestamp igual a fecha_base (opcional).
+        
+    Returns:
+        Iterator[dict]: Registros con _id, id_usuario, tipo_evento y timestamp.
+    """
+    datos_db_aplicacion = db_sensor_pulsera.pulseras_inteligentes.datos_aplicacion
+    return datos_db_aplicacion.find(
+        filtro_posicion(fecha_base, desde_id),
+        {"id_usuario": 1, "tipo_evento": 1, "timestamp": 1}
+    ).sort([("timestamp", 1), ("_id", 1)])
+
+def agrupar_por_usuario(documentos):
+    """
+    Agrupa documentos por id_usuario conservando su orden.
+    
+    Args:
+        documentos (Iterable[dict]): Documentos con el campo id_usuario.
+        
+    Returns:
+        dict: ID de usuario -> lista de documentos.
+    """
+    grupos = {}
+    for documento in documentos:
+        grupos.setdefault(documento["id_usuario"], []).append(documento)
+    return grupos
+
+def iterar_bloques_actividad(db_sensor_pulsera, posicion_sensor, posicion_aplicacion, modo_extraccion,
+                             tamano_bloque=TAMANO_BLOQUE_EXTRACCION):
+    """
+    Recorre en bloques la actividad física y de aplicación nueva de todos los usuarios.
+    
+    En el modo 'global' se lee un cursor por colección (primero sensores y luego aplicación);
+    en el modo 'agregacion', un único pipeline de agregación que une ambas colecciones.
+    
+    Args:
+        db_sensor_pulsera: Conexión a la base de datos MongoDB.
+        posicion_sensor (tuple): Timestamp y _id del último documento de sensores cargado.
+        posicion_aplicacion (tuple): Timestamp y _id del último documento de aplicación cargado.
+        modo_extraccion (str): MODO_EXTRACCION_GLOBAL o MODO_EXTRACCION_AGREGACION.
+        tamano_bloque (int): Número de documentos por bloque.
+        
+    Yields:
+        tuple: Origen del bloque (ORIGEN_SENSOR, ORIGEN_APLICACION o None si las filas del
+        pipeline de agregación traen su propio origen) y lista de documentos.
+    """
+    if modo_extraccion == MODO_EXTRACCION_AGREGACION:
+        coleccion, pipeline = pipeline_actividad_agregada(posicion_sensor, posicion_aplicacion)
+        cursor = db_sensor_pulsera.pulseras_inteligentes[coleccion].aggregate(
+            pipeline, allowDiskUse=True, batchSize=tamano_bloque
+        )
+        for bloque in agrupar_en_lotes(cursor, tamano_bloque):
+            yield None, bloque
+        return
+    
+    for bloque in agrupar_en_lotes(iterar_actividad_fisica(db_sensor_pulsera, *posicion_sensor), tamano_bloque):
+        yield ORIGEN_SENSOR, bloque
+    for bloque in agrupar_en_lotes(iterar_actividad_aplicacion(db_sensor_pulsera, *posicion_aplicacion), tamano_bloque):
+        yield ORIGEN_APLICACION, bloque
+
+def transformar_bloque_actividad(db_dw, origen, bloque):
+    """
+    Convierte un bloque de documentos de actividad en filas de hechos_actividad.
+    
+    Los documentos de un cursor por colección se agrupan por usuario en memoria y se
+    transforman con las mismas funciones del modo por usuario; las filas del pipeline de
+    agregación ya traen la fecha y la hora calculadas.
     
     Args:
         db_dw: Conexión al Data Warehouse.
-        nombre_actividad (str): Nombre de la actividad.
+        origen (str): Origen del bloque, o None para filas del pipeline de agregación.
+        bloque (list): Documentos del bloque, ordenados por timestamp y _id dentro de cada origen.
         
     Returns:
-        int: ID de la actividad o None si no se encuentra.
+        dict: Filas de hechos ('hechos'), registros por origen ('contadores') y posición del
+        último documento de cada origen por proceso de checkpoint ('marcas').
+    """
+    if origen is None:
+        hechos, contadores = transformar_filas_agregadas(db_dw, bloque)
+        # Las filas vienen ordenadas por origen: la última de cada origen es su posición más avanzada
+        ultimos = {fila["origen"]: fila for fila in bloque}
+    else:
+        transformar = transformar_actividades_fisicas if origen == ORIGEN_SENSOR else transformar_actividades_aplicacion
+        hechos = []
+        for id_usuario, actividades in agrupar_por_usuario(bloque).items():
+            hechos.extend(transformar(db_dw, actividades, id_usuario))
+        contadores = {origen_bloque: 0 for origen_bloque in TIPO_DATO_POR_ORIGEN}
+        contadores[origen] = len(hechos)
+        ultimos = {origen: bloque[-1]}
+    
+    marcas = {PROCESO_CHECKPOINT_POR_ORIGEN[origen_fila]: marca_documento(documento)
+              for origen_fila, documento in ultimos.items()}
+    return {"hechos": hechos, "contadores": contadores, "marcas": marcas}
+
+def cargar_actividades_por_bloques(db_sensor_pulsera, db_dw, escritor, posicion_sensor, posicion_aplicacion,
+                                   modo_extraccion, tamano_bloque=TAMANO_BLOQUE_EXTRACCION):
+    """
+    Carga la actividad física y de aplicación de todos los usuarios bloque a bloque.
+    
+    El costo de la extracción depende de los documentos nuevos y no del número de usuarios.
+    Al terminar cada bloque se marca en el escritor la posición de su último documento, para
+    avanzar el checkpoint.
+    
+    Args:
+        db_sensor_pulsera: Conexión a la base de datos MongoDB.
+        db_dw: Conexión al Data Warehouse.
+        escritor (EscritorHechos): Escritor por lotes de hechos_actividad.
+        posicion_sensor (tuple): Timestamp y _id del último documento de sensores cargado.
+        posicion_aplicacion (tuple): Timestamp y _id del último documento de aplicación cargado.
+        modo_extraccion (str): MODO_EXTRACCION_GLOBAL o MODO_EXTRACCION_AGREGACION.
+        tamano_bloque (int): Número de documentos agrupados a la vez.
+        
+    Returns:
+        tuple: Registros de actividad física y de aplicación agregados al escritor.
+    """
+    totales = {origen: 0 for origen in TIPO_DATO_POR_ORIGEN}
+    for origen, bloque in iterar_bloques_actividad(
+        db_sensor_pulsera, posicion_sensor, posicion_aplicacion, modo_extraccion, tamano_bloque
+    ):
+        resultado = transformar_bloque_actividad(db_dw, origen, bloque)
+        escritor.agregar_varios(resultado["hechos"])
+        for origen_fila, contador in resultado["contadores"].items():
+            totales[origen_fila] += contador
+        for proceso, marca in resultado["marcas"].items():
+            escritor.marcar(proceso, marca)
+    
+    return totales[ORIGEN_SENSOR], totales[ORIGEN_APLICACION]
+
+def cargar_actividades_pipeline(db_sensor_pulsera, db_dw, posicion_sensor, posicion_aplicacion, modo_extraccion,
+                                tamano_lote, cargadores, tamano_bloque=TAMANO_BLOQUE_EXTRACCION,
+                                tipo_escritor=ESCRITOR_SINCRONO):
+    """
+    Carga la actividad de todos los usuarios con un pipeline concurrente: la lectura de MongoDB,
+    la resolución de fechas y actividades y la escritura se ejecutan en hilos separados.
+    
+    Cada hilo de carga usa su propio escritor y envía cada bloque completo; los checkpoints
+    avanzan en el orden de los bloques, cuando todos los anteriores ya se escribieron.
+    
+    Args:
+        db_sensor_pulsera: Conexión a la base de datos MongoDB.
+        db_dw: Conexión al Data Warehouse.
+        posicion_sensor (tuple): Timestamp y _id del último documento de sensores cargado.
+        posicion_aplicacion (tuple): Timestamp y _id del último documento de aplicación cargado.
+        modo_extraccion (str): MODO_EXTRACCION_GLOBAL o MODO_EXTRACCION_AGREGACION.
+        tamano_lote (int): Número de hechos por petición de inserción.
+        cargadores (int): Número de hilos de carga.
+        tamano_bloque (int): Número de documentos por bloque.
+        tipo_escritor (str): ESCRITOR_SINCRONO o ESCRITOR_ASINCRONO.
+        
+    Returns:
+        tuple: Registros de actividad física y de aplicación agregados y hechos insertados.
     """
+    escritores = [crear_escritor_actividad(db_dw, tipo_escritor, tamano_lote) for _ in range(cargadores)]
+    totales = {origen: 0 for origen in TIPO_DATO_POR_ORIGEN}
+    
+    def cargar(resultado, indice):
+        escritores[indice].agregar_varios(resultado["hechos"])
+        escritores[indice].flush()
+    
+    def confirmar(resultado):
+        for origen, contador in resultado["contadores"].items():
+            totales[origen] += contador
+        for proceso, marca in resultado["marcas"].items():
+            avanzar_checkpoint(db_dw, proceso, ultima_marca_tiempo=marca[0], ultima_clave=marca[1])
+    
     try:
-        respuesta = (
-            db_dw.table("dim_actividad")
-            .select("id_actividad, descripcion")
-            .eq("descripcion", nombre_actividad)
-            .execute()
+        ejecutar_pipeline(
+            iterar_bloques_actividad(db_sensor_pulsera, posicion_sensor, posicion_aplicacion,
+                                     modo_extraccion, tamano_bloque),
+            lambda item: transformar_bloque_actividad(db_dw, *item),
+            cargar,
+            cargadores=cargadores,
+            al_confirmar=confirmar,
+            nombre="hechos_actividad"
         )
+    finally:
+        for escritor in escritores:
+            escritor.cerrar()
+    
+    insertados = sum(escritor.total_insertados for escritor in escritores)
+    return totales[ORIGEN_SENSOR], totales[ORIGEN_APLICACION], insertados
+
+def proyeccion_fila_actividad(campo_actividad, origen):
+    """
+    Etapa $project que deja cada registro listo para la tabla de hechos.
+    
+    Args:
+        campo_actividad (str): Expresión con el nombre de la actividad ('$datos.tipo_actividad' o '$tipo_evento').
+        origen (str): Origen del registro (ORIGEN_SENSOR u ORIGEN_APLICACION).
         
-        if not respuesta.data:
-            logger.warning(f"No se encontró ID para la actividad: {nombre_actividad}")
-            return None
-            
-        id_actividad = respuesta.data[0]['id_actividad']
-        logger.debug(f"ID para actividad '{nombre_actividad}': {id_actividad}")
-        return id_actividad
+    Returns:
+        dict: Etapa con _id, id_usuario, timestamp, origen, actividad, fecha (YYYY-MM-DD) y hora_registro (HH:MM:SS).
+    """
+    return {"$project": {
+        "_id": 1,
+        "id_usuario": 1,
+        "timestamp": 1,
+        "origen": {"$literal": origen},
+        "actividad": campo_actividad,
+        # $dateToString usa UTC, igual que los timestamps que devuelve pymongo
+        "fecha": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+        "hora_registro": {"$dateToString": {"format": "%H:%M:%S", "date": "$timestamp"}},
+    }}
+
+def pipeline_actividad_agregada(posicion_sensor, posicion_aplicacion, modo_almacenamiento=None):
+    """
+    Construye el pipeline de agregación que extrae la actividad física y de aplicación nueva
+    en un único cursor, con las filas ya transformadas para la tabla de hechos.
+    
+    Las lecturas de actividad se toman de la colección del modo de almacenamiento configurado
+    y los eventos de aplicación se agregan con $unionWith. Las filas se ordenan por origen,
+    timestamp y _id para que el último registro de cada bloque sea la posición del checkpoint.
+    
+    Args:
+        posicion_sensor (tuple): Timestamp y _id del último documento de sensores cargado.
+        posicion_aplicacion (tuple): Timestamp y _id del último documento de aplicación cargado.
+        modo_almacenamiento (str): Modo de almacenamiento de sensores (por defecto, el configurado).
+        
+    Returns:
+        tuple: Nombre de la colección sobre la que se ejecuta y lista de etapas.
+    """
+    fecha_sensor, desde_id_sensor = posicion_sensor
+    coleccion, etapas = etapas_registros_sensor(
+        "actividad", fecha_sensor, modo=modo_almacenamiento, desde_id=desde_id_sensor
+    )
+    
+    pipeline = etapas + [
+        proyeccion_fila_actividad("$datos.tipo_actividad", ORIGEN_SENSOR),
+        {"$unionWith": {
+            "coll": "datos_aplicacion",
+            "pipeline": [
+                {"$match": filtro_posicion(*posicion_aplicacion)},
+                proyeccion_fila_actividad("$tipo_evento", ORIGEN_APLICACION),
+            ],
+        }},
+        {"$sort": {"origen": 1, "timestamp": 1, "_id": 1}},
+    ]
+    return coleccion, pipeline
+
+def transformar_filas_agregadas(db_dw, filas):
+    """
+    Convierte filas del pipeline de agregación en filas de hechos_actividad.
+    
+    Las filas ya traen la fecha y la hora calculadas, por lo que solo se resuelven en
+    memoria las claves de fecha y de actividad de todo el bloque.
+    
+    Args:
+        db_dw: Conexión al Data Warehouse.
+        filas (list): Filas con id_usuario, origen, actividad, fecha y hora_registro.
+        
+    Returns:
+        tuple: Filas de hechos y diccionario origen -> número de hechos.
+    """
+    ids_fechas = obtener_cache_fechas(db_dw).obtener_varios(fila["fecha"] for fila in filas)
+    
+    # IDs de actividad resueltos por origen, ya que cada origen tiene su tipo de dato
+    ids_actividades = [None] * len(filas)
+    for origen, tipo_dato in TIPO_DATO_POR_ORIGEN.items():
+        posiciones = [i for i, fila in enumerate(filas) if fila["origen"] == origen]
+        if posiciones:
+            ids = obtener_ids_actividades(db_dw, [filas[i]["actividad"] for i in posiciones], tipo_dato)
+            for i, id_actividad in zip(posiciones, ids):
+                ids_actividades[i] = id_actividad
+    
+    hechos = []
+    contadores = {origen: 0 for origen in TIPO_DATO_POR_ORIGEN}
+    for fila, id_fecha, id_actividad in zip(filas, ids_fechas, ids_actividades):
+        hecho = construir_hecho_actividad(fila["id_usuario"], id_actividad, id_fecha, fila["hora_registro"])
+        if hecho is not None:
+            hechos.append(hecho)
+            contadores[fila["origen"]] += 1
+    
+    return hechos, contadores
+
+def obtener_ids_actividades(db_dw, nombres_actividades, tipo_dato):
+    """
+    Obtiene los IDs de varias actividades desde la dimensión de actividad.
+    
+    La dimensión se mantiene en memoria por conexión; solo se vuelve a consultar si
+    aparece una actividad desconocida. Si AUTO_INSERTAR_ACTIVIDADES está activo, las
+    actividades desconocidas se insertan en un único pedido.
+    
+    Args:
+        db_dw: Conexión al Data Warehouse.
+        nombres_actividades (list): Nombres de las actividades.
+        tipo_dato (str): Tipo de dato de las actividades ('Dato Biométrico' o 'Dato Aplicación').
+        
+    Returns:
+        list: ID de cada actividad, o None si no se encuentra.
+    """
+    try:
+        cache = obtener_cache_dimension(
+            db_dw, "dim_actividad", "descripcion", "id_actividad", auto_insertar=AUTO_INSERTAR_ACTIVIDADES
+        )
+        return cache.obtener_varios(nombres_actividades, {"tipo_dato": tipo_dato})
     except Exception as e:
-        logger.error(f"Error al extraer ID de actividad '{nombre_actividad}': {e}")
-        return None
+        logger.error(f"Error al extraer IDs de actividades: {e}")
+        return [None] * len(nombres_actividades)
 
-def insertar_hecho_actividad(db_dw, id_usuario, id_actividad, id_fecha, hora_registro):
+def obtener_id_actividad(db_dw, nombre_actividad, tipo_dato=TIPO_DATO_BIOMETRICO):
     """
-    Inserta un registro en la tabla de hechos de actividad.
+    Obtiene el ID de una actividad desde la dimensión de actividad.
     
     Args:
         db_dw: Conexión al Data Warehouse.
+        nombre_actividad (str): Nombre de la actividad.
+        tipo_dato (str): Tipo de dato usado si la actividad se inserta automáticamente.
+        
+    Returns:
+        int: ID de la actividad o None si no se encuentra.
+    """
+    return obtener_ids_actividades(db_dw, [nombre_actividad], tipo_dato)[0]
+
+def construir_hecho_actividad(id_usuario, id_actividad, id_fecha, hora_registro):
+    """
+    Construye un registro de la tabla de hechos de actividad.
+    
+    Args:
         id_usuario (int): ID del usuario.
         id_actividad (int): ID de la actividad.
         id_fecha (int): ID de la fecha.
         hora_registro (str): Hora del registro en formato HH:MM:SS.
         
     Returns:
-        bool: True si la inserción fue exitosa, False en caso contrario.
+        dict: Fila de hechos_actividad, o None si faltan datos.
     """
-    try:
-        if not all([id_usuario, id_actividad, id_fecha, hora_registro]):
-            logger.warning(f"Datos incompletos para inserción: usuario={id_usuario}, actividad={id_actividad}, fecha={id_fecha}")
-            return False
-            
-        db_dw.table("hechos_actividad").insert({
-            "id_usuario": id_usuario,
-            "id_actividad": id_actividad,
-            "id_fecha": id_fecha,
-            "hora_registro": hora_registro
-        }).execute()
+    if not all([id_usuario, id_actividad, id_fecha, hora_registro]):
+        logger.warning(f"Datos incompletos para inserción: usuario={id_usuario}, actividad={id_actividad}, fecha={id_fecha}")
+        return None
+    
+    return {
+        "id_usuario": id_usuario,
+        "id_actividad": id_actividad,
+        "id_fecha": id_fecha,
+        "hora_registro": hora_registro
+    }
+
+def transformar_actividades(db_dw, actividades, id_usuario, nombres_actividades, tipo_dato):
+    """
+    Convierte documentos de actividad de un usuario en filas de hechos_actividad.
+    
+    Args:
+        db_dw: Conexión al Data Warehouse.
+        actividades (list): Documentos de actividad con el campo timestamp.
+        id_usuario (int): ID del usuario.
+        nombres_actividades (list): Nombre de la actividad de cada documento.
+        tipo_dato (str): Tipo de dato de las actividades ('Dato Biométrico' o 'Dato Aplicación').
         
-        logger.debug(f"Hecho insertado: usuario={id_usuario}, actividad={id_actividad}, fecha={id_fecha}")
-        return True
-    except Exception as e:
-        logger.error(f"Error al insertar hecho para usuario {id_usuario}: {e}")
-        return False
+    Returns:
+        list: Filas de hechos de los documentos con todos sus datos.
+    """
+    # IDs de actividad resueltos para todo el lote
+    ids_actividades = obtener_ids_actividades(db_dw, nombres_actividades, tipo_dato)
+    
+    # Claves de fecha y horas del lote convertidas de una vez, e IDs de fecha resueltos en memoria
+    claves_fechas, horas = extraer_fechas_y_horas(actividad["timestamp"] for actividad in actividades)
+    ids_fechas = obtener_cache_fechas(db_dw).obtener_varios(claves_fechas)
+    
+    hechos = []
+    for id_actividad, id_fecha, hora_actividad in zip(ids_actividades, ids_fechas, horas):
+        hecho = construir_hecho_actividad(id_usuario, id_actividad, id_fecha, hora_actividad)
+        if hecho is not None:
+            hechos.append(hecho)
+    return hechos
+
+def transformar_actividades_fisicas(db_dw, actividades, id_usuario):
+    """
+    Convierte registros de actividad física de un usuario en filas de hechos_actividad.
+    """
+    return transformar_actividades(
+        db_dw, actividades, id_usuario,
+        [actividad["datos"]["tipo_actividad"] for actividad in actividades], TIPO_DATO_BIOMETRICO
+    )
 
-def procesar_actividades_fisicas(db_dw, actividades, id_usuario):
+def transformar_actividades_aplicacion(db_dw, actividades, id_usuario):
+    """
+    Convierte registros de uso de aplicación de un usuario en filas de hechos_actividad.
+    """
+    return transformar_actividades(
+        db_dw, actividades, id_usuario,
+        [actividad["tipo_evento"] for actividad in actividades], TIPO_DATO_APLICACION
+    )
+
+def procesar_actividades_fisicas(db_dw, escritor, actividades, id_usuario):
     """
     Procesa y carga registros de actividad física en la tabla de hechos.
     
     Args:
         db_dw: Conexión al Data Warehouse.
+        escritor (EscritorHechos): Escritor por lotes de hechos_actividad.
         actividades (list): Lista de documentos con datos de actividad física.
         id_usuario (int): ID del usuario.
         
     Returns:
-        int: Número de registros insertados correctamente.
+        int: Número de registros agregados al escritor.
     """
-    contador = 0
-    
-    for actividad in actividades:
-        # Nombre e ID de la actividad
-        nombre_actividad = actividad["datos"]["tipo_actividad"]
-        id_actividad = obtener_id_actividad(db_dw, nombre_actividad)
-        
-        # ID de fecha y hora de la actividad
-        id_fecha = obtener_id_fecha(db_dw, actividad["timestamp"])
-        hora_actividad = extraer_hora_fecha(actividad["timestamp"])
-        
-        # Inserción del hecho
-        if insertar_hecho_actividad(db_dw, id_usuario, id_actividad, id_fecha, hora_actividad):
-            contador += 1
-    
-    return contador
+    hechos = transformar_actividades_fisicas(db_dw, actividades, id_usuario)
+    escritor.agregar_varios(hechos)
+    return len(hechos)
 
-def procesar_actividades_aplicacion(db_dw, actividades, id_usuario):
+def procesar_actividades_aplicacion(db_dw, escritor, actividades, id_usuario):
     """
     Procesa y carga registros de uso de aplicación en la tabla de hechos.
     
     Args:
         db_dw: Conexión al Data Warehouse.
+        escritor (EscritorHechos): Escritor por lotes de hechos_actividad.
         actividades (list): Lista de documentos con datos de uso de aplicación.
         id_usuario (int): ID del usuario.
         
     Returns:
-        int: Número de registros insertados correctamente.
+        int: Número de registros agregados al escritor.
     """
-    contador = 0
-    
-    for actividad in actividades:
-        # Nombre e ID de la actividad
-        nombre_actividad = actividad["tipo_evento"]
-        id_actividad = obtener_id_actividad(db_dw, nombre_actividad)
-        
-        # ID de fecha y hora de la actividad
-        id_fecha = obtener_id_fecha(db_dw, actividad["timestamp"])
-        hora_actividad = extraer_hora_fecha(actividad["timestamp"])
-        
-        # Inserción del hecho
-        if insertar_hecho_actividad(db_dw, id_usuario, id_actividad, id_fecha, hora_actividad):
-            contador += 1
-    
-    return contador
+    hechos = transformar_actividades_aplicacion(db_dw, actividades, id_usuario)
+    escritor.agregar_varios(hechos)
+    return len(hechos)
 
-def main():
+def main(tamano_lote=TAMANO_LOTE_HECHOS_DEFECTO, modo_extraccion=None, cargadores=None, tipo_escritor=None):
     """
     Función principal que coordina el proceso ETL de carga de hechos de actividad.
+    
+    Args:
+        tamano_lote (int): Número de hechos por petición de inserción.
+        modo_extraccion (str): 'global', 'por_usuario' o 'agregacion'. Si es None se usa MODO_EXTRACCION_ACTIVIDAD.
+        cargadores (int): Hilos de carga del pipeline concurrente; 0 procesa los bloques en
+            secuencia. Si es None se usa CARGADORES_HECHOS_ACTIVIDAD.
+        tipo_escritor (str): 'sincrono' o 'asincrono'. Si es None se usa ESCRITOR_HECHOS_ACTIVIDAD.
     """
     nombre_proceso = "ETL_CARGAR_HECHOS_ACTIVIDAD"
+    modo_extraccion = modo_extraccion or MODO_EXTRACCION_ACTIVIDAD
+    if modo_extraccion not in (MODO_EXTRACCION_GLOBAL, MODO_EXTRACCION_POR_USUARIO, MODO_EXTRACCION_AGREGACION):
+        raise ValueError(f"Modo de extracción desconocido: {modo_extraccion}")
+    tipo_escritor = tipo_escritor or ESCRITOR_HECHOS_ACTIVIDAD
+    if tipo_escritor not in (ESCRITOR_SINCRONO, ESCRITOR_ASINCRONO):
+        raise ValueError(f"Tipo de escritor desconocido: {tipo_escritor}")
+    cargadores = CARGADORES_HECHOS_ACTIVIDAD if cargadores is None else cargadores
+    if cargadores > 0 and modo_extraccion == MODO_EXTRACCION_POR_USUARIO:
+        logger.warning("El modo por_usuario no admite el pipeline concurrente; se procesa en secuencia")
+        cargadores = 0
     
     with manejo_errores_proceso(nombre_proceso):
         # Conexiones a bases de datos
@@ -203,48 +637,87 @@ def main():
         db_dw = conectar_DW()
         
         try:
-            # Obtención de usuarios
-            usuarios = list(db_sensor_pulsera.pulseras_inteligentes.usuarios_sensor.find())
-            
-            # Obtención de la última fecha de carga
-            ultima_fecha_transaccion = extraer_ultima_fecha_insercion_hechos(db_dw, 'hechos_actividad')
-            
-            # Fecha por defecto para primera carga
-            if not ultima_fecha_transaccion:
-                ultima_fecha_transaccion = "2000-01-01T00:00:00Z"
-                logger.info(f"Usando fecha por defecto para primera carga: {ultima_fecha_transaccion}")
-            
-            # Conversión a formato datetime para compatibilidad con mongo
-            if isinstance(ultima_fecha_transaccion, str):
-                try:
-                    ultima_fecha_transaccion = datetime.fromisoformat(ultima_fecha_transaccion.replace("Z", "+00:00"))
-                except Exception as e:
-                    logger.error(f"Error convirtiendo fecha: {e}")
+            # Último documento cargado de cada colección; sin checkpoint se parte de la fecha de log_eventos
+            posicion_sensor = posicion_desde_checkpoint(
+                leer_checkpoint_o_legado(db_dw, PROCESO_CHECKPOINT_SENSOR, 'hechos_actividad')
+            )
+            posicion_aplicacion = posicion_desde_checkpoint(
+                leer_checkpoint_o_legado(db_dw, PROCESO_CHECKPOINT_APLICACION, 'hechos_actividad')
+            )
             
             # Contadores para el resumen
             total_actividad_fisica = 0
             total_actividad_aplicacion = 0
             
-            # Procesamiento por usuario
-            for usuario in usuarios:
-                id_usuario = usuario["id_usuario"]
-                
-                # Procesamiento de actividad física
-                actividades_fisicas = extraer_actividad_fisica(db_sensor_pulsera, id_usuario, ultima_fecha_transaccion)
-                registros_act_fisica = procesar_actividades_fisicas(db_dw, actividades_fisicas, id_usuario)
-                total_actividad_fisica += registros_act_fisica
-                
-                # Procesamiento de uso de aplicación
-                actividades_aplicacion = extraer_actividad_aplicacion(db_sensor_pulsera, id_usuario, ultima_fecha_transaccion)
-                registros_act_aplicacion = procesar_actividades_aplicacion(db_dw, actividades_aplicacion, id_usuario)
-                total_actividad_aplicacion += registros_act_aplicacion
+            if cargadores > 0:
+                total_actividad_fisica, total_actividad_aplicacion, total_insertados = cargar_actividades_pipeline(
+                    db_sensor_pulsera, db_dw, posicion_sensor, posicion_aplicacion,
+                    modo_extraccion, tamano_lote, cargadores, tipo_escritor=tipo_escritor
+                )
+            else:
+                # Los hechos se escriben por lotes; los checkpoints avanzan después de cada lote escrito
+                escritor = crear_escritor_actividad(
+                    db_dw, tipo_escritor, tamano_lote,
+                    al_confirmar=lambda proceso, marca: avanzar_checkpoint(
+                        db_dw, proceso, ultima_marca_tiempo=marca[0], ultima_clave=marca[1]
+                    )
+                )
+                with escritor:
+                    if modo_extraccion != MODO_EXTRACCION_POR_USUARIO:
+                        # Un cursor por colección (global) o un único pipeline de agregación con fecha y
+                        # hora calculadas en MongoDB, en ambos casos con los documentos de todos los usuarios
+                        total_actividad_fisica, total_actividad_aplicacion = cargar_actividades_por_bloques(
+                            db_sensor_pulsera, db_dw, escritor, posicion_sensor, posicion_aplicacion, modo_extraccion
+                        )
+                    else:
+                        # Obtención de usuarios y procesamiento por usuario. Las consultas por usuario
+                        # no desempatan por _id, así que se parte del timestamp del checkpoint y al final
+                        # se marca el mayor timestamp leído de cada colección
+                        ultima_fecha_sensor, ultima_fecha_aplicacion = posicion_sensor[0], posicion_aplicacion[0]
+                        usuarios = list(db_sensor_pulsera.pulseras_inteligentes.usuarios_sensor.find())
+                        for usuario in usuarios:
+                            id_usuario = usuario["id_usuario"]
+                            
+                            # Procesamiento de actividad física
+                            actividades_fisicas = extraer_actividad_fisica(db_sensor_pulsera, id_usuario, posicion_sensor[0])
+                            registros_act_fisica = procesar_actividades_fisicas(db_dw, escritor, actividades_fisicas, id_usuario)
+                            total_actividad_fisica += registros_act_fisica
+                            ultima_fecha_sensor = max([ultima_fecha_sensor] + [a["timestamp"] for a in actividades_fisicas])
+                            
+                            # Procesamiento de uso de aplicación
+                            actividades_aplicacion = extraer_actividad_aplicacion(db_sensor_pulsera, id_usuario, posicion_aplicacion[0])
+                            registros_act_aplicacion = procesar_actividades_aplicacion(db_dw, escritor, actividades_aplicacion, id_usuario)
+                            total_actividad_aplicacion += registros_act_aplicacion
+                            ultima_fecha_aplicacion = max([ultima_fecha_aplicacion] + [a["timestamp"] for a in actividades_aplicacion])
+                        
+                        escritor.marcar(PROCESO_CHECKPOINT_SENSOR, (ultima_fecha_sensor, None))
+                        escritor.marcar(PROCESO_CHECKPOINT_APLICACION, (ultima_fecha_aplicacion, None))
+                total_insertados = escritor.total_insertados
             
             # Resumen final
             logger.info(f"Carga completada: {total_actividad_fisica} registros de actividad física, " 
-                        f"{total_actividad_aplicacion} registros de actividad de aplicación")
+                        f"{total_actividad_aplicacion} registros de actividad de aplicación, "
+                        f"{total_insertados} hechos insertados")
+            obtener_cache_fechas(db_dw).registrar_estadisticas()
+            registrar_estadisticas_fechas()
+            obtener_cache_dimension(db_dw, "dim_actividad", "descripcion", "id_actividad",
+                                    auto_insertar=AUTO_INSERTAR_ACTIVIDADES).registrar_estadisticas()
         finally:
             # Cierre de conexiones
             db_sensor_pulsera.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    argumentos = argparse.ArgumentParser(description="Carga de la tabla de hechos de actividad")
+    argumentos.add_argument("--tamano-lote", type=int, default=TAMANO_LOTE_HECHOS_DEFECTO, help="Hechos por petición")
+    argumentos.add_argument("--extraccion", default=None,
+                            choices=[MODO_EXTRACCION_GLOBAL, MODO_EXTRACCION_POR_USUARIO, MODO_EXTRACCION_AGREGACION],
+                            help="Un cursor por colección (global), dos consultas por usuario (por_usuario) "
+                                 "o un único pipeline de agregación (agregacion)")
+    argumentos.add_argument("--cargadores", type=int, default=None,
+                            help="Hilos de carga del pipeline concurrente (0: procesamiento secuencial)")
+    argumentos.add_argument("--escritor", default=None, choices=[ESCRITOR_SINCRONO, ESCRITOR_ASINCRONO],
+                            help="Escritor de hechos: cliente de Supabase (sincrono) o cliente HTTP con "
+                                 "varias peticiones en curso (asincrono)")
+    args = argumentos.parse_args()
+    main(tamano_lote=args.tamano_lote, modo_extraccion=args.extraccion, cargadores=args.cargadores,
+         tipo_escritor=args.escritor)
\ No newline at end of file
@@ -7,89 +7,142 @@ obtiene los datos asociados de plan de suscripción y carga los registros
 en la tabla de hechos de pagos de la base de datos dimensional.
 """
 
+import argparse
+import os
 from pulseras_inteligentes.utils.conexiones_db import conectar_db_transacciones, conectar_DW
 from pulseras_inteligentes.utils.etl_funcs import (
-    extraer_ultima_fecha_insercion_hechos, 
-    obtener_id_fecha, 
-    extraer_hora_fecha,
+    extraer_fechas_y_horas,
+    registrar_estadisticas_fechas,
     manejo_errores_proceso,
     logger
 )
+from pulseras_inteligentes.utils.cache_dimensiones import obtener_cache_fechas
+from pulseras_inteligentes.utils.checkpoints import leer_checkpoint_o_legado, avanzar_checkpoint
+from pulseras_inteligentes.utils.escritor_hechos import EscritorHechos, TAMANO_LOTE_HECHOS_DEFECTO
+from pulseras_inteligentes.utils.extraccion_paginada import iterar_paginas, TAMANO_PAGINA_DEFECTO
+from pulseras_inteligentes.utils.pipeline_etapas import ejecutar_pipeline
 
+# IDs de pago por filtro in_, para no exceder el largo de la URL
+TAMANO_LOTE_IDS = 200
 
-def extraer_pagos_por_fecha(db_transacciones, fecha_transaccion):
+# Proceso del checkpoint en etl_checkpoints (último id_pago cargado)
+PROCESO_CHECKPOINT = "ETL_CARGAR_HECHOS_PAGOS"
+
+# Pagos por debajo del checkpoint que se vuelven a leer, para cargar los de transacciones
+# que confirmaron después de que se leyeran pagos con id_pago mayor. Los ya cargados se
+# ignoran por la restricción única de hechos_pagos.id_pago
+VENTANA_SEGURIDAD_ID_PAGO = int(os.getenv("VENTANA_SEGURIDAD_ID_PAGO", "1000"))
+
+# Restricción única de hechos_pagos usada para ignorar los pagos ya cargados
+CLAVE_HECHOS_PAGOS = "id_pago"
+
+# Hilos de carga del pipeline concurrente de extracción, transformación y carga.
+# Con 0 las páginas se procesan en secuencia en el hilo principal.
+CARGADORES_HECHOS_PAGOS = int(os.getenv("CARGADORES_HECHOS_PAGOS", "0"))
+
+
+COLUMNAS_PAGOS = """
+                id_pago,
+                monto,
+                fecha_transaccion,
+                id_metodo_pago,
+                id_estado_pago,
+                id_usuario
+                """
+
+
+def extraer_pagos_por_fecha(db_transacciones, fecha_transaccion, tamano_pagina=TAMANO_PAGINA_DEFECTO, prefetch=True):
     """
     Extrae información de pagos posteriores a una fecha específica desde la base operacional.
     
+    Los pagos se leen paginando por id_pago, con la página siguiente pedida en segundo
+    plano, y se entregan página a página para no cargar todos en memoria.
+    
     Args:
         db_transacciones: Conexión a la base de datos operacional.
         fecha_transaccion: Fecha a partir de la cual extraer pagos.
+        tamano_pagina: Número de pagos por consulta.
+        prefetch: Si es True, la página siguiente se pide en segundo plano.
         
     Returns:
-        list: Lista de diccionarios con datos de pagos o lista vacía si hay error.
+        Iterator[list]: Iterador de páginas de pagos, ordenadas por id_pago.
     """
-    try:
-        response = (
-            db_transacciones.table("pagos")
-            .select(
-                """
-                id_pago,
-                monto,
-                fecha_transaccion,
-                id_metodo_pago,
-                id_estado_pago,
-                id_usuario
-                """
-            )
-            .gt("fecha_transaccion", fecha_transaccion)
-            .execute()
-        )
+    return iterar_paginas(
+        db_transacciones,
+        "pagos",
+        COLUMNAS_PAGOS,
+        clave="id_pago",
+        filtros=lambda consulta: consulta.gt("fecha_transaccion", fecha_transaccion),
+        tamano_pagina=tamano_pagina,
+        prefetch=prefetch
+    )
+
+
+def extraer_pagos_por_id(db_transacciones, ultimo_id_pago, tamano_pagina=TAMANO_PAGINA_DEFECTO, prefetch=True,
+                         ventana=VENTANA_SEGURIDAD_ID_PAGO):
+    """
+    Extrae los pagos con id_pago mayor al último cargado, página a página.
+    
+    Como id_pago es un SERIAL, un pago cuya transacción confirma tarde puede tener un id menor
+    que otros ya cargados. Por eso se vuelven a leer también los pagos de la ventana de
+    seguridad por debajo del checkpoint; los que ya tienen hecho se ignoran al insertarlos.
+    
+    Args:
+        db_transacciones: Conexión a la base de datos operacional.
+        ultimo_id_pago: ID del último pago cargado (checkpoint).
+        tamano_pagina: Número de pagos por consulta.
+        prefetch: Si es True, la página siguiente se pide en segundo plano.
+        ventana (int): Número de ids por debajo del checkpoint que se vuelven a leer.
         
-        pagos = response.data
-        logger.info(f"Extraídos {len(pagos)} pagos nuevos desde la base operacional")
-        return pagos
-    except Exception as e:
-        logger.error(f"Error al extraer información de pagos: {e}")
-        return []
+    Returns:
+        Iterator[list]: Iterador de páginas de pagos, ordenadas por id_pago.
+    """
+    return iterar_paginas(
+        db_transacciones,
+        "pagos",
+        COLUMNAS_PAGOS,
+        clave="id_pago",
+        tamano_pagina=tamano_pagina,
+        desde=max(0, ultimo_id_pago - ventana),
+        prefetch=prefetch
+    )
 
 
-def extraer_id_plan(db_transacciones, id_pago):
+def extraer_ids_planes(db_transacciones, ids_pagos):
     """
-    Extrae el ID del plan asociado a un pago desde la tabla de suscripciones.
+    Extrae el ID del plan asociado a cada pago desde la tabla de suscripciones.
+    
+    Los pagos se consultan con filtros in_ por lotes de IDs, en lugar de una consulta por pago.
     
     Args:
         db_transacciones: Conexión a la base de datos operacional.
-        id_pago: ID del pago para el que buscar el plan.
+        ids_pagos (list): IDs de los pagos para los que buscar el plan.
         
     Returns:
-        int: ID del plan o None si no se encuentra o hay error.
+        dict: ID de pago -> ID de plan, solo para los pagos con suscripción asociada.
     """
-    try:
+    planes = {}
+    for inicio in range(0, len(ids_pagos), TAMANO_LOTE_IDS):
         response = (
             db_transacciones.table("suscripcion")
             .select("id_pago, id_plan")
-            .eq("id_pago", id_pago)
+            .in_("id_pago", ids_pagos[inicio:inicio + TAMANO_LOTE_IDS])
             .execute()
         )
-        
-        if not response.data:
-            logger.warning(f"No se encontró plan asociado al pago ID: {id_pago}")
-            return None
-            
-        id_plan = response.data[0]['id_plan']
-        logger.debug(f"Plan ID: {id_plan} asociado al pago ID: {id_pago}")
-        return id_plan
-    except Exception as e:
-        logger.error(f"Error al extraer ID del plan para pago ID {id_pago}: {e}")
-        return None
+        for suscripcion in response.data:
+            planes.setdefault(suscripcion["id_pago"], suscripcion["id_plan"])
+    
+    logger.debug(f"Planes resueltos para {len(planes)} de {len(ids_pagos)} pagos")
+    return planes
 
 
-def insertar_hecho_pago(db_dw, id_usuario, id_plan, id_metodo_pago, id_estado_pago, id_fecha, hora_registro, monto_pago):
+def construir_hecho_pago(id_pago, id_usuario, id_plan, id_metodo_pago, id_estado_pago, id_fecha, hora_registro,
+                         monto_pago):
     """
-    Inserta un registro en la tabla de hechos de pagos.
+    Construye un registro de la tabla de hechos de pagos.
     
     Args:
-        db_dw: Conexión al Data Warehouse.
+        id_pago: ID del pago en la base operacional.
         id_usuario: ID del usuario.
         id_plan: ID del plan de suscripción.
         id_metodo_pago: ID del método de pago.
@@ -99,33 +152,127 @@ def insertar_hecho_pago(db_dw, id_usuario, id_plan, id_metodo_pago, id_estado_pa
         monto_pago: Monto del pago.
         
     Returns:
-        bool: True si la inserción fue exitosa, False en caso contrario.
+        dict: Fila de hechos_pagos.
     """
-    try:
-        db_dw.table("hechos_pagos").insert(
-            {
-                "id_usuario": id_usuario,
-                "id_plan": id_plan,
-                "id_metodo_pago": id_metodo_pago,
-                "id_estado_pago": id_estado_pago,
-                'id_fecha': id_fecha,
-                'hora_registro': hora_registro,
-                "monto_pago": monto_pago
-            }
-        ).execute()
+    return {
+        "id_pago": id_pago,
+        "id_usuario": id_usuario,
+        "id_plan": id_plan,
+        "id_metodo_pago": id_metodo_pago,
+        "id_estado_pago": id_estado_pago,
+        'id_fecha': id_fecha,
+        'hora_registro': hora_registro,
+        "monto_pago": monto_pago
+    }
+
+
+def transformar_pagina_pagos(db_transacciones, cache_fechas, pagina):
+    """
+    Convierte una página de pagos en filas de hechos_pagos.
+    
+    Planes y fechas se resuelven para toda la página y se unen en memoria. Los pagos sin
+    fecha en la dimensión o sin plan asociado se descartan con una advertencia.
+    
+    Args:
+        db_transacciones: Conexión a la base de datos operacional.
+        cache_fechas (CacheFechas): Caché de la dimensión de fecha.
+        pagina (list): Pagos de la página, ordenados por id_pago.
         
-        logger.debug(f"Hecho de pago insertado para usuario ID: {id_usuario}, plan ID: {id_plan}")
-        return True
-    except Exception as e:
-        logger.error(f"Error al insertar hecho de pago para usuario ID: {id_usuario}: {e}")
-        return False
+    Returns:
+        dict: Filas de hechos ('hechos'), pagos procesados ('procesados') y último id_pago de la página ('ultimo_id').
+    """
+    planes = extraer_ids_planes(db_transacciones, [pago['id_pago'] for pago in pagina])
+    
+    # Claves de fecha y horas de la página convertidas de una vez
+    claves_fechas, horas = extraer_fechas_y_horas(pago['fecha_transaccion'] for pago in pagina)
+    ids_fechas = cache_fechas.obtener_varios(claves_fechas)
+    
+    hechos = []
+    for pago, id_fecha, hora_registro in zip(pagina, ids_fechas, horas):
+        if not id_fecha:
+            logger.warning(f"No se encontró dimensión de fecha para {pago['fecha_transaccion']}")
+            continue
+        
+        id_plan = planes.get(pago['id_pago'])
+        if id_plan is None:
+            logger.warning(f"No se encontró plan asociado al pago ID: {pago['id_pago']}")
+            continue
+        
+        hechos.append(construir_hecho_pago(
+            id_pago=pago['id_pago'],
+            id_usuario=pago['id_usuario'],
+            id_plan=id_plan,
+            id_metodo_pago=pago['id_metodo_pago'],
+            id_estado_pago=pago['id_estado_pago'],
+            id_fecha=id_fecha,
+            hora_registro=hora_registro,
+            monto_pago=pago['monto']
+        ))
+    
+    return {"hechos": hechos, "procesados": len(pagina), "ultimo_id": pagina[-1]['id_pago']}
 
 
-def main():
+def cargar_pagos_pipeline(db_transacciones, db_dw, paginas_pagos, cache_fechas, tamano_lote, cargadores):
+    """
+    Carga las páginas de pagos con un pipeline concurrente: la extracción de páginas, la
+    resolución de planes y fechas y la escritura se ejecutan en hilos separados.
+    
+    Cada hilo de carga usa su propio escritor y envía cada página completa; el checkpoint
+    avanza en el orden de las páginas, cuando todas las anteriores ya se escribieron.
+    
+    Args:
+        db_transacciones: Conexión a la base de datos operacional.
+        db_dw: Conexión al Data Warehouse.
+        paginas_pagos (Iterator[list]): Páginas de pagos a cargar.
+        cache_fechas (CacheFechas): Caché de la dimensión de fecha.
+        tamano_lote (int): Número de hechos por petición de inserción.
+        cargadores (int): Número de hilos de carga.
+        
+    Returns:
+        tuple: Pagos procesados, hechos agregados y hechos insertados.
+    """
+    escritores = [
+        EscritorHechos(db_dw, "hechos_pagos", tamano_lote=tamano_lote, on_conflict=CLAVE_HECHOS_PAGOS)
+        for _ in range(cargadores)
+    ]
+    totales = {"procesados": 0, "agregados": 0}
+    
+    def cargar(resultado, indice):
+        escritores[indice].agregar_varios(resultado["hechos"])
+        escritores[indice].flush()
+    
+    def confirmar(resultado):
+        totales["procesados"] += resultado["procesados"]
+        totales["agregados"] += len(resultado["hechos"])
+        avanzar_checkpoint(db_dw, PROCESO_CHECKPOINT, ultimo_id=resultado["ultimo_id"])
+    
+    try:
+        ejecutar_pipeline(
+            paginas_pagos,
+            lambda pagina: transformar_pagina_pagos(db_transacciones, cache_fechas, pagina),
+            cargar,
+            cargadores=cargadores,
+            al_confirmar=confirmar,
+            nombre="hechos_pagos"
+        )
+    finally:
+        for escritor in escritores:
+            escritor.cerrar()
+    
+    return totales["procesados"], totales["agregados"], sum(escritor.total_insertados for escritor in escritores)
+
+
+def main(tamano_lote=TAMANO_LOTE_HECHOS_DEFECTO, cargadores=None):
     """
     Función principal que coordina el proceso ETL de carga de hechos de pagos.
+    
+    Args:
+        tamano_lote (int): Número de hechos por petición de inserción.
+        cargadores (int): Hilos de carga del pipeline concurrente; 0 procesa las páginas en
+            secuencia. Si es None se usa CARGADORES_HECHOS_PAGOS.
     """
     nombre_proceso = "ETL_CARGAR_HECHOS_PAGOS"
+    cargadores = CARGADORES_HECHOS_PAGOS if cargadores is None else cargadores
     
     with manejo_errores_proceso(nombre_proceso):
         # Conexiones a bases de datos
@@ -133,57 +280,64 @@ def main():
         db_dw = conectar_DW()
         
         try:
-            # Verificación de la última fecha de inserción
-            ultima_fecha_transaccion = extraer_ultima_fecha_insercion_hechos(db_dw, 'hechos_pagos')
+            # Último pago cargado; sin checkpoint se parte de la fecha de log_eventos
+            checkpoint = leer_checkpoint_o_legado(db_dw, PROCESO_CHECKPOINT, 'hechos_pagos')
             
-            # Fecha por defecto para primera carga
-            if not ultima_fecha_transaccion:
-                ultima_fecha_transaccion = "2000-01-01T00:00:00Z"
-                logger.info(f"Usando fecha por defecto para primera carga: {ultima_fecha_transaccion}")
+            # Extracción de pagos nuevos (flujo paginado). En el pipeline la extracción ya
+            # corre en su propio hilo, por lo que no se pide la página siguiente por adelantado
+            prefetch = cargadores == 0
+            if checkpoint["ultimo_id"] is not None:
+                paginas_pagos = extraer_pagos_por_id(db_transacciones, checkpoint["ultimo_id"], prefetch=prefetch)
+            else:
+                paginas_pagos = extraer_pagos_por_fecha(
+                    db_transacciones, checkpoint["ultima_marca_tiempo"], prefetch=prefetch
+                )
+            cache_fechas = obtener_cache_fechas(db_dw)
             
-            # Extracción de pagos nuevos
-            pagos = extraer_pagos_por_fecha(db_transacciones, ultima_fecha_transaccion)
+            if cargadores > 0:
+                contador_procesados, contador_agregados, total_insertados = cargar_pagos_pipeline(
+                    db_transacciones, db_dw, paginas_pagos, cache_fechas, tamano_lote, cargadores
+                )
+            else:
+                # Contadores para el resumen final
+                contador_agregados = 0
+                contador_procesados = 0
+                
+                # Procesamiento de cada página de pagos; los hechos se escriben por lotes
+                # El checkpoint avanza después de cada lote escrito con éxito
+                escritor = EscritorHechos(
+                    db_dw, "hechos_pagos", tamano_lote=tamano_lote, on_conflict=CLAVE_HECHOS_PAGOS,
+                    al_confirmar=lambda proceso, id_pago: avanzar_checkpoint(db_dw, proceso, ultimo_id=id_pago)
+                )
+                with escritor:
+                    for pagina in paginas_pagos:
+                        resultado = transformar_pagina_pagos(db_transacciones, cache_fechas, pagina)
+                        escritor.agregar_varios(resultado["hechos"])
+                        contador_procesados += resultado["procesados"]
+                        contador_agregados += len(resultado["hechos"])
+                        
+                        # Todos los pagos de la página ya se agregaron al escritor (o se descartaron)
+                        escritor.marcar(PROCESO_CHECKPOINT, resultado["ultimo_id"])
+                total_insertados = escritor.total_insertados
             
-            if not pagos:
+            if not contador_procesados:
                 logger.info("No hay nuevos pagos para insertar en la tabla de hechos")
                 return
             
-            # Contador para el resumen final
-            contador_insertados = 0
-            
-            # Procesamiento de cada pago
-            for pago in pagos:
-                # Obtener ID de fecha y hora para el hecho
-                fecha_transaccion_str = pago['fecha_transaccion']
-                hora_registro = extraer_hora_fecha(fecha_transaccion_str)
-                id_fecha = obtener_id_fecha(db_dw, fecha_transaccion_str)
-                
-                if not id_fecha:
-                    logger.warning(f"No se encontró dimensión de fecha para {fecha_transaccion_str}")
-                    continue
-                
-                # Extraer ID del plan (si existe)
-                id_plan = extraer_id_plan(db_transacciones, pago['id_pago'])
-                
-                # Insertar hecho de pago
-                if insertar_hecho_pago(
-                    db_dw,
-                    id_usuario=pago['id_usuario'],
-                    id_plan=id_plan,
-                    id_metodo_pago=pago['id_metodo_pago'],
-                    id_estado_pago=pago['id_estado_pago'],
-                    id_fecha=id_fecha,
-                    hora_registro=hora_registro,
-                    monto_pago=pago['monto']
-                ):
-                    contador_insertados += 1
-            
             # Resumen final
-            logger.info(f"Hechos de pagos insertados: {contador_insertados} de {len(pagos)} procesados")
+            logger.info(f"Hechos de pagos insertados: {total_insertados} de {contador_procesados} procesados "
+                        f"({contador_agregados - total_insertados} rechazados)")
+            cache_fechas.registrar_estadisticas()
+            registrar_estadisticas_fechas()
                 
         except Exception as e:
             logger.error(f"Error en proceso ETL de hechos de pagos: {e}")
             raise
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    argumentos = argparse.ArgumentParser(description="Carga de la tabla de hechos de pagos")
+    argumentos.add_argument("--tamano-lote", type=int, default=TAMANO_LOTE_HECHOS_DEFECTO, help="Hechos por petición")
+    argumentos.add_argument("--cargadores", type=int, default=None,
+                            help="Hilos de carga del pipeline concurrente (0: procesamiento secuencial)")
+    args = argumentos.parse_args()
+    main(tamano_lote=args.tamano_lote, cargadores=args.cargadores)
\ No newline at end of file
@@ -0,0 +1,469 @@
+"""
+Módulo para la gestión del modo de almacenamiento de los datos de sensores en MongoDB.
+
+Los datos de sensores pueden almacenarse en tres formatos:
+
+- 'documento': un documento por lectura en la colección datos_sensor (formato original).
+- 'timeseries': colección nativa de series temporales datos_sensor_ts, con timeField
+  'timestamp' y metaField 'meta' = {id_usuario, tipo_registro}.
+- 'buckets': un documento por usuario y día en datos_sensor_buckets, con las lecturas
+  del día agrupadas en un array.
+
+El modo se configura con la variable de entorno MODO_ALMACENAMIENTO_SENSOR. Este módulo
+ofrece los escritores para cada formato, un lector que devuelve siempre los documentos con
+el esquema original y una herramienta de migración desde la colección datos_sensor.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import argparse
+import os
+from bson import ObjectId
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
+# La importación de conexiones_db carga las variables de entorno del archivo .env
+from pulseras_inteligentes.utils.conexiones_db import conectar_db_sensor_pulsera
+from pulseras_inteligentes.utils.escritor_mongo import EscritorLotesMongo, TAMANO_LOTE_DEFECTO
+from pulseras_inteligentes.utils.etl_funcs import manejo_errores_proceso, logger
+from pulseras_inteligentes.utils.extraccion_paginada import agrupar_en_lotes
+
+MODO_DOCUMENTO = "documento"
+MODO_TIMESERIES = "timeseries"
+MODO_BUCKETS = "buckets"
+
+# Colección utilizada por cada modo de almacenamiento
+COLECCIONES_POR_MODO = {
+    MODO_DOCUMENTO: "datos_sensor",
+    MODO_TIMESERIES: "datos_sensor_ts",
+    MODO_BUCKETS: "datos_sensor_buckets",
+}
+
+MODO_ALMACENAMIENTO_SENSOR = os.getenv("MODO_ALMACENAMIENTO_SENSOR", MODO_DOCUMENTO)
+
+# Las lecturas de los buckets no tienen _id propio. Al leerlas se les asigna uno de desempate:
+# BASE + id_usuario * FACTOR + posición en el array, como texto de ancho fijo para que se ordene
+# igual en MongoDB y en etl_checkpoints. Dos lecturas con el mismo timestamp y usuario están en
+# el mismo bucket (el del día), y las lecturas solo se agregan al final del array, así que la
+# clave es estable y única entre las lecturas con el mismo timestamp.
+FACTOR_CLAVE_LECTURA_BUCKET = 10 ** 6
+BASE_CLAVE_LECTURA_BUCKET = 10 ** 15
+
+
+def obtener_modo_almacenamiento(modo: Optional[str] = None) -> str:
+    """
+    Devuelve el modo de almacenamiento a utilizar, validando que sea conocido.
+
+    Args:
+        modo: Modo explícito. Si es None se usa MODO_ALMACENAMIENTO_SENSOR.
+
+    Returns:
+        str: Modo de almacenamiento.
+
+    Raises:
+        ValueError: Si el modo no es válido.
+    """
+    modo = modo or MODO_ALMACENAMIENTO_SENSOR
+    if modo not in COLECCIONES_POR_MODO:
+        raise ValueError(f"Modo de almacenamiento de sensores no válido: {modo}")
+    return modo
+
+
+def obtener_coleccion_sensor(db_sensor_pulsera: MongoClient, modo: Optional[str] = None):
+    """
+    Obtiene la colección de datos de sensores correspondiente al modo de almacenamiento.
+
+    Args:
+        db_sensor_pulsera: Cliente de MongoDB.
+        modo: Modo de almacenamiento (por defecto, el configurado).
+
+    Returns:
+        Collection: Colección de MongoDB.
+    """
+    return db_sensor_pulsera.pulseras_inteligentes[COLECCIONES_POR_MODO[obtener_modo_almacenamiento(modo)]]
+
+
+def crear_coleccion_timeseries(db_sensor_pulsera: MongoClient) -> None:
+    """
+    Crea la colección nativa de series temporales si todavía no existe.
+
+    Args:
+        db_sensor_pulsera: Cliente de MongoDB.
+    """
+    base_datos = db_sensor_pulsera.pulseras_inteligentes
+    nombre = COLECCIONES_POR_MODO[MODO_TIMESERIES]
+
+    if nombre in base_datos.list_collection_names():
+        return
+
+    base_datos.create_collection(
+        nombre,
+        timeseries={"timeField": "timestamp", "metaField": "meta", "granularity": "hours"}
+    )
+    logger.info(f"Colección de series temporales {nombre} creada")
+
+
+def dia_de(timestamp: datetime) -> datetime:
+    """
+    Trunca un timestamp a la medianoche de su día.
+    """
+    return datetime(timestamp.year, timestamp.month, timestamp.day)
+
+
+def filtro_posicion(fecha_base: datetime, desde_id: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    Construye el filtro de los registros posteriores a una posición (timestamp y, opcionalmente, _id).
+
+    Args:
+        fecha_base: Solo se devuelven registros con timestamp posterior a esta fecha.
+        desde_id: _id de desempate (opcional): también se devuelven los registros con timestamp
+            igual a fecha_base y _id mayor.
+
+    Returns:
+        Dict[str, Any]: Filtro de MongoDB sobre los campos timestamp y _id.
+    """
+    if desde_id is None:
+        return {"timestamp": {"$gt": fecha_base}}
+    return {"$or": [{"timestamp": {"$gt": fecha_base}}, {"timestamp": fecha_base, "_id": {"$gt": desde_id}}]}
+
+
+def etapas_lecturas_buckets(tipo_registro: str, fecha_base: datetime, desde_id: Optional[Any] = None,
+                            id_usuario: Optional[int] = None, datos: Any = "$lecturas.datos") -> List[Dict[str, Any]]:
+    """
+    Construye las etapas que extraen de los buckets las lecturas de un tipo posteriores a una posición.
+
+    Args:
+        tipo_registro: Tipo de registro a buscar.
+        fecha_base: Solo se devuelven lecturas con timestamp posterior a esta fecha.
+        desde_id: Clave de desempate (opcional): también se devuelven las lecturas con timestamp
+            igual a fecha_base y clave mayor.
+        id_usuario: ID del usuario (opcional; si no se indica, se buscan todos los usuarios).
+        datos: Expresión del campo datos devuelto.
+
+    Returns:
+        List[Dict[str, Any]]: Etapas que producen documentos con _id (clave de desempate),
+        id_usuario, tipo_registro, timestamp y datos.
+    """
+    filtro_bucket = {"dia": {"$gte": dia_de(fecha_base)}}
+    if id_usuario is not None:
+        filtro_bucket["id_usuario"] = id_usuario
+    operador_fecha = "$gt" if desde_id is None else "$gte"
+    etapas = [
+        {"$match": filtro_bucket},
+        {"$unwind": {"path": "$lecturas", "includeArrayIndex": "posicion"}},
+        {"$match": {"lecturas.tipo_registro": tipo_registro, "lecturas.timestamp": {operador_fecha: fecha_base}}},
+        {"$project": {
+            "_id": {"$toString": {"$add": [
+                BASE_CLAVE_LECTURA_BUCKET, {"$multiply": ["$id_usuario", FACTOR_CLAVE_LECTURA_BUCKET]}, "$posicion"
+            ]}},
+            "id_usuario": 1,
+            "tipo_registro": "$lecturas.tipo_registro",
+            "timestamp": "$lecturas.timestamp",
+            "datos": datos,
+        }},
+    ]
+    if desde_id is not None:
+        etapas.append({"$match": filtro_posicion(fecha_base, desde_id)})
+    return etapas
+
+
+def a_documento_timeseries(registro: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convierte un registro con el esquema original al formato de la colección de series temporales.
+    """
+    return {
+        "timestamp": registro["timestamp"],
+        "meta": {"id_usuario": registro["id_usuario"], "tipo_registro": registro["tipo_registro"]},
+        "datos": registro["datos"],
+    }
+
+
+def desde_documento_timeseries(documento: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convierte un documento de la colección de series temporales al esquema original.
+    """
+    return {
+        "_id": documento.get("_id"),
+        "id_usuario": documento["meta"]["id_usuario"],
+        "tipo_registro": documento["meta"]["tipo_registro"],
+        "timestamp": documento["timestamp"],
+        "datos": documento["datos"],
+    }
+
+
+class EscritorBucketsSensor(EscritorLotesMongo):
+    """
+    Escritor por lotes que agrupa las lecturas en un documento por usuario y día.
+
+    Cada lote se envía como un único bulk_write con una operación upsert por bucket,
+    que agrega las lecturas al array 'lecturas' del bucket correspondiente.
+    """
+
+    def _enviar_lote(self, lote: List[Dict[str, Any]]) -> int:
+        """
+        Agrupa el lote por usuario y día y envía un upsert por bucket.
+        """
+        buckets: Dict[Tuple[int, datetime], List[Dict[str, Any]]] = {}
+        for registro in lote:
+            clave = (registro["id_usuario"], dia_de(registro["timestamp"]))
+            buckets.setdefault(clave, []).append({
+                "timestamp": registro["timestamp"],
+                "tipo_registro": registro["tipo_registro"],
+                "datos": registro["datos"],
+            })
+
+        claves = list(buckets)
+        operaciones = [
+            UpdateOne(
+                {"id_usuario": id_usuario, "dia": dia},
+                {
+                    "$push": {"lecturas": {"$each": buckets[(id_usuario, dia)]}},
+                    "$inc": {"n_lecturas": len(buckets[(id_usuario, dia)])},
+                },
+                upsert=True
+            )
+            for id_usuario, dia in claves
+        ]
+
+        try:
+            self.coleccion.bulk_write(operaciones, ordered=False)
+            return len(lote)
+        except BulkWriteError as e:
+            errores = e.details.get("writeErrors", [])
+            fallidos = sum(len(buckets[claves[error["index"]]]) for error in errores)
+            self.usuarios_con_errores.update(claves[error["index"]][0] for error in errores)
+            logger.warning(f"Lote con {len(errores)} buckets rechazados en {self.coleccion.name}: "
+                           f"{errores[0].get('errmsg') if errores else e}")
+            return len(lote) - fallidos
+
+
+def crear_escritor_sensor(db_sensor_pulsera: MongoClient, tamano_lote: int = TAMANO_LOTE_DEFECTO,
+                          modo: Optional[str] = None) -> EscritorLotesMongo:
+    """
+    Crea el escritor por lotes adecuado para el modo de almacenamiento de sensores.
+    Los generadores le entregan siempre registros con el esquema original.
+
+    Args:
+        db_sensor_pulsera: Cliente de MongoDB.
+        tamano_lote: Número de registros por lote.
+        modo: Modo de almacenamiento (por defecto, el configurado).
+
+    Returns:
+        EscritorLotesMongo: Escritor para la colección del modo indicado.
+    """
+    modo = obtener_modo_almacenamiento(modo)
+    coleccion = obtener_coleccion_sensor(db_sensor_pulsera, modo)
+
+    if modo == MODO_TIMESERIES:
+        crear_coleccion_timeseries(db_sensor_pulsera)
+        return EscritorLotesMongo(coleccion, tamano_lote=tamano_lote, transformar=a_documento_timeseries)
+    if modo == MODO_BUCKETS:
+        # Índice único para que los upserts concurrentes de varios workers no dupliquen buckets
+        coleccion.create_index([("id_usuario", 1), ("dia", 1)], unique=True)
+        return EscritorBucketsSensor(coleccion, tamano_lote=tamano_lote)
+    return EscritorLotesMongo(coleccion, tamano_lote=tamano_lote)
+
+
+def iterar_registros_sensor(db_sensor_pulsera: MongoClient, tipo_registro: str, fecha_base: datetime,
+                            id_usuario: Optional[int] = None, modo: Optional[str] = None,
+                            campos_datos: Optional[List[str]] = None,
+                            ordenar: bool = False, desde_id: Optional[Any] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Recorre con un único cursor los registros de sensores de un tipo posteriores a una fecha,
+    en cualquier modo de almacenamiento, con el esquema original de datos_sensor.
+
+    Args:
+        db_sensor_pulsera: Cliente de MongoDB.
+        tipo_registro: Tipo de registro a buscar ('actividad', 'reposo', 'sueño', 'glucosa').
+        fecha_base: Solo se devuelven registros con timestamp posterior a esta fecha.
+        id_usuario: ID del usuario (opcional; si no se indica, se buscan todos los usuarios).
+        modo: Modo de almacenamiento (por defecto, el configurado).
+        campos_datos: Campos del subdocumento 'datos' a devolver (opcional; por defecto, todos).
+            Si se indican, solo se leen id_usuario, tipo_registro, timestamp y esos campos.
+        ordenar: Si es True, los registros se devuelven ordenados por timestamp (y _id).
+        desde_id: _id de desempate (opcional): también se devuelven los registros con timestamp
+            igual a fecha_base y _id mayor. En el modo 'buckets' es la clave de desempate que
+            asigna etapas_lecturas_buckets.
+
+    Yields:
+        Dict[str, Any]: Registros con los campos _id, id_usuario, tipo_registro, timestamp y datos.
+    """
+    modo = obtener_modo_almacenamiento(modo)
+    coleccion = obtener_coleccion_sensor(db_sensor_pulsera, modo)
+
+    if modo in (MODO_DOCUMENTO, MODO_TIMESERIES):
+        if modo == MODO_DOCUMENTO:
+            filtro = {"tipo_registro": tipo_registro, **filtro_posicion(fecha_base, desde_id)}
+            campo_usuario, campos_base = "id_usuario", ["id_usuario", "tipo_registro", "timestamp"]
+        else:
+            filtro = {"meta.tipo_registro": tipo_registro, **filtro_posicion(fecha_base, desde_id)}
+            campo_usuario, campos_base = "meta.id_usuario", ["meta", "timestamp"]
+        if id_usuario is not None:
+            filtro[campo_usuario] = id_usuario
+
+        proyeccion = None
+        if campos_datos is not None:
+            proyeccion = {campo: 1 for campo in campos_base + [f"datos.{campo}" for campo in campos_datos]}
+        cursor = coleccion.find(filtro, proyeccion)
+        if ordenar:
+            cursor = cursor.sort([("timestamp", 1), ("_id", 1)])
+
+        if modo == MODO_DOCUMENTO:
+            yield from cursor
+        else:
+            for documento in cursor:
+                yield desde_documento_timeseries(documento)
+        return
+
+    # Buckets: se filtran los días candidatos y luego las lecturas de cada bucket
+    datos = "$lecturas.datos"
+    if campos_datos is not None:
+        datos = {campo: f"$lecturas.datos.{campo}" for campo in campos_datos}
+    pipeline = etapas_lecturas_buckets(tipo_registro, fecha_base, desde_id, id_usuario, datos)
+    if ordenar:
+        pipeline.append({"$sort": {"timestamp": 1, "_id": 1}})
+    yield from coleccion.aggregate(pipeline, allowDiskUse=ordenar)
+
+
+def etapas_registros_sensor(tipo_registro: str, fecha_base: datetime, modo: Optional[str] = None,
+                            desde_id: Optional[Any] = None) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Construye las etapas de agregación que leen los registros de sensores de un tipo posteriores
+    a una posición, en cualquier modo de almacenamiento, con el esquema original de datos_sensor.
+
+    Permite que un proceso agregue sus propias etapas ($project, $unionWith, $sort) y calcule
+    campos derivados en el servidor, en lugar de leer los documentos con iterar_registros_sensor.
+
+    Args:
+        tipo_registro: Tipo de registro a buscar ('actividad', 'reposo', 'sueño', 'glucosa').
+        fecha_base: Solo se devuelven registros con timestamp posterior a esta fecha.
+        modo: Modo de almacenamiento (por defecto, el configurado).
+        desde_id: _id de desempate (opcional), como en iterar_registros_sensor.
+
+    Returns:
+        Tuple[str, List[Dict[str, Any]]]: Nombre de la colección y etapas que producen documentos
+        con los campos _id, id_usuario, tipo_registro, timestamp y datos.
+    """
+    modo = obtener_modo_almacenamiento(modo)
+
+    if modo == MODO_DOCUMENTO:
+        etapas = [{"$match": {"tipo_registro": tipo_registro, **filtro_posicion(fecha_base, desde_id)}}]
+    elif modo == MODO_TIMESERIES:
+        etapas = [
+            {"$match": {"meta.tipo_registro": tipo_registro, **filtro_posicion(fecha_base, desde_id)}},
+            {"$project": {
+                "id_usuario": "$meta.id_usuario",
+                "tipo_registro": "$meta.tipo_registro",
+                "timestamp": 1,
+                "datos": 1,
+            }},
+        ]
+    else:
+        etapas = etapas_lecturas_buckets(tipo_registro, fecha_base, desde_id)
+    return COLECCIONES_POR_MODO[modo], etapas
+
+
+def buscar_registros_sensor(db_sensor_pulsera: MongoClient, tipo_registro: str, fecha_base: datetime,
+                            id_usuario: Optional[int] = None, modo: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Busca registros de sensores de un tipo posteriores a una fecha, en cualquier modo
+    de almacenamiento, y los devuelve con el esquema original de datos_sensor.
+
+    Args:
+        db_sensor_pulsera: Cliente de MongoDB.
+        tipo_registro: Tipo de registro a buscar ('actividad', 'reposo', 'sueño', 'glucosa').
+        fecha_base: Solo se devuelven registros con timestamp posterior a esta fecha.
+        id_usuario: ID del usuario (opcional; si no se indica, se buscan todos los usuarios).
+        modo: Modo de almacenamiento (por defecto, el configurado).
+
+    Returns:
+        List[Dict[str, Any]]: Registros con los campos id_usuario, tipo_registro, timestamp y datos.
+    """
+    return list(iterar_registros_sensor(db_sensor_pulsera, tipo_registro, fecha_base, id_usuario, modo))
+
+
+def migrar_datos_sensor(db_sensor_pulsera: MongoClient, modo_destino: str,
+                        tamano_lote: int = TAMANO_LOTE_DEFECTO, desde: Optional[datetime] = None,
+                        desde_id: Optional[Any] = None) -> int:
+    """
+    Copia los registros de la colección datos_sensor (formato documento) al formato indicado.
+    La colección de origen no se modifica.
+
+    Los registros se recorren en orden de timestamp y _id, y cada lote se escribe antes de leer
+    el siguiente. Si la migración se interrumpe, se registra la posición del último lote escrito
+    para reanudarla con desde y desde_id sin perder los registros con el mismo timestamp.
+
+    Args:
+        db_sensor_pulsera: Cliente de MongoDB.
+        modo_destino: Modo de almacenamiento de destino ('timeseries' o 'buckets').
+        tamano_lote: Número de registros por lote de escritura.
+        desde: Copia solo los registros posteriores a esta fecha (opcional),
+            para poder reanudar una migración interrumpida.
+        desde_id: _id del último registro migrado con timestamp igual a desde (opcional).
+
+    Returns:
+        int: Número de registros migrados.
+    """
+    if obtener_modo_almacenamiento(modo_destino) == MODO_DOCUMENTO:
+        raise ValueError("El modo de destino de la migración debe ser 'timeseries' o 'buckets'")
+
+    origen = obtener_coleccion_sensor(db_sensor_pulsera, MODO_DOCUMENTO)
+    filtro = filtro_posicion(desde, desde_id) if desde else {}
+    cursor = origen.find(filtro).sort([("timestamp", 1), ("_id", 1)]).batch_size(tamano_lote)
+
+    posicion = (desde, desde_id)
+    with crear_escritor_sensor(db_sensor_pulsera, tamano_lote=tamano_lote, modo=modo_destino) as escritor:
+        try:
+            for lote in agrupar_en_lotes(cursor, tamano_lote):
+                ultima_posicion = (lote[-1]["timestamp"], lote[-1]["_id"])
+                escritor.agregar_varios({campo: valor for campo, valor in registro.items() if campo != "_id"}
+                                        for registro in lote)
+                escritor.flush()
+                posicion = ultima_posicion
+        except Exception:
+            if posicion[0] is not None:
+                logger.error(f"Migración interrumpida; para reanudarla: --desde {posicion[0].isoformat()}"
+                             + (f" --desde-id {posicion[1]}" if posicion[1] is not None else ""))
+            raise
+
+    logger.info(f"Migración de datos_sensor a modo {modo_destino}: {escritor.total_insertados} registros migrados, "
+                f"{escritor.total_errores} errores")
+    return escritor.total_insertados
+
+
+def main(modo_destino: str = MODO_TIMESERIES, tamano_lote: int = TAMANO_LOTE_DEFECTO,
+         desde: Optional[datetime] = None, desde_id: Optional[Any] = None):
+    """
+    Función principal que coordina la migración de datos_sensor a otro modo de almacenamiento.
+
+    Args:
+        modo_destino: Modo de almacenamiento de destino ('timeseries' o 'buckets').
+        tamano_lote: Número de registros por lote de escritura.
+        desde: Copia solo los registros posteriores a esta fecha (opcional).
+        desde_id: _id del último registro migrado con timestamp igual a desde (opcional).
+    """
+    nombre_proceso = "MIGRAR_DATOS_SENSOR"
+
+    with manejo_errores_proceso(nombre_proceso):
+        # Conexión a la base de datos
+        db_sensor_pulsera = conectar_db_sensor_pulsera()
+
+        try:
+            total_migrados = migrar_datos_sensor(db_sensor_pulsera, modo_destino, tamano_lote, desde, desde_id)
+            logger.info(f"{nombre_proceso}: Proceso completado con éxito. {total_migrados} registros migrados.")
+        finally:
+            # Cierre de conexión
+            db_sensor_pulsera.close()
+
+
+if __name__ == "__main__":
+    argumentos = argparse.ArgumentParser(description="Migración de datos_sensor a otro modo de almacenamiento")
+    argumentos.add_argument("--destino", choices=[MODO_TIMESERIES, MODO_BUCKETS], default=MODO_TIMESERIES)
+    argumentos.add_argument("--tamano-lote", type=int, default=TAMANO_LOTE_DEFECTO)
+    argumentos.add_argument("--desde", type=datetime.fromisoformat, default=None,
+                            help="Migra solo registros posteriores a esta fecha ISO (para reanudar)")
+    argumentos.add_argument("--desde-id", type=ObjectId, default=None,
+                            help="_id del último registro migrado con timestamp igual a --desde")
+    args = argumentos.parse_args()
+    if args.desde_id is not None and args.desde is None:
+        argumentos.error("--desde-id requiere --desde")
+    main(modo_destino=args.destino, tamano_lote=args.tamano_lote, desde=args.desde, desde_id=args.desde_id)
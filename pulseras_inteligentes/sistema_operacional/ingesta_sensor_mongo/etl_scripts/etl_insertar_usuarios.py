@@ -4,41 +4,145 @@ a la base de datos de sensores de pulsera.
 
 Este script extrae usuarios de la base de datos operacional y los inserta en
 la colección de usuarios de MongoDB, que sirve como fuente para los datos de sensores.
+
+En modo incremental solo se leen los eventos de log_eventos de la tabla usuarios
+posteriores al último id_log procesado (checkpoint guardado en la tabla etl_checkpoints
+del Data Warehouse, como el de las cargas de hechos) y se aplican las altas, modificaciones
+y bajas de esos usuarios. La primera ejecución, sin checkpoint, realiza una sincronización
+completa.
+
+id_log es un SERIAL: una transacción que confirma tarde puede registrar un id_log menor que
+el de eventos ya leídos. Por eso cada ejecución vuelve a leer una ventana de seguridad de
+eventos por debajo del checkpoint; aplicar de nuevo un evento no tiene efecto.
 """
 
 from datetime import datetime
+import argparse
+import os
 from pulseras_inteligentes.utils.conexiones_db import (
     conectar_db_sensor_pulsera, 
-    conectar_db_transacciones
+    conectar_db_transacciones,
+    conectar_DW
 )
+from pymongo import UpdateOne
 from pulseras_inteligentes.utils.etl_funcs import manejo_errores_proceso, logger
+from pulseras_inteligentes.utils.checkpoints import leer_checkpoint, avanzar_checkpoint
+from pulseras_inteligentes.utils.extraccion_paginada import extraer_paginado, agrupar_en_lotes
+
+# Número de usuarios por llamada a bulk_write
+TAMANO_LOTE_USUARIOS = 1000
+
+# Número de eventos por página al leer log_eventos
+TAMANO_PAGINA_EVENTOS = 1000
+TAMANO_LOTE_IDS = 200  # IDs por filtro in_, para no exceder el largo de la URL
+
+# Proceso de la tabla etl_checkpoints con el último id_log procesado
+NOMBRE_CHECKPOINT_USUARIOS = "ETL_INSERTAR_USUARIOS"
+
+# Eventos por debajo del checkpoint que se vuelven a leer, para aplicar los de transacciones
+# que confirmaron después de que se leyeran eventos con id_log mayor
+VENTANA_SEGURIDAD_ID_LOG = int(os.getenv("VENTANA_SEGURIDAD_ID_LOG", "1000"))
 
 def extraer_usuarios_operacionales():
     """
     Extrae datos de usuarios desde la base de datos operacional.
     
+    Los usuarios se leen paginando por id_usuario y se entregan como un flujo.
+    
     Returns:
-        list: Lista de diccionarios con datos de usuarios.
+        Iterator[dict]: Iterador de diccionarios con datos de usuarios.
     """
     db_transacciones = conectar_db_transacciones()
-    usuarios = db_transacciones.table('usuarios').select(
-        'id_usuario', 'nombre', 'fecha_registro'
-    ).execute()
+    usuarios = extraer_paginado(
+        db_transacciones, 'usuarios', 'id_usuario, nombre, fecha_registro',
+        clave='id_usuario', prefetch=True
+    )
     
     # Conversión de fecha de registro a formato datetime
-    for usuario in usuarios.data:
+    for usuario in usuarios:
         usuario['fecha_registro'] = datetime.fromisoformat(usuario['fecha_registro'])
+        yield usuario
+
+def convertir_fechas_registro(usuarios):
+    """
+    Convierte la fecha de registro de cada usuario a formato datetime.
+    
+    Args:
+        usuarios (list): Lista de diccionarios con datos de usuarios.
+    """
+    for usuario in usuarios:
+        usuario['fecha_registro'] = datetime.fromisoformat(usuario['fecha_registro'])
+
+def extraer_ultimo_id_log_usuarios(db_transacciones):
+    """
+    Obtiene el id_log del último evento registrado para la tabla usuarios.
+    
+    Args:
+        db_transacciones: Conexión a la base de datos operacional.
+    
+    Returns:
+        int: Último id_log de la tabla usuarios, o 0 si no hay eventos.
+    """
+    respuesta = db_transacciones.table('log_eventos').select('id_log').eq(
+        'tabla_afectada', 'usuarios'
+    ).order('id_log', desc=True).limit(1).execute()
+    return respuesta.data[0]['id_log'] if respuesta.data else 0
+
+def extraer_eventos_usuarios(db_transacciones, ultimo_id_log):
+    """
+    Extrae los eventos de la tabla usuarios posteriores a un id_log, en orden.
+    
+    Args:
+        db_transacciones: Conexión a la base de datos operacional.
+        ultimo_id_log (int): Último id_log ya procesado.
+    
+    Returns:
+        list: Lista de eventos con id_log, operacion y clave_primaria.
+    """
+    eventos = list(extraer_paginado(
+        db_transacciones, 'log_eventos', 'id_log, operacion, clave_primaria',
+        clave='id_log',
+        filtros=lambda consulta: consulta.eq('tabla_afectada', 'usuarios'),
+        tamano_pagina=TAMANO_PAGINA_EVENTOS,
+        desde=ultimo_id_log
+    ))
+    
+    logger.info(f"Extraídos {len(eventos)} eventos de usuarios desde log_eventos.")
+    return eventos
+
+def extraer_usuarios_por_ids(db_transacciones, ids_usuarios):
+    """
+    Extrae de la base de datos operacional los usuarios con los IDs indicados.
+    
+    Args:
+        db_transacciones: Conexión a la base de datos operacional.
+        ids_usuarios (list): IDs de los usuarios a extraer.
     
-    logger.info(f"Extraídos {len(usuarios.data)} usuarios de la base de datos operacional.")
-    return usuarios.data
+    Returns:
+        list: Lista de diccionarios con datos de usuarios. Los usuarios que ya no
+              existen no aparecen en el resultado.
+    """
+    usuarios = []
+    for inicio in range(0, len(ids_usuarios), TAMANO_LOTE_IDS):
+        respuesta = db_transacciones.table('usuarios').select(
+            'id_usuario', 'nombre', 'fecha_registro'
+        ).in_('id_usuario', ids_usuarios[inicio:inicio + TAMANO_LOTE_IDS]).execute()
+        usuarios.extend(respuesta.data)
+    
+    convertir_fechas_registro(usuarios)
+    return usuarios
 
-def cargar_usuarios_mongodb(usuarios, db_sensor_pulsera):
+def cargar_usuarios_mongodb(usuarios, db_sensor_pulsera, tamano_lote=TAMANO_LOTE_USUARIOS):
     """
     Carga usuarios en la base de datos MongoDB de sensores.
     
+    Los usuarios se envían en lotes de operaciones upsert con bulk_write: los nuevos se
+    insertan y en los existentes se actualizan nombre y fecha de registro si cambiaron.
+    
     Args:
-        usuarios (list): Lista de diccionarios con datos de usuarios.
+        usuarios (Iterable[dict]): Usuarios a cargar.
         db_sensor_pulsera (MongoClient): Conexión a la base de datos MongoDB.
+        tamano_lote (int): Número de operaciones por llamada a bulk_write.
     
     Returns:
         tuple: (contador_insertados, contador_existentes) con el número de usuarios
@@ -46,42 +150,136 @@ def cargar_usuarios_mongodb(usuarios, db_sensor_pulsera):
     """
     usuarios_db_sensor = db_sensor_pulsera.pulseras_inteligentes.usuarios_sensor
     
+    # El índice único garantiza un documento por usuario y acelera el filtro de cada upsert
+    usuarios_db_sensor.create_index("id_usuario", unique=True)
+    
     contador_insertados = 0
     contador_existentes = 0
+    contador_modificados = 0
     
-    for usuario in usuarios:
-        if not usuarios_db_sensor.find_one({"id_usuario": usuario['id_usuario']}):
-            usuarios_db_sensor.insert_one(usuario)
-            logger.info(f"Usuario insertado: {usuario['nombre']} (ID: {usuario['id_usuario']})")
-            contador_insertados += 1
-        else:
-            logger.debug(f"Usuario ya existe: {usuario['nombre']} (ID: {usuario['id_usuario']})")
-            contador_existentes += 1
-    
-    logger.info(f"Usuarios insertados: {contador_insertados}, usuarios existentes: {contador_existentes}")
+    for lote in agrupar_en_lotes(usuarios, tamano_lote):
+        operaciones = [
+            UpdateOne(
+                {"id_usuario": usuario['id_usuario']},
+                {"$set": {"nombre": usuario['nombre'], "fecha_registro": usuario['fecha_registro']}},
+                upsert=True
+            )
+            for usuario in lote
+        ]
+        resultado = usuarios_db_sensor.bulk_write(operaciones, ordered=False)
+        
+        contador_insertados += resultado.upserted_count
+        contador_existentes += resultado.matched_count
+        contador_modificados += resultado.modified_count
+        logger.debug(f"Lote de {len(operaciones)} usuarios: "
+                     f"{resultado.upserted_count} insertados, {resultado.modified_count} actualizados")
+    
+    logger.info(f"Usuarios insertados: {contador_insertados}, usuarios existentes: {contador_existentes} "
+                f"({contador_modificados} actualizados)")
     return contador_insertados, contador_existentes
 
-def main():
+def eliminar_usuarios_mongodb(ids_usuarios, db_sensor_pulsera):
+    """
+    Elimina usuarios de la base de datos MongoDB de sensores.
+    
+    Args:
+        ids_usuarios (list): IDs de los usuarios a eliminar.
+        db_sensor_pulsera (MongoClient): Conexión a la base de datos MongoDB.
+    
+    Returns:
+        int: Número de usuarios eliminados.
+    """
+    if not ids_usuarios:
+        return 0
+    
+    resultado = db_sensor_pulsera.pulseras_inteligentes.usuarios_sensor.delete_many(
+        {"id_usuario": {"$in": ids_usuarios}}
+    )
+    logger.info(f"Usuarios eliminados: {resultado.deleted_count}")
+    return resultado.deleted_count
+
+def sincronizar_usuarios_incremental(db_transacciones, db_sensor_pulsera, ultimo_id_log,
+                                     ventana=VENTANA_SEGURIDAD_ID_LOG):
+    """
+    Aplica en MongoDB los cambios de usuarios registrados en log_eventos después de un id_log.
+    
+    Se leen también los eventos de la ventana de seguridad por debajo del checkpoint. Los eventos
+    se agrupan por usuario y solo se considera su última operación: los usuarios cuyo último
+    evento es una baja se eliminan y el resto se vuelve a leer de la base operacional y se carga
+    con upsert, por lo que volver a aplicar un evento no tiene efecto.
+    
+    Args:
+        db_transacciones: Conexión a la base de datos operacional.
+        db_sensor_pulsera (MongoClient): Conexión a la base de datos MongoDB.
+        ultimo_id_log (int): Último id_log ya procesado.
+        ventana (int): Número de id_log por debajo del checkpoint que se vuelven a leer.
+    
+    Returns:
+        int: Nuevo checkpoint (mayor id_log aplicado).
+    """
+    eventos = extraer_eventos_usuarios(db_transacciones, max(0, ultimo_id_log - ventana))
+    if not eventos:
+        logger.info("No hay cambios de usuarios desde el último checkpoint.")
+        return ultimo_id_log
+    
+    # Última operación de cada usuario (los eventos vienen ordenados por id_log)
+    ultima_operacion = {int(evento['clave_primaria']): evento['operacion'] for evento in eventos}
+    ids_eliminados = [id_usuario for id_usuario, operacion in ultima_operacion.items() if operacion == 'DELETE']
+    ids_modificados = [id_usuario for id_usuario, operacion in ultima_operacion.items() if operacion != 'DELETE']
+    
+    usuarios = extraer_usuarios_por_ids(db_transacciones, ids_modificados)
+    cargar_usuarios_mongodb(usuarios, db_sensor_pulsera)
+    
+    # Un usuario modificado que ya no existe fue eliminado después del último evento leído
+    ids_encontrados = {usuario['id_usuario'] for usuario in usuarios}
+    ids_eliminados += [id_usuario for id_usuario in ids_modificados if id_usuario not in ids_encontrados]
+    eliminar_usuarios_mongodb(ids_eliminados, db_sensor_pulsera)
+    
+    logger.info(f"Sincronización incremental: {len(eventos)} eventos, {len(ultima_operacion)} usuarios afectados.")
+    return max(ultimo_id_log, eventos[-1]['id_log'])
+
+def main(incremental=True):
     """
     Función principal que coordina el proceso ETL de inserción de usuarios.
+    
+    Args:
+        incremental (bool): Si es True, solo aplica los cambios registrados en log_eventos
+            desde el último checkpoint. Sin checkpoint, o con False, sincroniza todos los usuarios.
     """
     nombre_proceso = "ETL_INSERTAR_USUARIOS"
     
     with manejo_errores_proceso(nombre_proceso):
-        # Conexión a la base de datos MongoDB
+        # Conexión a la base de datos MongoDB y al Data Warehouse, donde se guarda el checkpoint
         db_sensor_pulsera = conectar_db_sensor_pulsera()
+        db_dw = conectar_DW()
         
         try:
-            # Extracción de usuarios
-            usuarios = extraer_usuarios_operacionales()
+            checkpoint = leer_checkpoint(db_dw, NOMBRE_CHECKPOINT_USUARIOS) if incremental else None
+            ultimo_id_log = checkpoint["ultimo_id"] if checkpoint else None
             
-            # Carga de usuarios en MongoDB
-            cargar_usuarios_mongodb(usuarios, db_sensor_pulsera)
+            if ultimo_id_log is not None:
+                db_transacciones = conectar_db_transacciones()
+                nuevo_id_log = sincronizar_usuarios_incremental(db_transacciones, db_sensor_pulsera, ultimo_id_log)
+            else:
+                # El checkpoint se toma antes de extraer: los eventos concurrentes con la
+                # carga completa se vuelven a aplicar en la siguiente ejecución
+                nuevo_id_log = extraer_ultimo_id_log_usuarios(conectar_db_transacciones())
+                
+                # Extracción de usuarios
+                usuarios = extraer_usuarios_operacionales()
+                
+                # Carga de usuarios en MongoDB
+                cargar_usuarios_mongodb(usuarios, db_sensor_pulsera)
             
+            avanzar_checkpoint(db_dw, NOMBRE_CHECKPOINT_USUARIOS, ultimo_id=nuevo_id_log)
+            logger.info(f"Checkpoint de sincronización de usuarios en id_log {nuevo_id_log}")
             logger.info(f"{nombre_proceso}: Proceso completado con éxito.")
         finally:
             # Cerrar conexión
             db_sensor_pulsera.close()
 
 if __name__ == "__main__":
-    main()
+    argumentos = argparse.ArgumentParser(description="Sincronización de usuarios operacionales a MongoDB")
+    argumentos.add_argument("--completo", action="store_true", help="Sincroniza todos los usuarios ignorando el checkpoint")
+    args = argumentos.parse_args()
+    main(incremental=not args.completo)
@@ -0,0 +1,201 @@
+"""
+Módulo para el almacenamiento de muestras por minuto de frecuencia cardíaca y pasos.
+
+La pulsera registra una muestra de frecuencia cardíaca (lpm) y de pasos por minuto, es decir,
+1440 muestras por usuario y día. Para que el volumen sea manejable se guarda un documento por
+usuario y hora en la colección frecuencia_cardiaca, con las 60 muestras de la hora empaquetadas
+como arrays binarios:
+
+- 'fc': 60 valores uint8 (lpm; 0 indica minuto sin lectura, p. ej. pulsera sin colocar).
+- 'pasos': 60 valores uint16 little-endian.
+
+Cada documento incluye además un resumen de la hora (fc_prom, pasos_total) para consultas que
+no necesitan las muestras. El lector decodifica los arrays con numpy.frombuffer sin copiar los datos.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional, Tuple
+import numpy as np
+from bson.binary import Binary
+from pymongo import MongoClient
+from pymongo.errors import OperationFailure
+from pulseras_inteligentes.utils.escritor_mongo import EscritorLotesMongo, TAMANO_LOTE_DEFECTO
+from pulseras_inteligentes.utils.etl_funcs import logger
+
+COLECCION_FRECUENCIA_CARDIACA = "frecuencia_cardiaca"
+
+MUESTRAS_POR_HORA = 60
+MUESTRAS_POR_DIA = 24 * MUESTRAS_POR_HORA
+
+# Tipos de dato de los arrays empaquetados (orden de bytes explícito para que el formato sea portable)
+DTYPE_FC = np.dtype("<u1")
+DTYPE_PASOS = np.dtype("<u2")
+
+# Valor de frecuencia cardíaca para los minutos sin lectura
+FC_SIN_LECTURA = 0
+
+
+def codificar_hora(id_usuario: int, hora: datetime, fc: np.ndarray, pasos: np.ndarray) -> Dict[str, Any]:
+    """
+    Construye el documento de una hora a partir de sus muestras por minuto.
+
+    Args:
+        id_usuario: ID del usuario.
+        hora: Inicio de la hora (minuto y segundo en 0).
+        fc: Array de 60 valores de frecuencia cardíaca en lpm (0 = sin lectura).
+        pasos: Array de 60 valores de pasos por minuto.
+
+    Returns:
+        Dict[str, Any]: Documento listo para insertar en la colección frecuencia_cardiaca.
+    """
+    fc = np.asarray(fc, dtype=DTYPE_FC)
+    pasos = np.asarray(pasos, dtype=DTYPE_PASOS)
+    if len(fc) != MUESTRAS_POR_HORA or len(pasos) != MUESTRAS_POR_HORA:
+        raise ValueError(f"Se esperaban {MUESTRAS_POR_HORA} muestras de fc y pasos por hora")
+
+    con_lectura = fc != FC_SIN_LECTURA
+    return {
+        "id_usuario": int(id_usuario),
+        "hora": hora,
+        "n_muestras": int(con_lectura.sum()),
+        "fc_prom": round(float(fc[con_lectura].mean()), 1) if con_lectura.any() else None,
+        "pasos_total": int(pasos.sum()),
+        "fc": Binary(fc.tobytes()),
+        "pasos": Binary(pasos.tobytes()),
+    }
+
+
+def decodificar_hora(documento: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decodifica las muestras de un documento horario sin copiar los datos.
+
+    Los arrays devueltos son de solo lectura y comparten memoria con el documento.
+
+    Args:
+        documento: Documento de la colección frecuencia_cardiaca.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Arrays de frecuencia cardíaca (uint8) y pasos (uint16).
+    """
+    return (
+        np.frombuffer(documento["fc"], dtype=DTYPE_FC),
+        np.frombuffer(documento["pasos"], dtype=DTYPE_PASOS),
+    )
+
+
+def crear_escritor_frecuencia_cardiaca(db_sensor_pulsera: MongoClient,
+                                       tamano_lote: int = TAMANO_LOTE_DEFECTO) -> EscritorLotesMongo:
+    """
+    Crea el escritor por lotes de la colección frecuencia_cardiaca, asegurando su índice.
+
+    Args:
+        db_sensor_pulsera: Cliente de MongoDB.
+        tamano_lote: Número de documentos horarios por lote.
+
+    Returns:
+        EscritorLotesMongo: Escritor de la colección.
+    """
+    coleccion = db_sensor_pulsera.pulseras_inteligentes[COLECCION_FRECUENCIA_CARDIACA]
+    # Un único documento por usuario y hora; el índice también sirve a las lecturas por rango
+    coleccion.create_index([("id_usuario", 1), ("hora", 1)], unique=True)
+    return EscritorLotesMongo(coleccion, tamano_lote=tamano_lote)
+
+
+def iterar_horas_frecuencia_cardiaca(db_sensor_pulsera: MongoClient, id_usuario: int, desde: datetime,
+                                     hasta: Optional[datetime] = None
+                                     ) -> Iterator[Tuple[datetime, np.ndarray, np.ndarray]]:
+    """
+    Recorre en orden las horas de un usuario en un rango, decodificando cada una sin copias.
+
+    Args:
+        db_sensor_pulsera: Cliente de MongoDB.
+        id_usuario: ID del usuario.
+        desde: Inicio del rango (inclusive).
+        hasta: Fin del rango (exclusivo, opcional).
+
+    Yields:
+        Tuple[datetime, np.ndarray, np.ndarray]: Inicio de la hora, frecuencia cardíaca y pasos.
+    """
+    coleccion = db_sensor_pulsera.pulseras_inteligentes[COLECCION_FRECUENCIA_CARDIACA]
+    filtro_hora = {"$gte": desde}
+    if hasta is not None:
+        filtro_hora["$lt"] = hasta
+
+    cursor = coleccion.find(
+        {"id_usuario": id_usuario, "hora": filtro_hora},
+        {"_id": 0, "hora": 1, "fc": 1, "pasos": 1}
+    ).sort("hora", 1)
+
+    for documento in cursor:
+        fc, pasos = decodificar_hora(documento)
+        yield documento["hora"], fc, pasos
+
+
+def leer_frecuencia_cardiaca(db_sensor_pulsera: MongoClient, id_usuario: int, desde: datetime,
+                             hasta: Optional[datetime] = None) -> Dict[str, np.ndarray]:
+    """
+    Lee las muestras por minuto de un usuario en un rango como series continuas de NumPy.
+
+    Args:
+        db_sensor_pulsera: Cliente de MongoDB.
+        id_usuario: ID del usuario.
+        desde: Inicio del rango (inclusive).
+        hasta: Fin del rango (exclusivo, opcional).
+
+    Returns:
+        Dict[str, np.ndarray]: Arrays paralelos 'minuto' (datetime64[m]), 'fc' (uint8) y 'pasos' (uint16).
+        Los minutos sin lectura tienen fc igual a 0.
+    """
+    horas, series_fc, series_pasos = [], [], []
+    for hora, fc, pasos in iterar_horas_frecuencia_cardiaca(db_sensor_pulsera, id_usuario, desde, hasta):
+        horas.append(hora)
+        series_fc.append(fc)
+        series_pasos.append(pasos)
+
+    if not horas:
+        return {
+            "minuto": np.empty(0, dtype="datetime64[m]"),
+            "fc": np.empty(0, dtype=DTYPE_FC),
+            "pasos": np.empty(0, dtype=DTYPE_PASOS),
+        }
+
+    # Cada hora aporta 60 minutos consecutivos a partir de su inicio
+    minutos = (np.array(horas, dtype="datetime64[m]")[:, None] + np.arange(MUESTRAS_POR_HORA)).ravel()
+    return {
+        "minuto": minutos,
+        "fc": np.concatenate(series_fc),
+        "pasos": np.concatenate(series_pasos),
+    }
+
+
+def registrar_almacenamiento_frecuencia_cardiaca(db_sensor_pulsera: MongoClient) -> Optional[Dict[str, float]]:
+    """
+    Registra en el log el tamaño de la colección frecuencia_cardiaca y el costo por usuario-día.
+
+    Args:
+        db_sensor_pulsera: Cliente de MongoDB.
+
+    Returns:
+        Optional[Dict[str, float]]: Número de documentos, tamaño de datos y en disco (bytes) y bytes
+        en disco por usuario-día, o None si el servidor no entrega estadísticas.
+    """
+    coleccion = db_sensor_pulsera.pulseras_inteligentes[COLECCION_FRECUENCIA_CARDIACA]
+    try:
+        estadisticas = next(coleccion.aggregate([{"$collStats": {"storageStats": {}}}]))["storageStats"]
+    except (OperationFailure, StopIteration, KeyError) as e:
+        logger.warning(f"No se pudieron obtener estadísticas de {COLECCION_FRECUENCIA_CARDIACA}: {e}")
+        return None
+
+    documentos = estadisticas.get("count", 0)
+    usuarios_dia = documentos / 24
+    resumen = {
+        "documentos": documentos,
+        "bytes_datos": estadisticas.get("size", 0),
+        "bytes_disco": estadisticas.get("storageSize", 0),
+        "bytes_por_usuario_dia": estadisticas.get("storageSize", 0) / usuarios_dia if usuarios_dia else 0.0,
+    }
+    logger.info(f"Almacenamiento de {COLECCION_FRECUENCIA_CARDIACA}: {resumen['documentos']} documentos, "
+                f"{resumen['bytes_datos'] / 1024 ** 2:.1f} MB de datos, "
+                f"{resumen['bytes_disco'] / 1024 ** 2:.1f} MB en disco, "
+                f"{resumen['bytes_por_usuario_dia']:.0f} bytes por usuario-día")
+    return resumen
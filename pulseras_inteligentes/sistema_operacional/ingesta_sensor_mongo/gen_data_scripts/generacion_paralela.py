@@ -0,0 +1,187 @@
+"""
+Módulo para la generación en paralelo de datos simulados de sensores y aplicación.
+
+Este módulo reparte la lista de usuarios_sensor en shards de tamaño fijo y los procesa
+en un ProcessPoolExecutor. Cada shard se genera con su propio cliente de MongoDB y con
+un flujo aleatorio derivado de una semilla maestra y del índice del shard, de modo que
+el resultado es el mismo para cualquier número de workers.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Optional
+import random
+import time
+import numpy as np
+from pulseras_inteligentes.utils.conexiones_db import conectar_db_sensor_pulsera
+from pulseras_inteligentes.utils.escritor_mongo import EscritorLotesMongo, TAMANO_LOTE_DEFECTO
+from pulseras_inteligentes.utils.etl_funcs import logger
+from pulseras_inteligentes.sistema_operacional.ingesta_sensor_mongo.almacenamiento_sensor import crear_escritor_sensor
+from pulseras_inteligentes.sistema_operacional.ingesta_sensor_mongo.gen_data_scripts.marcas_generacion import (
+    actualizar_marcas
+)
+
+# Número de usuarios por shard. Define la partición de los flujos aleatorios,
+# por lo que no debe depender del número de workers.
+TAMANO_SHARD_DEFECTO = 500
+
+TIPOS_GENERACION = ("sensores", "aplicacion")
+
+
+def dividir_en_shards(usuarios: list, tamano_shard: int = TAMANO_SHARD_DEFECTO) -> List[list]:
+    """
+    Divide la lista de usuarios en shards de tamaño fijo, ordenados por ID de usuario.
+
+    Args:
+        usuarios: Lista de documentos de usuarios con sus IDs.
+        tamano_shard: Número de usuarios por shard.
+
+    Returns:
+        List[list]: Lista de shards, cada uno con documentos reducidos a id_usuario y nombre.
+    """
+    usuarios_ordenados = sorted(
+        ({"id_usuario": u["id_usuario"], "nombre": u.get("nombre", "Sin nombre")} for u in usuarios),
+        key=lambda u: u["id_usuario"]
+    )
+    return [usuarios_ordenados[i:i + tamano_shard] for i in range(0, len(usuarios_ordenados), tamano_shard)]
+
+
+def derivar_semilla(semilla_maestra: int, indice_shard: int) -> np.random.SeedSequence:
+    """
+    Deriva la secuencia de semillas independiente de un shard a partir de la semilla maestra.
+
+    Args:
+        semilla_maestra: Semilla maestra de la ejecución.
+        indice_shard: Índice del shard.
+
+    Returns:
+        np.random.SeedSequence: Secuencia de semillas del shard.
+    """
+    return np.random.SeedSequence(semilla_maestra, spawn_key=(indice_shard,))
+
+
+def generar_shard(tipo: str, indice_shard: int, usuarios_shard: list, n_dias: int,
+                  fecha_referencia: datetime, semilla_maestra: int, tamano_lote: int,
+                  marcas: Optional[Dict[int, datetime]] = None) -> int:
+    """
+    Genera e inserta los datos de un shard de usuarios. Se ejecuta dentro de cada
+    proceso worker y abre su propia conexión a MongoDB.
+
+    Args:
+        tipo: Tipo de datos a generar ('sensores' o 'aplicacion').
+        indice_shard: Índice del shard.
+        usuarios_shard: Usuarios del shard.
+        n_dias: Número de días a generar.
+        fecha_referencia: Fecha desde la que se cuentan los días, común a todos los shards.
+        semilla_maestra: Semilla maestra de la ejecución.
+        tamano_lote: Número de documentos por lote de inserción.
+        marcas: Último día generado por cada usuario del shard. Si se indica, solo se
+            generan los días pendientes y las marcas se avanzan al terminar de escribir.
+
+    Returns:
+        int: Número de registros generados en el shard.
+    """
+    # Importaciones diferidas para evitar dependencias circulares con los scripts de generación
+    from pulseras_inteligentes.sistema_operacional.ingesta_sensor_mongo.gen_data_scripts.generacion_vectorizada import (
+        generar_datos_actividades_vectorizado
+    )
+    from pulseras_inteligentes.sistema_operacional.ingesta_sensor_mongo.gen_data_scripts.generar_registros_aplicacion import (
+        generar_datos_aplicacion
+    )
+
+    semilla_shard = derivar_semilla(semilla_maestra, indice_shard)
+    db_sensor_pulsera = conectar_db_sensor_pulsera()
+
+    try:
+        if tipo == "sensores":
+            nombre_coleccion = "datos_sensor"
+            with crear_escritor_sensor(db_sensor_pulsera, tamano_lote=tamano_lote) as escritor:
+                rng = np.random.default_rng(semilla_shard)
+                registros = generar_datos_actividades_vectorizado(
+                    n_dias, usuarios_shard, escritor, rng, fecha_referencia=fecha_referencia, marcas=marcas
+                )
+        else:
+            nombre_coleccion = "datos_aplicacion"
+            coleccion = db_sensor_pulsera.pulseras_inteligentes[nombre_coleccion]
+            with EscritorLotesMongo(coleccion, tamano_lote=tamano_lote) as escritor:
+                rng = random.Random(int(semilla_shard.generate_state(1)[0]))
+                registros = generar_datos_aplicacion(
+                    n_dias, usuarios_shard, escritor, rng=rng, fecha_referencia=fecha_referencia, marcas=marcas
+                )
+
+        if marcas is not None:
+            actualizar_marcas(db_sensor_pulsera, nombre_coleccion,
+                              [usuario["id_usuario"] for usuario in usuarios_shard], fecha_referencia,
+                              usuarios_rechazados=escritor.usuarios_con_errores)
+        return registros
+    finally:
+        db_sensor_pulsera.close()
+
+
+def generar_en_paralelo(tipo: str, usuarios: list, n_dias: int, workers: int = 1,
+                        semilla: Optional[int] = None, tamano_lote: int = TAMANO_LOTE_DEFECTO,
+                        tamano_shard: int = TAMANO_SHARD_DEFECTO,
+                        fecha_referencia: Optional[datetime] = None,
+                        marcas: Optional[Dict[int, datetime]] = None) -> int:
+    """
+    Genera datos de sensores o de aplicación repartiendo los usuarios en shards
+    que se procesan en un pool de procesos.
+
+    Args:
+        tipo: Tipo de datos a generar ('sensores' o 'aplicacion').
+        usuarios: Lista de documentos de usuarios con sus IDs.
+        n_dias: Número de días a generar.
+        workers: Número de procesos. Con 1 los shards se procesan en el proceso actual.
+        semilla: Semilla maestra. Si no se indica se genera una y se registra en el log.
+        tamano_lote: Número de documentos por lote de inserción.
+        tamano_shard: Número de usuarios por shard.
+        fecha_referencia: Fecha desde la que se cuentan los días (por defecto, ahora).
+        marcas: Último día generado por usuario, para generar solo los días pendientes (opcional).
+
+    Returns:
+        int: Total de registros generados por todos los shards.
+    """
+    if tipo not in TIPOS_GENERACION:
+        raise ValueError(f"Tipo de generación no válido: {tipo}")
+
+    if semilla is None:
+        semilla = np.random.SeedSequence().entropy
+    if fecha_referencia is None:
+        fecha_referencia = datetime.now()
+
+    shards = dividir_en_shards(usuarios, tamano_shard)
+    logger.info(f"Generación en paralelo de {tipo}: {len(usuarios)} usuarios en {len(shards)} shards, "
+                f"{workers} workers, semilla maestra {semilla}")
+
+    inicio = time.perf_counter()
+    total_registros = 0
+
+    def marcas_shard(usuarios_shard: list) -> Optional[Dict[int, datetime]]:
+        # Cada worker recibe solo las marcas de sus usuarios
+        if marcas is None:
+            return None
+        return {u["id_usuario"]: marcas[u["id_usuario"]] for u in usuarios_shard if u["id_usuario"] in marcas}
+
+    if workers <= 1:
+        for indice, usuarios_shard in enumerate(shards):
+            total_registros += generar_shard(
+                tipo, indice, usuarios_shard, n_dias, fecha_referencia, semilla, tamano_lote,
+                marcas_shard(usuarios_shard)
+            )
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futuros = {
+                pool.submit(generar_shard, tipo, indice, usuarios_shard, n_dias,
+                            fecha_referencia, semilla, tamano_lote, marcas_shard(usuarios_shard)): indice
+                for indice, usuarios_shard in enumerate(shards)
+            }
+            for futuro in as_completed(futuros):
+                registros_shard = futuro.result()
+                total_registros += registros_shard
+                logger.debug(f"Shard {futuros[futuro]} de {tipo} completado: {registros_shard} registros")
+
+    duracion = time.perf_counter() - inicio
+    registros_por_segundo = total_registros / duracion if duracion > 0 else 0
+    logger.info(f"Generación en paralelo de {tipo} finalizada: {total_registros} registros en "
+                f"{duracion:.2f}s ({registros_por_segundo:.0f} registros/s)")
+    return total_registros
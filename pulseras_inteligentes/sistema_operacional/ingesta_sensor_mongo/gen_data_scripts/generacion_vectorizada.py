@@ -0,0 +1,320 @@
+"""
+Motor vectorizado para la generación de datos simulados de sensores de pulsera.
+
+Este módulo genera los mismos registros que las funciones de generar_registros_sensores
+(actividad física, reposo, sueño y glucosa), pero sorteando de una sola vez todos los
+valores de un conjunto de pares usuario-día con un numpy.random.Generator. Los documentos
+resultantes tienen exactamente el mismo esquema que los generados registro a registro.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from pulseras_inteligentes.utils.etl_funcs import logger
+from pulseras_inteligentes.sistema_operacional.ingesta_sensor_mongo.gen_data_scripts.marcas_generacion import (
+    calcular_dias_pendientes
+)
+
+# Catálogos de valores posibles para cada tipo de registro
+TIPOS_ACTIVIDAD = np.array(["caminar", "correr", "ciclismo", "entrenamiento_fuerza", "yoga"])
+ACTIVIDADES_CON_DISTANCIA = ["caminar", "correr", "ciclismo"]
+ACTIVIDADES_CON_PASOS = ["caminar", "correr"]
+INTERRUPCIONES_SUENO = np.array([0, 1, 2, 3])
+PESOS_INTERRUPCIONES_SUENO = np.array([0.6, 0.2, 0.15, 0.05])
+
+# Número de usuarios que se procesan en memoria a la vez
+TAMANO_BLOQUE_USUARIOS = 1000
+
+
+def construir_grilla_usuarios_dias(ids_usuarios: List[int], n_dias: int,
+                                   fecha_referencia: Optional[datetime] = None,
+                                   marcas: Optional[Dict[int, datetime]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Construye los pares usuario-día a generar para un conjunto de usuarios.
+
+    Args:
+        ids_usuarios: Lista de IDs de usuario.
+        n_dias: Número de días hacia atrás desde la fecha de referencia.
+        fecha_referencia: Fecha desde la que se cuentan los días (por defecto, ahora).
+        marcas: Último día generado por usuario. Si se indica, solo se incluyen los días
+            posteriores a la marca de cada usuario.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Arrays paralelos de IDs de usuario y fechas base
+        (datetime64[us]), uno por cada par usuario-día.
+    """
+    if fecha_referencia is None:
+        fecha_referencia = datetime.now()
+
+    if marcas is None:
+        dias_por_usuario = np.full(len(ids_usuarios), n_dias, dtype=np.int64)
+    else:
+        dias_por_usuario = np.array(
+            [calcular_dias_pendientes(marcas.get(id_usuario), n_dias, fecha_referencia) for id_usuario in ids_usuarios],
+            dtype=np.int64
+        )
+
+    # Desplazamiento en días de cada par: 0..k-1 para cada usuario con k días pendientes
+    ids = np.repeat(np.asarray(ids_usuarios, dtype=np.int64), dias_por_usuario)
+    inicio_usuario = np.repeat(np.cumsum(dias_por_usuario) - dias_por_usuario, dias_por_usuario)
+    desplazamientos = np.arange(len(ids)) - inicio_usuario
+    fechas = np.datetime64(fecha_referencia, "us") - desplazamientos * np.timedelta64(1, "D")
+    return ids, fechas
+
+
+def _enteros(valores: np.ndarray) -> np.ndarray:
+    """
+    Trunca hacia cero como lo hace int() en Python.
+    """
+    return np.trunc(valores).astype(np.int64)
+
+
+def _fijar_hora(fechas_base: np.ndarray, horas: np.ndarray, minutos: np.ndarray) -> List[datetime]:
+    """
+    Equivalente vectorizado de fecha_base.replace(hour=..., minute=...): conserva
+    segundos y microsegundos de la fecha base y reemplaza hora y minuto.
+    """
+    resto_minuto = fechas_base - fechas_base.astype("datetime64[m]")
+    resultado = (
+        fechas_base.astype("datetime64[D]").astype("datetime64[us]")
+        + horas.astype("timedelta64[h]")
+        + minutos.astype("timedelta64[m]")
+        + resto_minuto
+    )
+    return resultado.astype(datetime).tolist()
+
+
+def generar_lote_actividad(rng: np.random.Generator, ids: np.ndarray, fechas_base: np.ndarray) -> List[Dict[str, Any]]:
+    """
+    Genera los registros de actividad física para todos los pares usuario-día.
+
+    Args:
+        rng: Generador de números aleatorios de NumPy.
+        ids: Array de IDs de usuario.
+        fechas_base: Array de fechas base (datetime64[us]) paralelo a ids.
+
+    Returns:
+        List[Dict[str, Any]]: Documentos de actividad (80% de los pares aproximadamente).
+    """
+    tiene_actividad = rng.random(len(ids)) > 0.2  # 80% de probabilidad de actividad
+    ids = ids[tiene_actividad]
+    fechas_base = fechas_base[tiene_actividad]
+    n = len(ids)
+
+    tipos = rng.choice(TIPOS_ACTIVIDAD, size=n)
+    timestamps = _fijar_hora(fechas_base, rng.integers(7, 20, size=n), rng.integers(0, 60, size=n))
+    duracion = _enteros(rng.exponential(60, size=n)) + 1  # Duración media de 60 minutos
+    calorias = np.maximum(50, _enteros(rng.normal(duracion * 7, duracion * 3)))
+
+    # Se sortean todos los valores y luego se enmascaran según el tipo de actividad
+    con_distancia = np.isin(tipos, ACTIVIDADES_CON_DISTANCIA)
+    con_pasos = np.isin(tipos, ACTIVIDADES_CON_PASOS)
+    es_fuerza = tipos == "entrenamiento_fuerza"
+    distancia = np.round(duracion * 0.1, 2)
+    repeticiones = _enteros(rng.triangular(5, 10, 15, size=n))
+    peso_levantado = np.round(rng.uniform(20, 100, size=n), 2)
+    ritmo_cardiaco = _enteros(rng.normal(100 + duracion * 0.5, 15))
+    pasos = _enteros(rng.normal(duracion * 100, duracion * 30))
+
+    return [
+        {
+            "id_usuario": id_usuario,
+            "tipo_registro": "actividad",
+            "timestamp": timestamp,
+            "datos": {
+                "tipo_actividad": tipo,
+                "duracion_min": dur,
+                "distancia_km": dist if c_dist else None,
+                "pasos": p if c_pasos else None,
+                "calorias_quemadas": cal,
+                "repeticiones": rep if fuerza else None,
+                "peso_levantado_kg": peso if fuerza else None,
+                "ritmo_cardiaco_prom": ritmo if c_dist else None
+            }
+        }
+        for id_usuario, timestamp, tipo, dur, dist, p, cal, rep, peso, ritmo, c_dist, c_pasos, fuerza in zip(
+            ids.tolist(), timestamps, tipos.tolist(), duracion.tolist(), distancia.tolist(),
+            pasos.tolist(), calorias.tolist(), repeticiones.tolist(), peso_levantado.tolist(),
+            ritmo_cardiaco.tolist(), con_distancia.tolist(), con_pasos.tolist(), es_fuerza.tolist()
+        )
+    ]
+
+
+def generar_lote_reposo(rng: np.random.Generator, ids: np.ndarray, fechas_base: np.ndarray) -> List[Dict[str, Any]]:
+    """
+    Genera los registros de reposo para todos los pares usuario-día.
+
+    Args:
+        rng: Generador de números aleatorios de NumPy.
+        ids: Array de IDs de usuario.
+        fechas_base: Array de fechas base (datetime64[us]) paralelo a ids.
+
+    Returns:
+        List[Dict[str, Any]]: Documentos de reposo (90% de los pares aproximadamente).
+    """
+    tiene_reposo = rng.random(len(ids)) > 0.1  # 90% de probabilidad de tener datos de reposo
+    ids = ids[tiene_reposo]
+    fechas_base = fechas_base[tiene_reposo]
+    n = len(ids)
+
+    timestamps = _fijar_hora(fechas_base, rng.integers(12, 17, size=n), rng.integers(0, 60, size=n))
+    minutos_sin_movimiento = _enteros(rng.exponential(30, size=n)) + 1  # Media de 30 min
+    frecuencia_respiratoria = np.round(rng.normal(12, 2, size=n), 1)
+    hrv_ms = _enteros(rng.normal(50, 15, size=n))  # Variabilidad de frecuencia cardíaca
+
+    return [
+        {
+            "id_usuario": id_usuario,
+            "tipo_registro": "reposo",
+            "timestamp": timestamp,
+            "datos": {
+                "minutos_sin_movimiento": minutos,
+                "frecuencia_respiratoria": frecuencia,
+                "hrv_ms": hrv
+            }
+        }
+        for id_usuario, timestamp, minutos, frecuencia, hrv in zip(
+            ids.tolist(), timestamps, minutos_sin_movimiento.tolist(),
+            frecuencia_respiratoria.tolist(), hrv_ms.tolist()
+        )
+    ]
+
+
+def generar_lote_sueno(rng: np.random.Generator, ids: np.ndarray, fechas_base: np.ndarray) -> List[Dict[str, Any]]:
+    """
+    Genera los registros de sueño para todos los pares usuario-día.
+
+    Args:
+        rng: Generador de números aleatorios de NumPy.
+        ids: Array de IDs de usuario.
+        fechas_base: Array de fechas base (datetime64[us]) paralelo a ids.
+
+    Returns:
+        List[Dict[str, Any]]: Documentos de sueño, uno por par usuario-día.
+    """
+    n = len(ids)
+
+    timestamps = _fijar_hora(fechas_base, rng.integers(22, 24, size=n), rng.integers(0, 60, size=n))
+    duracion_total = _enteros(rng.normal(480, 30, size=n))  # Duración media de 8 horas
+    profundo = _enteros(rng.triangular(90, 120, 180, size=n))
+    ligero = _enteros(rng.triangular(180, 240, 300, size=n))
+    interrupciones = rng.choice(INTERRUPCIONES_SUENO, size=n, p=PESOS_INTERRUPCIONES_SUENO)
+    latencia = _enteros(rng.exponential(10, size=n)) + 1  # Tiempo para conciliar el sueño
+
+    return [
+        {
+            "id_usuario": id_usuario,
+            "tipo_registro": "sueño",
+            "timestamp": timestamp,
+            "datos": {
+                "duracion_total_min": total,
+                "sueño_profundo_min": prof,
+                "sueño_ligero_min": lig,
+                "interrupciones": inter,
+                "latencia_sueno_min": lat
+            }
+        }
+        for id_usuario, timestamp, total, prof, lig, inter, lat in zip(
+            ids.tolist(), timestamps, duracion_total.tolist(), profundo.tolist(),
+            ligero.tolist(), interrupciones.tolist(), latencia.tolist()
+        )
+    ]
+
+
+def generar_lote_glucosa(rng: np.random.Generator, ids: np.ndarray, fechas_base: np.ndarray) -> List[Dict[str, Any]]:
+    """
+    Genera los registros de glucosa para todos los pares usuario-día.
+
+    Args:
+        rng: Generador de números aleatorios de NumPy.
+        ids: Array de IDs de usuario.
+        fechas_base: Array de fechas base (datetime64[us]) paralelo a ids.
+
+    Returns:
+        List[Dict[str, Any]]: Documentos de glucosa, uno por par usuario-día.
+    """
+    n = len(ids)
+
+    timestamps = _fijar_hora(fechas_base, rng.integers(7, 11, size=n), rng.integers(0, 60, size=n))
+    nivel_glucosa = np.clip(_enteros(rng.normal(90, 15, size=n)), 60, 180)  # Limitar a rango realista
+    medicion_ayunas = rng.random(n) < 0.5
+
+    return [
+        {
+            "id_usuario": id_usuario,
+            "tipo_registro": "glucosa",
+            "timestamp": timestamp,
+            "datos": {
+                "nivel_glucosa": nivel,
+                "unidad": "mg/dL",
+                "medicion_ayunas": ayunas
+            }
+        }
+        for id_usuario, timestamp, nivel, ayunas in zip(
+            ids.tolist(), timestamps, nivel_glucosa.tolist(), medicion_ayunas.tolist()
+        )
+    ]
+
+
+def generar_lote_sensores(rng: np.random.Generator, ids: np.ndarray, fechas_base: np.ndarray) -> List[Dict[str, Any]]:
+    """
+    Genera todos los tipos de registro de sensor para los pares usuario-día dados.
+
+    Args:
+        rng: Generador de números aleatorios de NumPy.
+        ids: Array de IDs de usuario.
+        fechas_base: Array de fechas base (datetime64[us]) paralelo a ids.
+
+    Returns:
+        List[Dict[str, Any]]: Documentos de sueño, actividad, reposo y glucosa.
+    """
+    return (
+        generar_lote_sueno(rng, ids, fechas_base)
+        + generar_lote_actividad(rng, ids, fechas_base)
+        + generar_lote_reposo(rng, ids, fechas_base)
+        + generar_lote_glucosa(rng, ids, fechas_base)
+    )
+
+
+def generar_datos_actividades_vectorizado(n_dias: int, usuarios: list, escritor,
+                                          rng: np.random.Generator,
+                                          fecha_referencia: Optional[datetime] = None,
+                                          tamano_bloque: int = TAMANO_BLOQUE_USUARIOS,
+                                          marcas: Optional[Dict[int, datetime]] = None) -> int:
+    """
+    Genera datos de sensores para un número de días y para todos los usuarios,
+    procesando los usuarios por bloques para acotar el uso de memoria.
+
+    Args:
+        n_dias: Número de días para generar datos, comenzando desde la fecha de referencia hacia atrás.
+        usuarios: Lista de documentos de usuarios con sus IDs.
+        escritor: Escritor por lotes de la colección de datos de sensores.
+        rng: Generador de números aleatorios de NumPy.
+        fecha_referencia: Fecha desde la que se cuentan los días (por defecto, ahora).
+        tamano_bloque: Número de usuarios que se generan en memoria a la vez.
+        marcas: Último día generado por usuario, para generar solo los días pendientes (opcional).
+
+    Returns:
+        int: Total de registros generados.
+    """
+    if fecha_referencia is None:
+        fecha_referencia = datetime.now()
+
+    total_generados = 0
+    ids_usuarios = [usuario["id_usuario"] for usuario in usuarios]
+
+    for inicio in range(0, len(ids_usuarios), tamano_bloque):
+        bloque = ids_usuarios[inicio:inicio + tamano_bloque]
+        ids, fechas_base = construir_grilla_usuarios_dias(bloque, n_dias, fecha_referencia, marcas)
+        if len(ids) == 0:
+            continue
+
+        registros = generar_lote_sensores(rng, ids, fechas_base)
+        escritor.agregar_varios(registros)
+        total_generados += len(registros)
+
+        logger.info(f"Generados {len(registros)} registros de sensores para usuarios "
+                    f"{inicio + 1}-{inicio + len(bloque)} de {len(ids_usuarios)}")
+
+    logger.info(f"Total de registros de sensores generados: {total_generados}")
+    return total_generados
@@ -7,77 +7,88 @@ en pantalla, clicks en botones, envío de formularios y uso de funcionalidades.
 """
 
 from datetime import datetime, timedelta
+from typing import Dict, Optional
+import argparse
 import random
-from pymongo import MongoClient
 from pulseras_inteligentes.utils.conexiones_db import conectar_db_sensor_pulsera
+from pulseras_inteligentes.utils.escritor_mongo import EscritorLotesMongo, TAMANO_LOTE_DEFECTO
 from pulseras_inteligentes.utils.etl_funcs import manejo_errores_proceso, logger
+from pulseras_inteligentes.sistema_operacional.ingesta_sensor_mongo.gen_data_scripts.generacion_paralela import (
+    generar_en_paralelo
+)
+from pulseras_inteligentes.sistema_operacional.ingesta_sensor_mongo.gen_data_scripts.marcas_generacion import (
+    leer_marcas,
+    calcular_dias_pendientes,
+    actualizar_marcas
+)
 
 
-def generar_datos_aplicacion_usuario(id_usuario: int, fecha_base: datetime) -> dict:
+def generar_datos_aplicacion_usuario(id_usuario: int, fecha_base: datetime, rng: random.Random = random) -> dict:
     """
     Genera datos sintéticos de uso de la aplicación para un usuario en una fecha específica.
     
     Args:
         id_usuario: ID del usuario.
         fecha_base: Fecha base para la generación de datos.
+        rng: Generador aleatorio a utilizar (por defecto, el módulo random).
     
     Returns:
         dict: Datos de uso de la aplicación generados.
     """
     # Selección del tipo de evento
     tipos_evento = ["tiempo_pantalla", "click_boton", "envio_formulario", "uso_funcionalidad"]
-    tipo_evento = random.choice(tipos_evento)
+    tipo_evento = rng.choice(tipos_evento)
     
     # Datos comunes para todos los tipos de evento
     registro_aplicacion = {
         "id_usuario": id_usuario,
         "timestamp": fecha_base.replace(
-            hour=random.randint(8, 21), 
-            minute=random.randint(0, 59), 
-            second=random.randint(0, 59)
+            hour=rng.randint(8, 21), 
+            minute=rng.randint(0, 59), 
+            second=rng.randint(0, 59)
         ),
         "tipo_evento": tipo_evento,
-        "id_sesion": f"ses-{random.randint(100000, 999999)}",
-        "version_aplicacion": f"{random.randint(1, 2)}.{random.randint(0, 9)}.{random.randint(0, 9)}",
-        "version_os": f"Android {random.randint(9, 13)}"
+        "id_sesion": f"ses-{rng.randint(100000, 999999)}",
+        "version_aplicacion": f"{rng.randint(1, 2)}.{rng.randint(0, 9)}.{rng.randint(0, 9)}",
+        "version_os": f"Android {rng.randint(9, 13)}"
     }
 
     # Datos específicos según el tipo de evento
     if tipo_evento == "tiempo_pantalla":
-        registro_aplicacion["nombre_pantalla"] = random.choice([
+        registro_aplicacion["nombre_pantalla"] = rng.choice([
             "inicio", "perfil", "entrenamiento", "progreso", "ajustes"
         ])
         registro_aplicacion["detalles"] = {
-            "duracion_segundos": random.randint(5, 600),  # Entre 5 segundos y 10 minutos
+            "duracion_segundos": rng.randint(5, 600),  # Entre 5 segundos y 10 minutos
         }
     
     elif tipo_evento == "click_boton":
-        registro_aplicacion["nombre_boton"] = random.choice([
+        registro_aplicacion["nombre_boton"] = rng.choice([
             "iniciar", "detener", "guardar", "cancelar", "enviar", "ver_mas"
         ])
-        registro_aplicacion["nombre_pantalla"] = random.choice([
+        registro_aplicacion["nombre_pantalla"] = rng.choice([
             "inicio", "perfil", "entrenamiento", "progreso", "ajustes"
         ])
         registro_aplicacion["detalles"] = {}
     
     elif tipo_evento == "envio_formulario":
-        registro_aplicacion["nombre_formulario"] = random.choice([
+        registro_aplicacion["nombre_formulario"] = rng.choice([
             "login", "registro", "buscar_alimentos", "configurar_objetivos"
         ])
         registro_aplicacion["detalles"] = {
-            "campos_completados": random.randint(1, 5),  # Número de campos llenados
+            "campos_completados": rng.randint(1, 5),  # Número de campos llenados
         }
     
     else:  # uso_funcionalidad
-        registro_aplicacion["nombre_funcionalidad"] = random.choice([
+        registro_aplicacion["nombre_funcionalidad"] = rng.choice([
             "iniciar_entrenamiento", "registrar_comida", "ver_estadisticas", "configurar_notificaciones"
         ])
         
         # Detalles específicos según la funcionalidad
         if registro_aplicacion["nombre_funcionalidad"] == "iniciar_entrenamiento":
             registro_aplicacion["detalles"] = {
-                "tipo_entrenamiento": random.choice(["correr", "caminar", "pesas", "yoga"]),
-                "duracion_minutos": random.randint(10, 120),
+                "tipo_entrenamiento": rng.choice(["correr", "caminar", "pesas", "yoga"]),
+                "duracion_minutos": rng.randint(10, 120),
             }
         elif registro_aplicacion["nombre_funcionalidad"] == "registrar_comida":
             registro_aplicacion["detalles"] = {
@@ -89,53 +100,71 @@ def generar_datos_aplicacion_usuario(id_usuario: int, fecha_base: datetime) -> d
             }
         elif registro_aplicacion["nombre_funcionalidad"] == "ver_estadisticas":
             registro_aplicacion["detalles"] = {
-                "tipo_estadistica": random.choice(["pasos", "sueño", "calorias", "distancia"]),
-                "periodo": random.choice(["diario", "semanal", "mensual"]),
+                "tipo_estadistica": rng.choice(["pasos", "sueño", "calorias", "distancia"]),
+                "periodo": rng.choice(["diario", "semanal", "mensual"]),
             }
         else:  # configurar_notificaciones
             registro_aplicacion["detalles"] = {
-                "notificaciones_activadas": random.choice([True, False]),
-                "frecuencia": random.choice(["inmediato", "diario", "semanal"])
+                "notificaciones_activadas": rng.choice([True, False]),
+                "frecuencia": rng.choice(["inmediato", "diario", "semanal"])
             }
     
     return registro_aplicacion
 
 
-def generar_datos_aplicacion(n_dias: int, usuarios: list, datos_db_aplicacion: MongoClient) -> int:
+def generar_datos_aplicacion(n_dias: int, usuarios: list, escritor: EscritorLotesMongo,
+                             rng: random.Random = random, fecha_referencia: Optional[datetime] = None,
+                             marcas: Optional[Dict[int, datetime]] = None) -> int:
     """
     Genera datos de uso de la aplicación para un número de días y para todos los usuarios.
     
     Args:
-        n_dias: Número de días para generar datos, comenzando desde hoy hacia atrás.
+        n_dias: Número de días para generar datos, comenzando desde la fecha de referencia hacia atrás.
         usuarios: Lista de documentos de usuarios con sus IDs.
-        datos_db_aplicacion: Colección de MongoDB para almacenar los datos.
+        escritor: Escritor por lotes de la colección de datos de aplicación.
+        rng: Generador aleatorio a utilizar (por defecto, el módulo random).
+        fecha_referencia: Fecha desde la que se cuentan los días (por defecto, ahora).
+        marcas: Último día generado por usuario, para generar solo los días pendientes (opcional).
     
     Returns:
-        int: Total de registros insertados.
+        int: Total de registros generados.
     """
+    if fecha_referencia is None:
+        fecha_referencia = datetime.now()
+    
     contador_total = 0
     
     for usuario in usuarios:
         id_usuario = usuario["id_usuario"]
+        dias_a_generar = n_dias if marcas is None else calcular_dias_pendientes(marcas.get(id_usuario), n_dias, fecha_referencia)
+        if dias_a_generar == 0:
+            continue
         logger.info(f"Generando datos de aplicación para usuario {id_usuario} ({usuario.get('nombre', 'Sin nombre')})")
         
         # Para cada día, generamos entre 1 y 5 registros
-        for i in range(n_dias):
-            fecha_base = datetime.now() - timedelta(days=i)
-            num_registros = random.randint(1, 5)
+        for i in range(dias_a_generar):
+            fecha_base = fecha_referencia - timedelta(days=i)
+            num_registros = rng.randint(1, 5)
             
             for _ in range(num_registros):
-                registro_aplicacion = generar_datos_aplicacion_usuario(id_usuario, fecha_base)
-                datos_db_aplicacion.insert_one(registro_aplicacion)
+                registro_aplicacion = generar_datos_aplicacion_usuario(id_usuario, fecha_base, rng)
+                escritor.agregar(registro_aplicacion)
                 contador_total += 1
     
-    logger.info(f"Total de registros de uso de aplicación insertados: {contador_total}")
+    logger.info(f"Total de registros de uso de aplicación generados: {contador_total}")
     return contador_total
 
 
-def main():
+def main(tamano_lote: int = TAMANO_LOTE_DEFECTO, workers: int = 1, semilla: Optional[int] = None,
+         incremental: bool = True):
     """
     Función principal que coordina la generación e inserción de datos de uso de la aplicación.
+    
+    Args:
+        tamano_lote: Número de documentos por lote de inserción en MongoDB.
+        workers: Número de procesos para la generación en paralelo.
+        semilla: Semilla maestra para una generación reproducible (opcional).
+        incremental: Si es True, solo genera los días posteriores a la marca de cada usuario.
     """
     nombre_proceso = "GENERAR_REGISTROS_APLICACION"
     
@@ -150,9 +179,30 @@ def main():
             
             logger.info(f"Iniciando generación de datos de aplicación para {len(usuarios)} usuarios")
             
-            # Generación de datos para 130 días
+            # Generación de datos para 130 días como máximo
             n_dias = 130
-            total_registros = generar_datos_aplicacion(n_dias, usuarios, datos_db_aplicacion)
+            fecha_referencia = datetime.now()
+            
+            # Marcas de último día generado: sin marca, el usuario recibe la carga histórica completa
+            marcas = leer_marcas(db_sensor_pulsera, "datos_aplicacion") if incremental else {}
+            
+            if workers > 1 or semilla is not None:
+                # Generación particionada por shards, reproducible para cualquier número de workers.
+                # Cada shard actualiza las marcas de sus usuarios al terminar de escribir.
+                total_registros = generar_en_paralelo(
+                    "aplicacion", usuarios, n_dias, workers=workers, semilla=semilla, tamano_lote=tamano_lote,
+                    fecha_referencia=fecha_referencia, marcas=marcas
+                )
+            else:
+                with EscritorLotesMongo(datos_db_aplicacion, tamano_lote=tamano_lote) as escritor:
+                    total_registros = generar_datos_aplicacion(
+                        n_dias, usuarios, escritor, fecha_referencia=fecha_referencia, marcas=marcas
+                    )
+                
+                # Las marcas se avanzan solo después de escribir todos los lotes
+                actualizar_marcas(db_sensor_pulsera, "datos_aplicacion",
+                                  [usuario["id_usuario"] for usuario in usuarios], fecha_referencia,
+                                  usuarios_rechazados=escritor.usuarios_con_errores)
             
             logger.info(f"{nombre_proceso}: Proceso completado con éxito. {total_registros} registros generados en total.")
         finally:
@@ -161,4 +211,10 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    argumentos = argparse.ArgumentParser(description="Generación de datos simulados de uso de la aplicación")
+    argumentos.add_argument("--workers", type=int, default=1, help="Número de procesos de generación")
+    argumentos.add_argument("--semilla", type=int, default=None, help="Semilla maestra para resultados reproducibles")
+    argumentos.add_argument("--tamano-lote", type=int, default=TAMANO_LOTE_DEFECTO, help="Documentos por lote de inserción")
+    argumentos.add_argument("--completo", action="store_true", help="Ignora las marcas y genera los 130 días")
+    args = argumentos.parse_args()
+    main(tamano_lote=args.tamano_lote, workers=args.workers, semilla=args.semilla, incremental=not args.completo)
\ No newline at end of file
@@ -0,0 +1,208 @@
+"""
+Script para generar e insertar muestras simuladas de frecuencia cardíaca y pasos por minuto en MongoDB.
+
+A diferencia de generar_registros_sensores, que produce a lo sumo cuatro registros resumen
+por usuario y día, este script simula la señal continua de la pulsera: 1440 muestras diarias
+de frecuencia cardíaca y pasos por usuario, almacenadas en la colección frecuencia_cardiaca
+como un documento por usuario y hora con los arrays empaquetados.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import argparse
+import numpy as np
+from pulseras_inteligentes.utils.conexiones_db import conectar_db_sensor_pulsera
+from pulseras_inteligentes.utils.escritor_mongo import TAMANO_LOTE_DEFECTO
+from pulseras_inteligentes.utils.etl_funcs import manejo_errores_proceso, logger
+from pulseras_inteligentes.sistema_operacional.ingesta_sensor_mongo.frecuencia_cardiaca import (
+    COLECCION_FRECUENCIA_CARDIACA,
+    DTYPE_FC,
+    DTYPE_PASOS,
+    FC_SIN_LECTURA,
+    MUESTRAS_POR_DIA,
+    MUESTRAS_POR_HORA,
+    codificar_hora,
+    crear_escritor_frecuencia_cardiaca,
+    registrar_almacenamiento_frecuencia_cardiaca
+)
+from pulseras_inteligentes.sistema_operacional.ingesta_sensor_mongo.gen_data_scripts.generacion_vectorizada import (
+    construir_grilla_usuarios_dias
+)
+from pulseras_inteligentes.sistema_operacional.ingesta_sensor_mongo.gen_data_scripts.marcas_generacion import (
+    leer_marcas,
+    actualizar_marcas
+)
+
+# Días de histórico por defecto (cada usuario-día son 24 documentos con 1440 muestras)
+N_DIAS_DEFECTO = 30
+
+# Número de pares usuario-día que se simulan en memoria a la vez (~1440 muestras cada uno)
+TAMANO_BLOQUE_USUARIOS_DIAS = 2000
+
+# Parámetros de la señal simulada
+HORA_DESPERTAR = 7
+HORA_DORMIR = 23
+MAX_EPISODIOS_ACTIVIDAD = 6
+PROBABILIDAD_SIN_LECTURA = 0.02  # Fracción de minutos sin lectura (pulsera sin colocar, carga, etc.)
+
+
+def simular_muestras_dia(rng: np.random.Generator, n: int) -> tuple:
+    """
+    Simula las muestras por minuto de frecuencia cardíaca y pasos para n pares usuario-día.
+
+    La frecuencia cardíaca parte de un valor basal por usuario-día, baja durante el sueño
+    y sube en proporción a la cadencia de pasos durante los episodios de actividad.
+
+    Args:
+        rng: Generador de números aleatorios de NumPy.
+        n: Número de pares usuario-día.
+
+    Returns:
+        tuple: Arrays (n, 1440) de frecuencia cardíaca (uint8) y pasos (uint16).
+    """
+    minutos = np.arange(MUESTRAS_POR_DIA)
+    despierto = (minutos >= HORA_DESPERTAR * 60) & (minutos < HORA_DORMIR * 60)
+
+    # Pasos: episodios de actividad con cadencia constante más pasos sueltos durante la vigilia
+    pasos = np.where(despierto & (rng.random((n, MUESTRAS_POR_DIA)) < 0.3),
+                     rng.poisson(8, (n, MUESTRAS_POR_DIA)), 0).astype(np.float64)
+    n_episodios = rng.integers(0, MAX_EPISODIOS_ACTIVIDAD + 1, n)
+    for episodio in range(MAX_EPISODIOS_ACTIVIDAD):
+        inicio = rng.integers(HORA_DESPERTAR * 60, HORA_DORMIR * 60, n)
+        duracion = rng.integers(5, 61, n)
+        cadencia = rng.integers(70, 170, n)
+        activo = ((minutos >= inicio[:, None]) & (minutos < (inicio + duracion)[:, None])
+                  & (episodio < n_episodios)[:, None])
+        pasos = np.where(activo, cadencia[:, None] + rng.normal(0, 8, (n, MUESTRAS_POR_DIA)), pasos)
+    pasos = np.clip(np.rint(pasos), 0, 250)
+
+    # Frecuencia cardíaca: basal del usuario-día, descenso nocturno, respuesta a la cadencia y ruido
+    basal = rng.normal(64, 7, n)[:, None]
+    fc = basal - np.where(despierto, 0, 8) + 0.45 * pasos + rng.normal(0, 3, (n, MUESTRAS_POR_DIA))
+    fc = np.clip(np.rint(fc), 38, 210)
+
+    # Minutos sin lectura: no hay frecuencia cardíaca ni pasos
+    sin_lectura = rng.random((n, MUESTRAS_POR_DIA)) < PROBABILIDAD_SIN_LECTURA
+    fc[sin_lectura] = FC_SIN_LECTURA
+    pasos[sin_lectura] = 0
+
+    return fc.astype(DTYPE_FC), pasos.astype(DTYPE_PASOS)
+
+
+def generar_lote_frecuencia_cardiaca(rng: np.random.Generator, ids: np.ndarray,
+                                     fechas_base: np.ndarray) -> List[Dict[str, Any]]:
+    """
+    Genera los documentos horarios de un conjunto de pares usuario-día.
+
+    Args:
+        rng: Generador de números aleatorios de NumPy.
+        ids: Array de IDs de usuario, uno por par usuario-día.
+        fechas_base: Array datetime64 con la fecha de cada par usuario-día.
+
+    Returns:
+        List[Dict[str, Any]]: 24 documentos por par usuario-día.
+    """
+    fc, pasos = simular_muestras_dia(rng, len(ids))
+    fc = fc.reshape(len(ids), 24, MUESTRAS_POR_HORA)
+    pasos = pasos.reshape(len(ids), 24, MUESTRAS_POR_HORA)
+
+    # Inicio de cada hora de cada día
+    horas = (fechas_base.astype("datetime64[D]")[:, None] + np.arange(24).astype("timedelta64[h]")).astype(datetime)
+
+    return [
+        codificar_hora(ids[i], horas[i, h], fc[i, h], pasos[i, h])
+        for i in range(len(ids))
+        for h in range(24)
+    ]
+
+
+def generar_datos_frecuencia_cardiaca(n_dias: int, usuarios: list, escritor, rng: np.random.Generator,
+                                      fecha_referencia: Optional[datetime] = None,
+                                      marcas: Optional[Dict[int, datetime]] = None) -> int:
+    """
+    Genera muestras por minuto para un número de días y para todos los usuarios.
+
+    Args:
+        n_dias: Número de días para generar datos, comenzando desde la fecha de referencia hacia atrás.
+        usuarios: Lista de documentos de usuarios con sus IDs.
+        escritor: Escritor por lotes de la colección frecuencia_cardiaca.
+        rng: Generador de números aleatorios de NumPy.
+        fecha_referencia: Fecha desde la que se cuentan los días (por defecto, ahora).
+        marcas: Último día generado por usuario, para generar solo los días pendientes (opcional).
+
+    Returns:
+        int: Total de documentos horarios generados.
+    """
+    if fecha_referencia is None:
+        fecha_referencia = datetime.now()
+
+    ids_usuarios = [usuario["id_usuario"] for usuario in usuarios]
+    ids, fechas_base = construir_grilla_usuarios_dias(ids_usuarios, n_dias, fecha_referencia, marcas)
+
+    total_generados = 0
+    for inicio in range(0, len(ids), TAMANO_BLOQUE_USUARIOS_DIAS):
+        documentos = generar_lote_frecuencia_cardiaca(
+            rng, ids[inicio:inicio + TAMANO_BLOQUE_USUARIOS_DIAS], fechas_base[inicio:inicio + TAMANO_BLOQUE_USUARIOS_DIAS]
+        )
+        escritor.agregar_varios(documentos)
+        total_generados += len(documentos)
+
+        logger.info(f"Generados {len(documentos)} documentos de frecuencia cardíaca "
+                    f"({min(inicio + TAMANO_BLOQUE_USUARIOS_DIAS, len(ids))} de {len(ids)} usuarios-día)")
+
+    logger.info(f"Total de documentos de frecuencia cardíaca generados: {total_generados} "
+                f"({total_generados * MUESTRAS_POR_HORA} muestras)")
+    return total_generados
+
+
+def main(n_dias: int = N_DIAS_DEFECTO, tamano_lote: int = TAMANO_LOTE_DEFECTO, semilla: Optional[int] = None,
+         incremental: bool = True):
+    """
+    Función principal que coordina la generación e inserción de muestras de frecuencia cardíaca.
+
+    Args:
+        n_dias: Máximo de días de histórico a generar por usuario.
+        tamano_lote: Número de documentos horarios por lote de inserción en MongoDB.
+        semilla: Semilla del generador aleatorio (opcional).
+        incremental: Si es True, solo genera los días posteriores a la marca de cada usuario.
+    """
+    nombre_proceso = "GENERAR_REGISTROS_FRECUENCIA_CARDIACA"
+
+    with manejo_errores_proceso(nombre_proceso):
+        # Conexión a la base de datos
+        db_sensor_pulsera = conectar_db_sensor_pulsera()
+
+        try:
+            # Obtención de usuarios
+            usuarios = list(db_sensor_pulsera.pulseras_inteligentes.usuarios_sensor.find({}, {"id_usuario": 1}))
+
+            logger.info(f"Iniciando generación de frecuencia cardíaca para {len(usuarios)} usuarios")
+
+            fecha_referencia = datetime.now()
+            marcas = leer_marcas(db_sensor_pulsera, COLECCION_FRECUENCIA_CARDIACA) if incremental else {}
+
+            with crear_escritor_frecuencia_cardiaca(db_sensor_pulsera, tamano_lote=tamano_lote) as escritor:
+                total_documentos = generar_datos_frecuencia_cardiaca(
+                    n_dias, usuarios, escritor, np.random.default_rng(semilla),
+                    fecha_referencia=fecha_referencia, marcas=marcas
+                )
+
+            # Las marcas se avanzan solo después de escribir todos los lotes
+            actualizar_marcas(db_sensor_pulsera, COLECCION_FRECUENCIA_CARDIACA,
+                              [usuario["id_usuario"] for usuario in usuarios], fecha_referencia,
+                              usuarios_rechazados=escritor.usuarios_con_errores)
+            registrar_almacenamiento_frecuencia_cardiaca(db_sensor_pulsera)
+
+            logger.info(f"{nombre_proceso}: Proceso completado con éxito. {total_documentos} documentos generados en total.")
+        finally:
+            # Cierre de conexión
+            db_sensor_pulsera.close()
+
+if __name__ == "__main__":
+    argumentos = argparse.ArgumentParser(description="Generación de muestras por minuto de frecuencia cardíaca y pasos")
+    argumentos.add_argument("--dias", type=int, default=N_DIAS_DEFECTO, help="Días de histórico a generar")
+    argumentos.add_argument("--semilla", type=int, default=None, help="Semilla para resultados reproducibles")
+    argumentos.add_argument("--tamano-lote", type=int, default=TAMANO_LOTE_DEFECTO, help="Documentos por lote de inserción")
+    argumentos.add_argument("--completo", action="store_true", help="Ignora las marcas y genera todos los días")
+    args = argumentos.parse_args()
+    main(n_dias=args.dias, tamano_lote=args.tamano_lote, semilla=args.semilla, incremental=not args.completo)
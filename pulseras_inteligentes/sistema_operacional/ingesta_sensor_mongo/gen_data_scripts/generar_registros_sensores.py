@@ -7,38 +7,54 @@ de glucosa para los usuarios existentes en la base de datos.
 """
 
 from datetime import datetime, timedelta
+from typing import Dict, Optional
+import argparse
 import random
-from pymongo import MongoClient
+import numpy as np
 from pulseras_inteligentes.utils.conexiones_db import conectar_db_sensor_pulsera
+from pulseras_inteligentes.utils.escritor_mongo import EscritorLotesMongo, TAMANO_LOTE_DEFECTO
 from pulseras_inteligentes.utils.etl_funcs import manejo_errores_proceso, logger
+from pulseras_inteligentes.sistema_operacional.ingesta_sensor_mongo.almacenamiento_sensor import crear_escritor_sensor
+from pulseras_inteligentes.sistema_operacional.ingesta_sensor_mongo.gen_data_scripts.generacion_vectorizada import (
+    generar_datos_actividades_vectorizado
+)
+from pulseras_inteligentes.sistema_operacional.ingesta_sensor_mongo.gen_data_scripts.generacion_paralela import (
+    generar_en_paralelo
+)
+from pulseras_inteligentes.sistema_operacional.ingesta_sensor_mongo.gen_data_scripts.marcas_generacion import (
+    leer_marcas,
+    calcular_dias_pendientes,
+    actualizar_marcas
+)
 
 
-def generar_datos_actividad(id_usuario: int, fecha_base: datetime) -> dict:
+def generar_datos_actividad(id_usuario: int, fecha_base: datetime, rng: random.Random = random) -> dict:
     """
     Genera datos sintéticos de actividad física para un usuario en una fecha específica.
     
     Args:
         id_usuario: ID del usuario.
         fecha_base: Fecha base para la generación de datos.
+        rng: Generador aleatorio a utilizar (por defecto, el módulo random).
     
     Returns:
         dict: Datos de actividad generados o None si no hay actividad.
     """
-    tiene_actividad = random.random() > 0.2  # 80% de probabilidad de actividad
+    tiene_actividad = rng.random() > 0.2  # 80% de probabilidad de actividad
     if not tiene_actividad:
         return None
         
-    tipo_actividad = random.choice(["caminar", "correr", "ciclismo", "entrenamiento_fuerza", "yoga"])
-    hora_inicio = fecha_base.replace(hour=random.randint(7, 19), minute=random.randint(0, 59))
-    duracion_min = int(random.expovariate(1/60)) + 1  # Duración media de 60 minutos
-    calorias_quemadas = int(random.gauss(duracion_min * 7, duracion_min * 3))
+    tipo_actividad = rng.choice(["caminar", "correr", "ciclismo", "entrenamiento_fuerza", "yoga"])
+    hora_inicio = fecha_base.replace(hour=rng.randint(7, 19), minute=rng.randint(0, 59))
+    duracion_min = int(rng.expovariate(1/60)) + 1  # Duración media de 60 minutos
+    calorias_quemadas = int(rng.gauss(duracion_min * 7, duracion_min * 3))
     
     # Datos específicos según tipo de actividad
     distancia_km = round(duracion_min * 0.1, 2) if tipo_actividad in ["caminar", "correr", "ciclismo"] else None
-    repeticiones = int(random.triangular(5, 15, 10)) if tipo_actividad == "entrenamiento_fuerza" else None
-    peso_levantado_kg = round(random.uniform(20, 100), 2) if tipo_actividad == "entrenamiento_fuerza" else None
-    ritmo_cardiaco_prom = int(random.gauss(100 + duracion_min * 0.5, 15)) if tipo_actividad in ["caminar", "correr", "ciclismo"] else None
-    pasos = int(random.gauss(duracion_min * 100, duracion_min * 30)) if tipo_actividad in ["caminar","correr"] else None
+    repeticiones = int(rng.triangular(5, 15, 10)) if tipo_actividad == "entrenamiento_fuerza" else None
+    peso_levantado_kg = round(rng.uniform(20, 100), 2) if tipo_actividad == "entrenamiento_fuerza" else None
+    ritmo_cardiaco_prom = int(rng.gauss(100 + duracion_min * 0.5, 15)) if tipo_actividad in ["caminar", "correr", "ciclismo"] else None
+    pasos = int(rng.gauss(duracion_min * 100, duracion_min * 30)) if tipo_actividad in ["caminar","correr"] else None
 
     return {
         "id_usuario": id_usuario,
@@ -56,24 +72,25 @@ def generar_datos_actividad(id_usuario: int, fecha_base: datetime) -> dict:
         }
     }
 
-def generar_datos_reposo(id_usuario: int, fecha_base: datetime) -> dict:
+def generar_datos_reposo(id_usuario: int, fecha_base: datetime, rng: random.Random = random) -> dict:
     """
     Genera datos sintéticos de reposo para un usuario en una fecha específica.
     
     Args:
         id_usuario: ID del usuario.
         fecha_base: Fecha base para la generación de datos.
+        rng: Generador aleatorio a utilizar (por defecto, el módulo random).
     
     Returns:
         dict: Datos de reposo generados o None si no hay registro.
     """
-    if random.random() <= 0.1:  # 90% de probabilidad de tener datos de reposo
+    if rng.random() <= 0.1:  # 90% de probabilidad de tener datos de reposo
         return None
         
-    hora_reposo = fecha_base.replace(hour=random.randint(12, 16), minute=random.randint(0, 59))
-    minutos_sin_movimiento = int(random.expovariate(1/30)) + 1  # Media de 30 min
-    frecuencia_respiratoria = round(random.gauss(12, 2), 1)
-    hrv_ms = int(random.gauss(50, 15))  # Variabilidad de frecuencia cardíaca
+    hora_reposo = fecha_base.replace(hour=rng.randint(12, 16), minute=rng.randint(0, 59))
+    minutos_sin_movimiento = int(rng.expovariate(1/30)) + 1  # Media de 30 min
+    frecuencia_respiratoria = round(rng.gauss(12, 2), 1)
+    hrv_ms = int(rng.gauss(50, 15))  # Variabilidad de frecuencia cardíaca
 
     return {
         "id_usuario": id_usuario,
@@ -86,23 +103,24 @@ def generar_datos_reposo(id_usuario: int, fecha_base: datetime) -> dict:
         }
     }
 
-def generar_datos_sueno(id_usuario: int, fecha_base: datetime) -> dict:
+def generar_datos_sueno(id_usuario: int, fecha_base: datetime, rng: random.Random = random) -> dict:
     """
     Genera datos sintéticos de sueño para un usuario en una fecha específica.
     
     Args:
         id_usuario: ID del usuario.
         fecha_base: Fecha base para la generación de datos.
+        rng: Generador aleatorio a utilizar (por defecto, el módulo random).
     
     Returns:
         dict: Datos de sueño generados.
     """
-    hora_sueno = fecha_base.replace(hour=random.randint(22, 23), minute=random.randint(0, 59))
-    duracion_total_min = int(random.gauss(480, 30))  # Duración media de 8 horas
-    sueño_profundo_min = int(random.triangular(90, 180, 120))
-    sueño_ligero_min = int(random.triangular(180, 300, 240))
-    interrupciones = random.choices([0, 1, 2, 3], weights=[0.6, 0.2, 0.15, 0.05])[0]
-    latencia_sueno_min = int(random.expovariate(1/10)) + 1  # Tiempo para conciliar el sueño
+    hora_sueno = fecha_base.replace(hour=rng.randint(22, 23), minute=rng.randint(0, 59))
+    duracion_total_min = int(rng.gauss(480, 30))  # Duración media de 8 horas
+    sueño_profundo_min = int(rng.triangular(90, 180, 120))
+    sueño_ligero_min = int(rng.triangular(180, 300, 240))
+    interrupciones = rng.choices([0, 1, 2, 3], weights=[0.6, 0.2, 0.15, 0.05])[0]
+    latencia_sueno_min = int(rng.expovariate(1/10)) + 1  # Tiempo para conciliar el sueño
 
     return {
         "id_usuario": id_usuario,
@@ -117,20 +135,21 @@ def generar_datos_sueno(id_usuario: int, fecha_base: datetime) -> dict:
         }
     }
 
-def generar_datos_glucosa(id_usuario: int, fecha_base: datetime) -> dict:
+def generar_datos_glucosa(id_usuario: int, fecha_base: datetime, rng: random.Random = random) -> dict:
     """
     Genera datos sintéticos de glucosa para un usuario en una fecha específica.
     
     Args:
         id_usuario: ID del usuario.
         fecha_base: Fecha base para la generación de datos.
+        rng: Generador aleatorio a utilizar (por defecto, el módulo random).
     
     Returns:
         dict: Datos de glucosa generados.
     """
-    hora_glucosa = fecha_base.replace(hour=random.randint(7, 10), minute=random.randint(0, 59))
-    nivel_glucosa = int(random.gauss(90, 15))
-    medicion_ayunas = random.choice([True, False])
+    hora_glucosa = fecha_base.replace(hour=rng.randint(7, 10), minute=rng.randint(0, 59))
+    nivel_glucosa = int(rng.gauss(90, 15))
+    medicion_ayunas = rng.choice([True, False])
 
     return {
         "id_usuario": id_usuario,
@@ -143,80 +162,136 @@ def generar_datos_glucosa(id_usuario: int, fecha_base: datetime) -> dict:
         }
     }
 
-def generar_datos_sensor_usuario(id_usuario: int, fecha_base: datetime, datos_db_sensor: MongoClient) -> int:
+def generar_datos_sensor_usuario(id_usuario: int, fecha_base: datetime, escritor: EscritorLotesMongo,
+                                 rng: random.Random = random) -> int:
     """
-    Genera y guarda todos los datos de sensores para un usuario en una fecha dada.
+    Genera todos los datos de sensores para un usuario en una fecha dada y los
+    entrega al escritor por lotes.
     
     Args:
         id_usuario: ID del usuario.
         fecha_base: Fecha base para la generación de datos.
-        datos_db_sensor: Colección de MongoDB para almacenar los datos.
+        escritor: Escritor por lotes de la colección de datos de sensores.
+        rng: Generador aleatorio a utilizar (por defecto, el módulo random).
     
     Returns:
-        int: Número de registros insertados.
+        int: Número de registros generados.
     """
     registros = [
-        generar_datos_sueno(id_usuario, fecha_base),
-        generar_datos_actividad(id_usuario, fecha_base),
-        generar_datos_reposo(id_usuario, fecha_base),
-        generar_datos_glucosa(id_usuario, fecha_base),
+        generar_datos_sueno(id_usuario, fecha_base, rng),
+        generar_datos_actividad(id_usuario, fecha_base, rng),
+        generar_datos_reposo(id_usuario, fecha_base, rng),
+        generar_datos_glucosa(id_usuario, fecha_base, rng),
     ]
     
     contador = 0
     for registro in registros:
         if registro:  # Solo inserta si no es None
-            datos_db_sensor.insert_one(registro)
+            escritor.agregar(registro)
             contador += 1
     
-    logger.debug(f"Usuario {id_usuario}, fecha {fecha_base.strftime('%Y-%m-%d')}: {contador} registros insertados")
+    logger.debug(f"Usuario {id_usuario}, fecha {fecha_base.strftime('%Y-%m-%d')}: {contador} registros generados")
     return contador
 
-def generar_datos_actividades(n_dias: int, usuarios: list, datos_db_sensor: MongoClient) -> int:
+def generar_datos_actividades(n_dias: int, usuarios: list, escritor: EscritorLotesMongo,
+                              rng: random.Random = random, fecha_referencia: Optional[datetime] = None,
+                              marcas: Optional[Dict[int, datetime]] = None) -> int:
     """
     Genera datos de sensores para un número de días y para todos los usuarios.
     
     Args:
-        n_dias: Número de días para generar datos, comenzando desde hoy hacia atrás.
+        n_dias: Número de días para generar datos, comenzando desde la fecha de referencia hacia atrás.
         usuarios: Lista de documentos de usuarios con sus IDs.
-        datos_db_sensor: Colección de MongoDB para almacenar los datos.
+        escritor: Escritor por lotes de la colección de datos de sensores.
+        rng: Generador aleatorio a utilizar (por defecto, el módulo random).
+        fecha_referencia: Fecha desde la que se cuentan los días (por defecto, ahora).
+        marcas: Último día generado por usuario, para generar solo los días pendientes (opcional).
     
     Returns:
-        int: Total de registros insertados.
+        int: Total de registros generados.
     """
-    total_insertados = 0
+    if fecha_referencia is None:
+        fecha_referencia = datetime.now()
+    
+    total_generados = 0
     
     for usuario in usuarios:
         id_usuario = usuario["id_usuario"]
+        dias_a_generar = n_dias if marcas is None else calcular_dias_pendientes(marcas.get(id_usuario), n_dias, fecha_referencia)
+        if dias_a_generar == 0:
+            continue
         logger.info(f"Generando datos para usuario {id_usuario} ({usuario.get('nombre', 'Sin nombre')})")
         
-        for i in range(n_dias):
-            fecha_base = datetime.now() - timedelta(days=i)
-            insertados = generar_datos_sensor_usuario(id_usuario, fecha_base, datos_db_sensor)
-            total_insertados += insertados
+        for i in range(dias_a_generar):
+            fecha_base = fecha_referencia - timedelta(days=i)
+            generados = generar_datos_sensor_usuario(id_usuario, fecha_base, escritor, rng)
+            total_generados += generados
     
-    logger.info(f"Total de registros de sensores insertados: {total_insertados}")
-    return total_insertados
+    logger.info(f"Total de registros de sensores generados: {total_generados}")
+    return total_generados
 
-def main():
+def main(tamano_lote: int = TAMANO_LOTE_DEFECTO, vectorizado: bool = True, semilla: Optional[int] = None,
+         workers: int = 1, incremental: bool = True):
     """
     Función principal que coordina la generación e inserción de datos de sensores.
+    
+    Args:
+        tamano_lote: Número de documentos por lote de inserción en MongoDB.
+        vectorizado: Si es True, usa el motor vectorizado con NumPy; si no, genera registro a registro.
+        semilla: Semilla maestra del generador aleatorio para resultados reproducibles (opcional).
+        workers: Número de procesos para la generación en paralelo (requiere el motor vectorizado).
+        incremental: Si es True, solo genera los días posteriores a la marca de cada usuario.
+    
+    Raises:
+        ValueError: Si se piden varios workers sin el motor vectorizado.
     """
     nombre_proceso = "GENERAR_REGISTROS_SENSORES"
+    if not vectorizado and workers > 1:
+        raise ValueError("La generación en paralelo requiere el motor vectorizado")
     
     with manejo_errores_proceso(nombre_proceso):
         # Conexión a la base de datos
         db_sensor_pulsera = conectar_db_sensor_pulsera()
         
         try:
-            # Obtención de la colección de datos y usuarios
-            datos_db_sensor = db_sensor_pulsera.pulseras_inteligentes.datos_sensor
+            # Obtención de usuarios
             usuarios = list(db_sensor_pulsera.pulseras_inteligentes.usuarios_sensor.find())
             
             logger.info(f"Iniciando generación de datos para {len(usuarios)} usuarios")
             
-            # Generación de datos para 130 días
+            # Generación de datos para 130 días como máximo
             n_dias = 130
-            total_registros = generar_datos_actividades(n_dias, usuarios, datos_db_sensor)
+            fecha_referencia = datetime.now()
+            
+            # Marcas de último día generado: sin marca, el usuario recibe la carga histórica completa
+            marcas = leer_marcas(db_sensor_pulsera, "datos_sensor") if incremental else {}
+            
+            if vectorizado and (workers > 1 or semilla is not None):
+                # Generación particionada por shards, reproducible para cualquier número de workers.
+                # Cada shard actualiza las marcas de sus usuarios al terminar de escribir.
+                total_registros = generar_en_paralelo(
+                    "sensores", usuarios, n_dias, workers=workers, semilla=semilla, tamano_lote=tamano_lote,
+                    fecha_referencia=fecha_referencia, marcas=marcas
+                )
+            else:
+                # El escritor adapta los registros al modo de almacenamiento configurado
+                with crear_escritor_sensor(db_sensor_pulsera, tamano_lote=tamano_lote) as escritor:
+                    if vectorizado:
+                        rng = np.random.default_rng(semilla)
+                        total_registros = generar_datos_actividades_vectorizado(
+                            n_dias, usuarios, escritor, rng, fecha_referencia=fecha_referencia, marcas=marcas
+                        )
+                    else:
+                        # Sin semilla se usa el módulo random, como en la generación original
+                        rng = random.Random(semilla) if semilla is not None else random
+                        total_registros = generar_datos_actividades(
+                            n_dias, usuarios, escritor, rng, fecha_referencia=fecha_referencia, marcas=marcas
+                        )
+                
+                # Las marcas se avanzan solo después de escribir todos los lotes
+                actualizar_marcas(db_sensor_pulsera, "datos_sensor",
+                                  [usuario["id_usuario"] for usuario in usuarios], fecha_referencia,
+                                  usuarios_rechazados=escritor.usuarios_con_errores)
             
             logger.info(f"{nombre_proceso}: Proceso completado con éxito. {total_registros} registros generados en total.")
         finally:
@@ -224,4 +299,14 @@ def main():
             db_sensor_pulsera.close()
 
 if __name__ == "__main__":
-    main()
+    argumentos = argparse.ArgumentParser(description="Generación de datos simulados de sensores de pulsera")
+    argumentos.add_argument("--workers", type=int, default=1, help="Número de procesos de generación")
+    argumentos.add_argument("--semilla", type=int, default=None, help="Semilla maestra para resultados reproducibles")
+    argumentos.add_argument("--tamano-lote", type=int, default=TAMANO_LOTE_DEFECTO, help="Documentos por lote de inserción")
+    argumentos.add_argument("--sin-vectorizar", action="store_true", help="Genera registro a registro sin NumPy")
+    argumentos.add_argument("--completo", action="store_true", help="Ignora las marcas y genera los 130 días")
+    args = argumentos.parse_args()
+    if args.sin_vectorizar and args.workers > 1:
+        argumentos.error("--workers mayor que 1 requiere el motor vectorizado (sin --sin-vectorizar)")
+    main(tamano_lote=args.tamano_lote, vectorizado=not args.sin_vectorizar, semilla=args.semilla,
+         workers=args.workers, incremental=not args.completo)
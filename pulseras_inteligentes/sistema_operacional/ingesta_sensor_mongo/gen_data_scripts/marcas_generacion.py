@@ -0,0 +1,112 @@
+"""
+Módulo para la gestión de marcas de generación (watermarks) por usuario.
+
+Cada marca guarda, para un usuario y una colección de datos, el último día para el que
+ya se generaron registros. Los scripts de generación las usan para producir únicamente
+los días que faltan en lugar de volver a generar todo el histórico en cada ejecución.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+from pymongo import MongoClient, UpdateOne
+from pulseras_inteligentes.utils.etl_funcs import logger
+
+# Colección de MongoDB donde se guardan las marcas
+COLECCION_MARCAS = "marcas_generacion"
+
+# Número de operaciones por llamada a bulk_write
+TAMANO_LOTE_MARCAS = 1000
+
+
+def leer_marcas(db_sensor_pulsera: MongoClient, coleccion: str) -> Dict[int, datetime]:
+    """
+    Obtiene el último día generado por usuario para una colección de datos.
+
+    Args:
+        db_sensor_pulsera: Cliente de MongoDB.
+        coleccion: Nombre de la colección de datos ('datos_sensor' o 'datos_aplicacion').
+
+    Returns:
+        Dict[int, datetime]: Diccionario id_usuario -> último día generado.
+    """
+    marcas_db = db_sensor_pulsera.pulseras_inteligentes[COLECCION_MARCAS]
+    marcas = {
+        marca["id_usuario"]: marca["ultimo_dia"]
+        for marca in marcas_db.find({"coleccion": coleccion}, {"_id": 0, "id_usuario": 1, "ultimo_dia": 1})
+    }
+    logger.info(f"Leídas {len(marcas)} marcas de generación para {coleccion}")
+    return marcas
+
+
+def calcular_dias_pendientes(ultimo_dia: Optional[datetime], n_dias: int, fecha_referencia: datetime) -> int:
+    """
+    Calcula cuántos días faltan generar para un usuario, contados hacia atrás desde
+    la fecha de referencia (el día 0 es el de la fecha de referencia).
+
+    Args:
+        ultimo_dia: Último día ya generado para el usuario, o None si nunca se generó.
+        n_dias: Máximo de días a generar (tamaño de la carga histórica completa).
+        fecha_referencia: Fecha de la ejecución actual.
+
+    Returns:
+        int: Número de días a generar, entre 0 y n_dias.
+    """
+    if ultimo_dia is None:
+        return n_dias
+
+    dias_transcurridos = (fecha_referencia.date() - ultimo_dia.date()).days
+    return max(0, min(n_dias, dias_transcurridos))
+
+
+def actualizar_marcas(db_sensor_pulsera: MongoClient, coleccion: str,
+                      ids_usuarios: Iterable[int], fecha_referencia: datetime,
+                      usuarios_rechazados: Iterable[Any] = ()) -> int:
+    """
+    Avanza la marca de los usuarios indicados hasta el día de la fecha de referencia.
+    Se debe llamar una vez que los registros de esos días fueron escritos.
+
+    No se avanza la marca de los usuarios con documentos rechazados por el escritor, para
+    que sus días se vuelvan a generar en la próxima ejecución. Si algún documento rechazado
+    no tenía usuario (None) no se avanza ninguna marca.
+
+    Args:
+        db_sensor_pulsera: Cliente de MongoDB.
+        coleccion: Nombre de la colección de datos.
+        ids_usuarios: IDs de los usuarios cuyos días se generaron.
+        fecha_referencia: Fecha de la ejecución actual.
+        usuarios_rechazados: Usuarios con documentos que el escritor no pudo insertar
+            (usuarios_con_errores).
+
+    Returns:
+        int: Número de marcas creadas o modificadas.
+    """
+    usuarios_rechazados = set(usuarios_rechazados)
+    if None in usuarios_rechazados:
+        logger.warning(f"Documentos sin usuario rechazados en {coleccion}: no se avanzan las marcas de "
+                       f"generación y los días pendientes se volverán a generar")
+        return 0
+    if usuarios_rechazados:
+        logger.warning(f"{len(usuarios_rechazados)} usuarios con documentos rechazados en {coleccion}: sus marcas "
+                       f"de generación no se avanzan y sus días pendientes se volverán a generar")
+        ids_usuarios = [id_usuario for id_usuario in ids_usuarios if id_usuario not in usuarios_rechazados]
+
+    marcas_db = db_sensor_pulsera.pulseras_inteligentes[COLECCION_MARCAS]
+    dia = datetime.combine(fecha_referencia.date(), datetime.min.time())
+
+    operaciones = [
+        UpdateOne(
+            {"id_usuario": id_usuario, "coleccion": coleccion},
+            # $max evita retroceder una marca si otra ejecución ya la adelantó
+            {"$max": {"ultimo_dia": dia}},
+            upsert=True
+        )
+        for id_usuario in ids_usuarios
+    ]
+
+    total_modificadas = 0
+    for inicio in range(0, len(operaciones), TAMANO_LOTE_MARCAS):
+        resultado = marcas_db.bulk_write(operaciones[inicio:inicio + TAMANO_LOTE_MARCAS], ordered=False)
+        total_modificadas += resultado.upserted_count + resultado.modified_count
+
+    logger.info(f"Marcas de generación de {coleccion} actualizadas hasta {dia.date()}: {total_modificadas}")
+    return total_modificadas
@@ -0,0 +1,359 @@
+"""
+Simulador de flujo continuo de eventos de pulseras y aplicación en MongoDB.
+
+A diferencia de los scripts de generación histórica, este simulador emite de forma
+continua eventos de sensores y de la aplicación para todos los usuarios, con timestamp
+del momento de emisión y a una tasa objetivo de eventos por segundo. Cuando la latencia
+de escritura en MongoDB supera el umbral configurado se reduce la tasa emitida
+(backpressure) y se vuelve a subir gradualmente cuando la latencia se normaliza.
+
+Se utiliza para pruebas de carga sostenida de la ingesta y de los procesos ETL posteriores,
+como etl_cargar_hechos_actividad.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import random
+import time
+from pulseras_inteligentes.utils.conexiones_db import conectar_db_sensor_pulsera
+from pulseras_inteligentes.utils.escritor_mongo import EscritorLotesMongo
+from pulseras_inteligentes.utils.etl_funcs import manejo_errores_proceso, logger
+from pulseras_inteligentes.sistema_operacional.ingesta_sensor_mongo.almacenamiento_sensor import crear_escritor_sensor
+from pulseras_inteligentes.sistema_operacional.ingesta_sensor_mongo.gen_data_scripts.generar_registros_sensores import (
+    generar_datos_actividad,
+    generar_datos_reposo,
+    generar_datos_sueno,
+    generar_datos_glucosa
+)
+from pulseras_inteligentes.sistema_operacional.ingesta_sensor_mongo.gen_data_scripts.generar_registros_aplicacion import (
+    generar_datos_aplicacion_usuario
+)
+
+# Parámetros por defecto del simulador
+EVENTOS_POR_SEGUNDO_DEFECTO = 500
+PROPORCION_SENSOR_DEFECTO = 0.5  # Fracción de eventos que son de sensor (el resto, de aplicación)
+TAMANO_LOTE_DEFECTO = 500
+LATENCIA_OBJETIVO_MS_DEFECTO = 200
+CAPACIDAD_COLA_DEFECTO = 10000
+INTERVALO_REPORTE_SEGUNDOS = 5
+TICKS_POR_SEGUNDO = 20
+ESPERA_MAXIMA_LOTE_SEGUNDOS = 0.5
+
+# Control de la tasa ante latencias altas (incremento aditivo, reducción multiplicativa)
+FACTOR_REDUCCION_TASA = 0.7
+INCREMENTO_TASA = 0.05  # Fracción de la tasa objetivo recuperada por lote con latencia normal
+TASA_MINIMA_RELATIVA = 0.05
+
+GENERADORES_SENSOR = (generar_datos_actividad, generar_datos_reposo, generar_datos_sueno, generar_datos_glucosa)
+
+
+class MetricasStreaming:
+    """
+    Métricas en vivo del simulador: eventos emitidos y escritos, tasa lograda,
+    latencia de escritura y retraso (lag) respecto del momento de emisión.
+    """
+
+    def __init__(self):
+        self.eventos_emitidos = 0
+        self.eventos_escritos = 0
+        self.eventos_con_error = 0
+        self.lotes_escritos = 0
+        self.latencia_ultimo_lote = 0.0
+        self.lag_emision = 0.0  # Retraso del productor respecto de su calendario
+        self.lag_escritura = 0.0  # Antigüedad del evento más viejo del último lote al escribirse
+        self._inicio = time.perf_counter()
+        self._ultimo_reporte = self._inicio
+        self._escritos_ultimo_reporte = 0
+
+    def tasa_lograda(self) -> float:
+        """
+        Calcula la tasa de escritura desde el último reporte y reinicia la ventana.
+
+        Returns:
+            float: Eventos escritos por segundo en la ventana.
+        """
+        ahora = time.perf_counter()
+        ventana = ahora - self._ultimo_reporte
+        escritos = self.eventos_escritos - self._escritos_ultimo_reporte
+        self._ultimo_reporte = ahora
+        self._escritos_ultimo_reporte = self.eventos_escritos
+        return escritos / ventana if ventana > 0 else 0.0
+
+    def tasa_media(self) -> float:
+        """
+        Returns:
+            float: Eventos escritos por segundo desde el inicio de la simulación.
+        """
+        duracion = time.perf_counter() - self._inicio
+        return self.eventos_escritos / duracion if duracion > 0 else 0.0
+
+
+class SimuladorStreaming:
+    """
+    Simulador asíncrono que emite eventos para todos los usuarios a una tasa objetivo
+    y los escribe por lotes en las colecciones datos_sensor y datos_aplicacion.
+    """
+
+    def __init__(self, db_sensor_pulsera, usuarios: list,
+                 eventos_por_segundo: float = EVENTOS_POR_SEGUNDO_DEFECTO,
+                 proporcion_sensor: float = PROPORCION_SENSOR_DEFECTO,
+                 tamano_lote: int = TAMANO_LOTE_DEFECTO,
+                 latencia_objetivo_ms: float = LATENCIA_OBJETIVO_MS_DEFECTO,
+                 capacidad_cola: int = CAPACIDAD_COLA_DEFECTO,
+                 semilla: Optional[int] = None):
+        """
+        Args:
+            db_sensor_pulsera: Cliente de MongoDB.
+            usuarios: Lista de documentos de usuarios con sus IDs.
+            eventos_por_segundo: Tasa objetivo de eventos emitidos por segundo.
+            proporcion_sensor: Fracción de eventos de sensor frente a eventos de aplicación.
+            tamano_lote: Número máximo de documentos por escritura.
+            latencia_objetivo_ms: Latencia de escritura a partir de la cual se reduce la tasa.
+            capacidad_cola: Número máximo de eventos pendientes de escribir.
+            semilla: Semilla del generador aleatorio (opcional).
+        """
+        if not usuarios:
+            raise ValueError("No hay usuarios para simular eventos")
+
+        # Los escritores se usan sin buffer: el simulador arma sus propios lotes
+        self.escritores = {
+            "datos_sensor": crear_escritor_sensor(db_sensor_pulsera, tamano_lote=tamano_lote),
+            "datos_aplicacion": EscritorLotesMongo(db_sensor_pulsera.pulseras_inteligentes.datos_aplicacion,
+                                                   tamano_lote=tamano_lote),
+        }
+        self.ids_usuarios = [usuario["id_usuario"] for usuario in usuarios]
+        self.tasa_objetivo = eventos_por_segundo
+        self.tasa_efectiva = eventos_por_segundo
+        self.proporcion_sensor = proporcion_sensor
+        self.tamano_lote = tamano_lote
+        self.latencia_objetivo = latencia_objetivo_ms / 1000
+        self.capacidad_cola = capacidad_cola
+        self.rng = random.Random(semilla)
+        self.metricas = MetricasStreaming()
+
+        self._cola: Optional[asyncio.Queue] = None
+        self._detener: Optional[asyncio.Event] = None
+
+    def generar_evento(self) -> Tuple[str, Dict[str, Any]]:
+        """
+        Genera un evento de sensor o de aplicación para un usuario al azar, con timestamp actual.
+
+        Returns:
+            Tuple[str, Dict[str, Any]]: Nombre de la colección destino y documento del evento.
+        """
+        id_usuario = self.rng.choice(self.ids_usuarios)
+        ahora = datetime.now()
+
+        if self.rng.random() < self.proporcion_sensor:
+            registro = None
+            # Algunos generadores devuelven None según su probabilidad; se reintenta con otro tipo
+            while registro is None:
+                registro = self.rng.choice(GENERADORES_SENSOR)(id_usuario, ahora, self.rng)
+            coleccion = "datos_sensor"
+        else:
+            registro = generar_datos_aplicacion_usuario(id_usuario, ahora, self.rng)
+            coleccion = "datos_aplicacion"
+
+        registro["timestamp"] = ahora
+        return coleccion, registro
+
+    def _ajustar_tasa(self, latencia: float) -> None:
+        """
+        Ajusta la tasa efectiva según la latencia del último lote escrito.
+        """
+        if latencia > self.latencia_objetivo:
+            tasa_minima = self.tasa_objetivo * TASA_MINIMA_RELATIVA
+            nueva_tasa = max(tasa_minima, self.tasa_efectiva * FACTOR_REDUCCION_TASA)
+            if nueva_tasa < self.tasa_efectiva:
+                logger.debug(f"Latencia de escritura {latencia * 1000:.0f} ms: tasa reducida a {nueva_tasa:.0f} eventos/s")
+            self.tasa_efectiva = nueva_tasa
+        else:
+            self.tasa_efectiva = min(self.tasa_objetivo,
+                                     self.tasa_efectiva + self.tasa_objetivo * INCREMENTO_TASA)
+
+    async def _productor(self) -> None:
+        """
+        Emite eventos siguiendo un calendario de ticks. Si la cola está llena, put()
+        bloquea al productor hasta que el escritor libere espacio.
+        """
+        bucle = asyncio.get_running_loop()
+        intervalo = 1 / TICKS_POR_SEGUNDO
+        siguiente_tick = bucle.time()
+        pendientes = 0.0
+
+        while not self._detener.is_set():
+            self.metricas.lag_emision = max(0.0, bucle.time() - siguiente_tick)
+
+            pendientes += self.tasa_efectiva * intervalo
+            a_emitir = int(pendientes)
+            pendientes -= a_emitir
+
+            for _ in range(a_emitir):
+                coleccion, registro = self.generar_evento()
+                await self._cola.put((coleccion, registro, time.perf_counter()))
+                self.metricas.eventos_emitidos += 1
+
+            # Si el productor va atrasado no intenta recuperar los ticks perdidos
+            siguiente_tick = max(siguiente_tick + intervalo, bucle.time() - intervalo)
+            await asyncio.sleep(max(0.0, siguiente_tick - bucle.time()))
+
+    async def _escribir_lote(self, nombre_coleccion: str, documentos: List[Dict[str, Any]]) -> int:
+        """
+        Escribe un lote en MongoDB en un hilo aparte para no bloquear el bucle de eventos.
+        """
+        return await asyncio.to_thread(self.escritores[nombre_coleccion].escribir, documentos)
+
+    async def _escritor(self) -> None:
+        """
+        Consume la cola, agrupa los eventos por colección y los escribe por lotes.
+        """
+        while not (self._detener.is_set() and self._cola.empty()):
+            lote: List[Tuple[str, Dict[str, Any], float]] = []
+            try:
+                lote.append(await asyncio.wait_for(self._cola.get(), timeout=ESPERA_MAXIMA_LOTE_SEGUNDOS))
+            except asyncio.TimeoutError:
+                continue
+            while len(lote) < self.tamano_lote and not self._cola.empty():
+                lote.append(self._cola.get_nowait())
+
+            por_coleccion: Dict[str, List[Dict[str, Any]]] = {}
+            for coleccion, registro, _ in lote:
+                por_coleccion.setdefault(coleccion, []).append(registro)
+
+            inicio = time.perf_counter()
+            escritos = 0
+            for coleccion, documentos in por_coleccion.items():
+                escritos += await self._escribir_lote(coleccion, documentos)
+            fin = time.perf_counter()
+
+            latencia = fin - inicio
+            self.metricas.eventos_escritos += escritos
+            self.metricas.eventos_con_error += len(lote) - escritos
+            self.metricas.lotes_escritos += 1
+            self.metricas.latencia_ultimo_lote = latencia
+            self.metricas.lag_escritura = fin - min(emitido for _, _, emitido in lote)
+            self._ajustar_tasa(latencia)
+
+    async def _reportero(self) -> None:
+        """
+        Registra periódicamente la tasa lograda, la tasa efectiva y el lag.
+        """
+        while not self._detener.is_set():
+            await asyncio.sleep(INTERVALO_REPORTE_SEGUNDOS)
+            m = self.metricas
+            logger.info(f"Streaming: {m.tasa_lograda():.0f} eventos/s escritos "
+                        f"(objetivo {self.tasa_objetivo:.0f}, efectiva {self.tasa_efectiva:.0f}), "
+                        f"latencia {m.latencia_ultimo_lote * 1000:.0f} ms, "
+                        f"lag emisión {m.lag_emision * 1000:.0f} ms, lag escritura {m.lag_escritura * 1000:.0f} ms, "
+                        f"cola {self._cola.qsize()}/{self.capacidad_cola}")
+
+    async def ejecutar(self, duracion_segundos: Optional[float] = None) -> MetricasStreaming:
+        """
+        Ejecuta la simulación hasta agotar la duración indicada o hasta que se llame a detener().
+
+        Args:
+            duracion_segundos: Duración de la simulación. Si es None, se ejecuta indefinidamente.
+
+        Returns:
+            MetricasStreaming: Métricas finales de la simulación.
+
+        Raises:
+            Exception: El primer error de una de las tareas (p. ej. del escritor al perder la
+            conexión con MongoDB), después de cancelar las demás.
+        """
+        self._cola = asyncio.Queue(maxsize=self.capacidad_cola)
+        self._detener = asyncio.Event()
+
+        productor = asyncio.create_task(self._productor())
+        escritor = asyncio.create_task(self._escritor())
+        reportero = asyncio.create_task(self._reportero())
+        detencion = asyncio.create_task(self._detener.wait())
+        tareas = (productor, escritor, reportero, detencion)
+
+        try:
+            # Las tareas solo terminan antes de la detención si fallan
+            await asyncio.wait(tareas, timeout=duracion_segundos, return_when=asyncio.FIRST_COMPLETED)
+
+            # Se detiene el productor y se deja que el escritor vacíe la cola. Si el escritor falla
+            # nadie consume la cola y el productor quedaría bloqueado en put(): no se lo espera
+            self._detener.set()
+            await asyncio.wait((productor, escritor), return_when=asyncio.FIRST_EXCEPTION)
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+            await asyncio.gather(*tareas, return_exceptions=True)
+
+        for tarea in (escritor, productor, reportero):
+            if not tarea.cancelled() and tarea.exception() is not None:
+                logger.error(f"Streaming detenido por un error: {tarea.exception()}")
+                raise tarea.exception()
+
+        logger.info(f"Streaming finalizado: {self.metricas.eventos_emitidos} eventos emitidos, "
+                    f"{self.metricas.eventos_escritos} escritos, {self.metricas.eventos_con_error} errores, "
+                    f"{self.metricas.tasa_media():.0f} eventos/s de media")
+        return self.metricas
+
+    def detener(self) -> None:
+        """
+        Solicita la detención ordenada de la simulación.
+        """
+        if self._detener is not None:
+            self._detener.set()
+
+
+def main(eventos_por_segundo: float = EVENTOS_POR_SEGUNDO_DEFECTO, duracion_segundos: Optional[float] = None,
+         proporcion_sensor: float = PROPORCION_SENSOR_DEFECTO, tamano_lote: int = TAMANO_LOTE_DEFECTO,
+         latencia_objetivo_ms: float = LATENCIA_OBJETIVO_MS_DEFECTO, semilla: Optional[int] = None):
+    """
+    Función principal que coordina la simulación de eventos en tiempo real.
+
+    Args:
+        eventos_por_segundo: Tasa objetivo de eventos emitidos por segundo.
+        duracion_segundos: Duración de la simulación (None para ejecutar hasta interrumpir).
+        proporcion_sensor: Fracción de eventos de sensor frente a eventos de aplicación.
+        tamano_lote: Número máximo de documentos por escritura.
+        latencia_objetivo_ms: Latencia de escritura a partir de la cual se reduce la tasa.
+        semilla: Semilla del generador aleatorio (opcional).
+    """
+    nombre_proceso = "SIMULADOR_STREAMING"
+
+    with manejo_errores_proceso(nombre_proceso):
+        # Conexión a la base de datos
+        db_sensor_pulsera = conectar_db_sensor_pulsera()
+
+        try:
+            usuarios = list(db_sensor_pulsera.pulseras_inteligentes.usuarios_sensor.find({}, {"id_usuario": 1}))
+            logger.info(f"Iniciando simulación en tiempo real para {len(usuarios)} usuarios "
+                        f"a {eventos_por_segundo} eventos/s")
+
+            simulador = SimuladorStreaming(
+                db_sensor_pulsera, usuarios,
+                eventos_por_segundo=eventos_por_segundo,
+                proporcion_sensor=proporcion_sensor,
+                tamano_lote=tamano_lote,
+                latencia_objetivo_ms=latencia_objetivo_ms,
+                semilla=semilla
+            )
+            try:
+                asyncio.run(simulador.ejecutar(duracion_segundos))
+            except KeyboardInterrupt:
+                logger.info(f"{nombre_proceso}: Simulación interrumpida por el usuario.")
+        finally:
+            # Cierre de conexión
+            db_sensor_pulsera.close()
+
+
+if __name__ == "__main__":
+    argumentos = argparse.ArgumentParser(description="Simulación en tiempo real de eventos de pulseras y aplicación")
+    argumentos.add_argument("--eventos-por-segundo", type=float, default=EVENTOS_POR_SEGUNDO_DEFECTO)
+    argumentos.add_argument("--duracion", type=float, default=None, help="Duración en segundos (por defecto, indefinida)")
+    argumentos.add_argument("--proporcion-sensor", type=float, default=PROPORCION_SENSOR_DEFECTO)
+    argumentos.add_argument("--tamano-lote", type=int, default=TAMANO_LOTE_DEFECTO)
+    argumentos.add_argument("--latencia-objetivo-ms", type=float, default=LATENCIA_OBJETIVO_MS_DEFECTO)
+    argumentos.add_argument("--semilla", type=int, default=None)
+    args = argumentos.parse_args()
+    main(eventos_por_segundo=args.eventos_por_segundo, duracion_segundos=args.duracion,
+         proporcion_sensor=args.proporcion_sensor, tamano_lote=args.tamano_lote,
+         latencia_objetivo_ms=args.latencia_objetivo_ms, semilla=args.semilla)
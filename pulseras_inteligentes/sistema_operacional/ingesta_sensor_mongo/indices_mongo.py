@@ -0,0 +1,234 @@
+"""
+Módulo para la gestión de los índices de las colecciones de MongoDB.
+
+Declara los índices que necesitan las consultas de los procesos ETL y de generación de datos,
+y los crea de forma idempotente (create_indexes no hace nada si el índice ya existe con la
+misma definición). También informa el tamaño de los índices de cada colección y el plan de
+ejecución (explain) de las consultas más frecuentes, para verificar que usan un índice
+(IXSCAN) y no recorren la colección completa (COLLSCAN).
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+from pymongo import ASCENDING, IndexModel, MongoClient
+from pymongo.errors import OperationFailure
+from pulseras_inteligentes.utils.conexiones_db import conectar_db_sensor_pulsera
+from pulseras_inteligentes.utils.etl_funcs import manejo_errores_proceso, logger
+
+# Índices requeridos por colección
+INDICES_REQUERIDOS: Dict[str, List[IndexModel]] = {
+    # cargar_usuarios_mongodb (upsert por id_usuario)
+    "usuarios_sensor": [
+        IndexModel([("id_usuario", ASCENDING)], unique=True),
+    ],
+    # extraer_actividad_fisica (por usuario) e iterar_actividad_fisica (todos los usuarios, por timestamp y _id)
+    "datos_sensor": [
+        IndexModel([("id_usuario", ASCENDING), ("tipo_registro", ASCENDING), ("timestamp", ASCENDING)]),
+        IndexModel([("tipo_registro", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    # extraer_actividad_aplicacion (por usuario) e iterar_actividad_aplicacion (todos los usuarios)
+    "datos_aplicacion": [
+        IndexModel([("id_usuario", ASCENDING), ("timestamp", ASCENDING)]),
+        IndexModel([("timestamp", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    # Lecturas de sensores en modo timeseries
+    "datos_sensor_ts": [
+        IndexModel([("meta.tipo_registro", ASCENDING), ("meta.id_usuario", ASCENDING), ("timestamp", ASCENDING)]),
+    ],
+    # Upsert de buckets por usuario y día, y lectura de los días posteriores a una fecha
+    "datos_sensor_buckets": [
+        IndexModel([("id_usuario", ASCENDING), ("dia", ASCENDING)], unique=True),
+        IndexModel([("dia", ASCENDING)]),
+    ],
+    # Un documento por usuario y hora
+    "frecuencia_cardiaca": [
+        IndexModel([("id_usuario", ASCENDING), ("hora", ASCENDING)], unique=True),
+    ],
+    # leer_marcas (por colección) y actualizar_marcas (por colección y usuario)
+    "marcas_generacion": [
+        IndexModel([("coleccion", ASCENDING), ("id_usuario", ASCENDING)]),
+    ],
+}
+
+# Colecciones que deben crearse con opciones propias (p. ej. series temporales): si todavía
+# no existen no se les crean índices, porque create_indexes las crearía como colecciones normales
+COLECCIONES_SOLO_SI_EXISTEN = {"datos_sensor_ts"}
+
+
+def consultas_frecuentes(fecha_base: datetime) -> List[Tuple[str, str, Dict[str, Any], Optional[List[Tuple[str, int]]]]]:
+    """
+    Devuelve las consultas más frecuentes de los procesos ETL sobre MongoDB.
+
+    Args:
+        fecha_base: Fecha usada como marca de agua en los filtros por timestamp.
+
+    Returns:
+        List[Tuple]: Descripción, colección, filtro y orden (opcional) de cada consulta.
+    """
+    return [
+        ("Usuario por id_usuario", "usuarios_sensor", {"id_usuario": 1}, None),
+        ("Actividad física de un usuario", "datos_sensor",
+         {"id_usuario": 1, "tipo_registro": "actividad", "timestamp": {"$gt": fecha_base}}, None),
+        ("Actividad física de todos los usuarios", "datos_sensor",
+         {"tipo_registro": "actividad", "timestamp": {"$gt": fecha_base}}, [("timestamp", ASCENDING), ("_id", ASCENDING)]),
+        ("Uso de aplicación de un usuario", "datos_aplicacion",
+         {"id_usuario": 1, "timestamp": {"$gt": fecha_base}}, None),
+        ("Uso de aplicación de todos los usuarios", "datos_aplicacion",
+         {"timestamp": {"$gt": fecha_base}}, [("timestamp", ASCENDING), ("_id", ASCENDING)]),
+    ]
+
+
+def asegurar_indices(db_sensor_pulsera: MongoClient) -> Dict[str, List[str]]:
+    """
+    Crea los índices declarados en INDICES_REQUERIDOS que todavía no existen.
+
+    Args:
+        db_sensor_pulsera: Cliente de MongoDB.
+
+    Returns:
+        Dict[str, List[str]]: Nombres de los índices asegurados por colección.
+    """
+    base_datos = db_sensor_pulsera.pulseras_inteligentes
+    existentes = set(base_datos.list_collection_names())
+
+    asegurados = {}
+    for coleccion, indices in INDICES_REQUERIDOS.items():
+        if coleccion in COLECCIONES_SOLO_SI_EXISTEN and coleccion not in existentes:
+            logger.debug(f"La colección {coleccion} no existe todavía; sus índices se crearán en otra ejecución")
+            continue
+
+        try:
+            nombres = base_datos[coleccion].create_indexes(indices)
+        except OperationFailure as e:
+            # Un índice con el mismo nombre y otra definición, o datos que violan un índice único
+            logger.error(f"No se pudieron crear los índices de {coleccion}: {e}")
+            continue
+
+        asegurados[coleccion] = nombres
+        logger.info(f"Índices asegurados en {coleccion}: {', '.join(nombres)}")
+    return asegurados
+
+
+def obtener_tamanos_indices(db_sensor_pulsera: MongoClient) -> Dict[str, Dict[str, int]]:
+    """
+    Obtiene el tamaño en bytes de cada índice de las colecciones gestionadas.
+
+    Args:
+        db_sensor_pulsera: Cliente de MongoDB.
+
+    Returns:
+        Dict[str, Dict[str, int]]: Colección -> nombre del índice -> bytes.
+    """
+    base_datos = db_sensor_pulsera.pulseras_inteligentes
+    existentes = set(base_datos.list_collection_names())
+
+    tamanos = {}
+    for coleccion in INDICES_REQUERIDOS:
+        if coleccion not in existentes:
+            continue
+        try:
+            estadisticas = next(base_datos[coleccion].aggregate([{"$collStats": {"storageStats": {}}}]))["storageStats"]
+        except (OperationFailure, StopIteration, KeyError) as e:
+            logger.warning(f"No se pudieron obtener estadísticas de {coleccion}: {e}")
+            continue
+
+        tamanos[coleccion] = dict(estadisticas.get("indexSizes", {}))
+        total = estadisticas.get("totalIndexSize", sum(tamanos[coleccion].values()))
+        detalle = ", ".join(f"{nombre}={tamano / 1024 ** 2:.2f} MB" for nombre, tamano in tamanos[coleccion].items())
+        logger.info(f"Índices de {coleccion}: {total / 1024 ** 2:.2f} MB en total ({detalle})")
+    return tamanos
+
+
+def _etapas_plan(plan: Dict[str, Any]) -> List[str]:
+    """
+    Recorre un plan ganador de explain y devuelve sus etapas, de la más externa a la más interna.
+    """
+    etapas = []
+    while plan:
+        etapa = plan.get("stage", "?")
+        if plan.get("indexName"):
+            etapa += f"({plan['indexName']})"
+        etapas.append(etapa)
+        # Los planes anidan la etapa siguiente en inputStage (o en inputStages para uniones)
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return etapas
+
+
+def explicar_consultas(db_sensor_pulsera: MongoClient, fecha_base: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Ejecuta explain sobre las consultas frecuentes y registra su plan y los documentos examinados.
+
+    Args:
+        db_sensor_pulsera: Cliente de MongoDB.
+        fecha_base: Marca de agua de los filtros por timestamp (por defecto, hace un día).
+
+    Returns:
+        List[Dict[str, Any]]: Por consulta, sus etapas, si recorre la colección y los documentos
+        examinados y devueltos.
+    """
+    if fecha_base is None:
+        fecha_base = datetime.now() - timedelta(days=1)
+    base_datos = db_sensor_pulsera.pulseras_inteligentes
+
+    resultados = []
+    for descripcion, coleccion, filtro, orden in consultas_frecuentes(fecha_base):
+        cursor = base_datos[coleccion].find(filtro)
+        if orden:
+            cursor = cursor.sort(orden)
+        try:
+            plan = cursor.explain()
+        except OperationFailure as e:
+            logger.warning(f"No se pudo obtener el plan de '{descripcion}': {e}")
+            continue
+
+        etapas = _etapas_plan(plan.get("queryPlanner", {}).get("winningPlan", {}))
+        ejecucion = plan.get("executionStats", {})
+        resultado = {
+            "consulta": descripcion,
+            "coleccion": coleccion,
+            "etapas": etapas,
+            "recorre_coleccion": any(etapa.startswith("COLLSCAN") for etapa in etapas),
+            "documentos_examinados": ejecucion.get("totalDocsExamined"),
+            "documentos_devueltos": ejecucion.get("nReturned"),
+        }
+        resultados.append(resultado)
+
+        mensaje = (f"Plan de '{descripcion}' en {coleccion}: {' <- '.join(etapas)}, "
+                   f"{resultado['documentos_examinados']} documentos examinados, "
+                   f"{resultado['documentos_devueltos']} devueltos")
+        if resultado["recorre_coleccion"]:
+            logger.warning(mensaje)
+        else:
+            logger.info(mensaje)
+    return resultados
+
+
+def main(explicar: bool = False):
+    """
+    Función principal que asegura los índices de MongoDB e informa su tamaño y uso.
+
+    Args:
+        explicar: Si es True, registra además el plan de las consultas frecuentes. Cada explain
+            ejecuta la consulta, por lo que el pipeline principal no lo activa; la línea de
+            comandos sí, salvo con --sin-explain.
+    """
+    nombre_proceso = "ASEGURAR_INDICES_MONGO"
+
+    with manejo_errores_proceso(nombre_proceso):
+        db_sensor_pulsera = conectar_db_sensor_pulsera()
+
+        try:
+            asegurar_indices(db_sensor_pulsera)
+            obtener_tamanos_indices(db_sensor_pulsera)
+            if explicar:
+                explicar_consultas(db_sensor_pulsera)
+        finally:
+            db_sensor_pulsera.close()
+
+
+if __name__ == "__main__":
+    argumentos = argparse.ArgumentParser(description="Creación e informe de los índices de MongoDB")
+    argumentos.add_argument("--sin-explain", action="store_true", help="No registra el plan de las consultas frecuentes")
+    args = argumentos.parse_args()
+    main(explicar=not args.sin_explain)
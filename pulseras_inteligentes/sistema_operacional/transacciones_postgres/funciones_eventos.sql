@@ -56,6 +56,79 @@ AFTER UPDATE ON usuarios
 FOR EACH ROW
 EXECUTE FUNCTION registrar_update_usuarios();
 
+-- Función para registrar inserción en la tabla usuarios
+-- Permite que la sincronización incremental de usuarios detecte las altas
+CREATE OR REPLACE FUNCTION registrar_insert_usuarios()
+RETURNS TRIGGER AS $$
+DECLARE
+    clave_pk TEXT;
+BEGIN
+    clave_pk := NEW.id_usuario::TEXT;
+
+    INSERT INTO log_eventos (
+        tabla_afectada,
+        operacion,
+        fecha_operacion,
+        clave_primaria,
+        datos_anteriores,
+        datos_nuevos
+    )
+    VALUES (
+        'usuarios',
+        'INSERT',
+        CURRENT_TIMESTAMP,
+        clave_pk,
+        NULL,                      -- No hay estado anterior en una inserción
+        to_jsonb(NEW)
+    );
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_insert_usuarios
+AFTER INSERT ON usuarios
+FOR EACH ROW
+EXECUTE FUNCTION registrar_insert_usuarios();
+
+-- Función para registrar eliminación en la tabla usuarios
+-- Permite que la sincronización incremental de usuarios detecte las bajas
+CREATE OR REPLACE FUNCTION registrar_delete_usuarios()
+RETURNS TRIGGER AS $$
+DECLARE
+    clave_pk TEXT;
+BEGIN
+    clave_pk := OLD.id_usuario::TEXT;
+
+    INSERT INTO log_eventos (
+        tabla_afectada,
+        operacion,
+        fecha_operacion,
+        clave_primaria,
+        datos_anteriores,
+        datos_nuevos
+    )
+    VALUES (
+        'usuarios',
+        'DELETE',
+        CURRENT_TIMESTAMP,
+        clave_pk,
+        to_jsonb(OLD),
+        NULL                       -- No hay estado nuevo en una eliminación
+    );
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_delete_usuarios
+AFTER DELETE ON usuarios
+FOR EACH ROW
+EXECUTE FUNCTION registrar_delete_usuarios();
+
+-- Índice para leer eficientemente los eventos de una tabla posteriores a un id_log
+CREATE INDEX IF NOT EXISTS idx_log_eventos_tabla_id_log ON log_eventos (tabla_afectada, id_log);
+
 -- =====================================================================================
 -- COMENTARIOS ADICIONALES
 -- =====================================================================================
@@ -67,6 +140,10 @@ EXECUTE FUNCTION registrar_update_usuarios();
 --    - Actualizaciones de configuración de usuario
 --    - Modificaciones de estado o permisos
 --
+-- 2. USUARIOS (INSERT/DELETE): Registra altas y bajas de usuarios, de modo que la
+--    sincronización incremental hacia MongoDB (etl_insertar_usuarios) solo procese
+--    los usuarios con eventos posteriores a su checkpoint
+--
 -- Beneficios del sistema de auditoría:
 -- - Trazabilidad completa: Saber qué cambió, cuándo y cómo
 -- - Soporte para ETL: Los procesos del Data Warehouse pueden identificar registros
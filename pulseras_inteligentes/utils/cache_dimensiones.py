@@ -0,0 +1,326 @@
+"""
+Módulo de caché en memoria para las dimensiones del Data Warehouse.
+
+Las tablas de hechos necesitan resolver, para cada fila, la clave de las dimensiones de
+fecha y de actividad. Consultarlas por cada fila cuesta un viaje HTTP por hecho cargado;
+este módulo carga cada dimensión una sola vez por conexión y resuelve las claves en memoria,
+consultando la base solo para los valores que no estaban precargados.
+"""
+
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from pulseras_inteligentes.utils.etl_funcs import convertir_fecha, logger
+from pulseras_inteligentes.utils.extraccion_paginada import extraer_paginado
+
+# Número de fechas por consulta in_ al resolver fechas no precargadas
+TAMANO_LOTE_FALTANTES = 200
+
+
+def clave_fecha(fecha: Union[str, datetime, date]) -> str:
+    """
+    Obtiene la clave YYYY-MM-DD de una fecha, sin convertir zonas horarias.
+
+    Args:
+        fecha: Fecha en formato ISO (u otro formato reconocible) u objeto datetime/date.
+
+    Returns:
+        str: Fecha en formato YYYY-MM-DD.
+    """
+    if isinstance(fecha, (datetime, date)):
+        return fecha.strftime("%Y-%m-%d")
+    # Las cadenas ISO empiezan con la fecha; el resto de formatos se interpreta con convertir_fecha
+    if len(fecha) >= 10 and fecha[4] == "-" and fecha[7] == "-" and fecha[:4].isdigit():
+        return fecha[:10]
+    return convertir_fecha(fecha).strftime("%Y-%m-%d")
+
+
+class CacheFechas:
+    """
+    Caché de la dimensión de fecha: fecha (YYYY-MM-DD) -> id_fecha.
+
+    Al crearse carga dim_fecha completa con la extracción paginada. Las fechas que no
+    están en memoria se consultan en un único pedido por lote y, si tampoco existen en la
+    base, se recuerdan como faltantes para no volver a consultarlas.
+
+    Ejemplo:
+        cache = CacheFechas(db_dw)
+        id_fecha = cache.obtener("2025-03-01T10:15:00")
+    """
+
+    def __init__(self, db_dw, precargar: bool = True):
+        """
+        Args:
+            db_dw: Conexión al Data Warehouse.
+            precargar: Si es True, carga toda la dimensión al crearse.
+        """
+        self.db_dw = db_dw
+        self._ids: Dict[str, int] = {}
+        self._faltantes = set()
+
+        # Estadísticas de uso
+        self.aciertos = 0
+        self.fallos = 0
+        self.consultas = 0
+
+        if precargar:
+            self.recargar()
+
+    def recargar(self) -> int:
+        """
+        Carga la dimensión de fecha completa en memoria.
+
+        Returns:
+            int: Número de fechas cargadas.
+        """
+        filas = extraer_paginado(self.db_dw, "dim_fecha", "id_fecha, fecha", clave="id_fecha")
+        self._ids = {fila["fecha"][:10]: fila["id_fecha"] for fila in filas}
+        self._faltantes.clear()
+        self.consultas += 1
+        logger.info(f"Caché de dim_fecha cargada con {len(self._ids)} fechas")
+        return len(self._ids)
+
+    def _consultar_faltantes(self, claves: List[str]) -> None:
+        """
+        Consulta en la base las fechas indicadas, en lotes, y las agrega a la caché.
+        """
+        for inicio in range(0, len(claves), TAMANO_LOTE_FALTANTES):
+            lote = claves[inicio:inicio + TAMANO_LOTE_FALTANTES]
+            respuesta = (
+                self.db_dw.table("dim_fecha")
+                .select("id_fecha, fecha")
+                .in_("fecha", [f"{clave}T00:00:00" for clave in lote])
+                .execute()
+            )
+            self.consultas += 1
+            for fila in respuesta.data:
+                self._ids[fila["fecha"][:10]] = fila["id_fecha"]
+
+        for clave in claves:
+            if clave not in self._ids:
+                self._faltantes.add(clave)
+                logger.warning(f"No se encontró ID para la fecha {clave}")
+
+    def obtener_varios(self, fechas: Iterable[Union[str, datetime, date]]) -> List[Optional[int]]:
+        """
+        Resuelve el ID de varias fechas, consultando las que falten en un único pedido por lote.
+
+        Args:
+            fechas: Fechas en formato ISO u objetos datetime/date (las nulas se resuelven como None).
+
+        Returns:
+            List[Optional[int]]: ID de cada fecha, o None si no existe en la dimensión.
+        """
+        claves = [clave_fecha(fecha) if fecha is not None else None for fecha in fechas]
+
+        pendientes = list(dict.fromkeys(
+            clave for clave in claves
+            if clave is not None and clave not in self._ids and clave not in self._faltantes
+        ))
+        if pendientes:
+            self._consultar_faltantes(pendientes)
+
+        resultado = []
+        for clave in claves:
+            id_fecha = self._ids.get(clave)
+            if id_fecha is None:
+                self.fallos += 1
+            else:
+                self.aciertos += 1
+            resultado.append(id_fecha)
+        return resultado
+
+    def obtener(self, fecha: Union[str, datetime, date]) -> Optional[int]:
+        """
+        Resuelve el ID de una fecha.
+
+        Args:
+            fecha: Fecha en formato ISO u objeto datetime/date.
+
+        Returns:
+            Optional[int]: ID de la fecha, o None si no existe en la dimensión.
+        """
+        return self.obtener_varios([fecha])[0]
+
+    def registrar_estadisticas(self) -> None:
+        """
+        Registra en el log los aciertos, fallos y consultas realizadas por la caché.
+        """
+        total = self.aciertos + self.fallos
+        tasa_aciertos = self.aciertos / total * 100 if total else 0
+        logger.info(f"Caché de dim_fecha: {self.aciertos} aciertos, {self.fallos} fallos "
+                    f"({tasa_aciertos:.1f}% aciertos), {self.consultas} consultas a la base")
+
+
+# Una caché por conexión al Data Warehouse, para que las cargas de hechos la compartan
+_caches_fechas: Dict[int, CacheFechas] = {}
+
+
+def obtener_cache_fechas(db_dw) -> CacheFechas:
+    """
+    Devuelve la caché de la dimensión de fecha asociada a una conexión, creándola la primera vez.
+
+    Args:
+        db_dw: Conexión al Data Warehouse.
+
+    Returns:
+        CacheFechas: Caché de la conexión.
+    """
+    cache = _caches_fechas.get(id(db_dw))
+    # Se verifica que la caché corresponda a la misma conexión y no solo al mismo id
+    if cache is None or cache.db_dw is not db_dw:
+        cache = CacheFechas(db_dw)
+        _caches_fechas[id(db_dw)] = cache
+    return cache
+
+
+class CacheDimension:
+    """
+    Caché genérica de una dimensión pequeña: valor descriptivo -> clave subrogada.
+
+    Carga la tabla completa al crearse. Ante un valor desconocido vuelve a cargar la tabla
+    (una vez por lote de búsquedas) por si otro proceso lo agregó y, si está configurada
+    con auto_insertar, inserta todos los valores que sigan faltando en un único pedido.
+
+    Ejemplo:
+        cache = CacheDimension(db_dw, "dim_actividad", "descripcion", "id_actividad")
+        id_actividad = cache.obtener("caminar")
+    """
+
+    def __init__(self, db_dw, tabla: str, columna_valor: str, columna_id: str, auto_insertar: bool = False):
+        """
+        Args:
+            db_dw: Conexión al Data Warehouse.
+            tabla: Nombre de la tabla de dimensión.
+            columna_valor: Columna con el valor descriptivo que se busca.
+            columna_id: Columna con la clave subrogada.
+            auto_insertar: Si es True, los valores desconocidos se insertan en la dimensión.
+        """
+        self.db_dw = db_dw
+        self.tabla = tabla
+        self.columna_valor = columna_valor
+        self.columna_id = columna_id
+        self.auto_insertar = auto_insertar
+        self._ids: Dict[Any, int] = {}
+
+        # Estadísticas de uso
+        self.aciertos = 0
+        self.fallos = 0
+        self.recargas = 0
+        self.insertados = 0
+
+        self.recargar()
+
+    def recargar(self) -> int:
+        """
+        Carga la dimensión completa en memoria.
+
+        Returns:
+            int: Número de valores cargados.
+        """
+        filas = extraer_paginado(
+            self.db_dw, self.tabla, f"{self.columna_id}, {self.columna_valor}", clave=self.columna_id
+        )
+        self._ids = {fila[self.columna_valor]: fila[self.columna_id] for fila in filas}
+        self.recargas += 1
+        logger.debug(f"Caché de {self.tabla} cargada con {len(self._ids)} valores")
+        return len(self._ids)
+
+    def _insertar_faltantes(self, faltantes: List[Tuple[Any, Dict[str, Any]]]) -> None:
+        """
+        Inserta en un único pedido los valores faltantes con sus atributos y los agrega a la caché.
+        """
+        filas = [{self.columna_valor: valor, **atributos} for valor, atributos in faltantes]
+        try:
+            respuesta = self.db_dw.table(self.tabla).insert(filas).execute()
+        except Exception as e:
+            logger.error(f"Error al insertar {len(filas)} valores nuevos en {self.tabla}: {e}")
+            return
+
+        for fila in respuesta.data:
+            self._ids[fila[self.columna_valor]] = fila[self.columna_id]
+        self.insertados += len(respuesta.data)
+        logger.info(f"Insertados {len(respuesta.data)} valores nuevos en {self.tabla}: "
+                    f"{', '.join(str(valor) for valor, _ in faltantes)}")
+
+    def obtener_varios(self, valores: Iterable[Any],
+                       atributos: Optional[Dict[str, Any]] = None) -> List[Optional[int]]:
+        """
+        Resuelve la clave de varios valores con a lo sumo una recarga y una inserción.
+
+        Args:
+            valores: Valores descriptivos a resolver.
+            atributos: Valores de las demás columnas para los registros que se inserten
+                (p. ej. {"tipo_dato": "Dato Biométrico"}).
+
+        Returns:
+            List[Optional[int]]: Clave de cada valor, o None si no existe y no se pudo insertar.
+        """
+        valores = list(valores)
+        desconocidos = list(dict.fromkeys(valor for valor in valores if valor not in self._ids))
+
+        if desconocidos:
+            self.recargar()
+            faltantes = [valor for valor in desconocidos if valor not in self._ids]
+            if faltantes and self.auto_insertar:
+                self._insertar_faltantes([(valor, atributos or {}) for valor in faltantes])
+            for valor in faltantes:
+                if valor not in self._ids:
+                    logger.warning(f"No se encontró ID en {self.tabla} para: {valor}")
+
+        resultado = []
+        for valor in valores:
+            id_valor = self._ids.get(valor)
+            if id_valor is None:
+                self.fallos += 1
+            else:
+                self.aciertos += 1
+            resultado.append(id_valor)
+        return resultado
+
+    def obtener(self, valor: Any, atributos: Optional[Dict[str, Any]] = None) -> Optional[int]:
+        """
+        Resuelve la clave de un valor.
+
+        Args:
+            valor: Valor descriptivo a resolver.
+            atributos: Valores de las demás columnas si el registro se inserta.
+
+        Returns:
+            Optional[int]: Clave del valor, o None si no existe y no se pudo insertar.
+        """
+        return self.obtener_varios([valor], atributos)[0]
+
+    def registrar_estadisticas(self) -> None:
+        """
+        Registra en el log los aciertos, fallos, recargas e inserciones de la caché.
+        """
+        logger.info(f"Caché de {self.tabla}: {self.aciertos} aciertos, {self.fallos} fallos, "
+                    f"{self.recargas} cargas, {self.insertados} valores insertados")
+
+
+# Una caché por conexión y tabla de dimensión
+_caches_dimensiones: Dict[Tuple[int, str], CacheDimension] = {}
+
+
+def obtener_cache_dimension(db_dw, tabla: str, columna_valor: str, columna_id: str,
+                            auto_insertar: bool = False) -> CacheDimension:
+    """
+    Devuelve la caché de una dimensión asociada a una conexión, creándola la primera vez.
+
+    Args:
+        db_dw: Conexión al Data Warehouse.
+        tabla: Nombre de la tabla de dimensión.
+        columna_valor: Columna con el valor descriptivo que se busca.
+        columna_id: Columna con la clave subrogada.
+        auto_insertar: Si es True, los valores desconocidos se insertan en la dimensión.
+
+    Returns:
+        CacheDimension: Caché de la dimensión para la conexión.
+    """
+    clave = (id(db_dw), tabla)
+    cache = _caches_dimensiones.get(clave)
+    if cache is None or cache.db_dw is not db_dw:
+        cache = CacheDimension(db_dw, tabla, columna_valor, columna_id, auto_insertar=auto_insertar)
+        _caches_dimensiones[clave] = cache
+    cache.auto_insertar = auto_insertar
+    return cache
@@ -0,0 +1,83 @@
+"""
+Módulo para la carga por lotes de filas en tablas de Supabase (PostgREST).
+
+Las filas se envían en lotes de tamaño configurable mediante upsert, de modo que volver a
+ejecutar una carga es idempotente. Los errores transitorios (red, conexiones agotadas,
+bloqueos) se reintentan con espera exponencial y, si se agotan los reintentos, se propagan.
+Si un lote falla por un error de datos, se divide en mitades y se reintenta cada mitad hasta
+aislar las filas que provocan el error, que se registran y se descartan sin perder el resto
+del lote.
+"""
+
+import time
+from typing import Any, Dict, Iterable, List, Tuple
+from pulseras_inteligentes.utils.etl_funcs import logger
+from pulseras_inteligentes.utils.extraccion_paginada import agrupar_en_lotes
+from pulseras_inteligentes.utils.reintentos import ejecutar_con_reintentos, enviar_con_biseccion
+
+# Número de filas por petición por defecto
+TAMANO_LOTE_CARGA_DEFECTO = 500
+
+
+def _enviar_con_biseccion(db, tabla: str, filas: List[Dict[str, Any]], on_conflict: str,
+                          ignorar_duplicados: bool) -> Tuple[int, int]:
+    """
+    Envía un lote con reintentos y, ante un error de datos, lo divide en mitades hasta aislar las filas con error.
+
+    Returns:
+        Tuple[int, int]: Filas cargadas y filas descartadas.
+
+    Raises:
+        Exception: El error transitorio si se agotan los reintentos.
+    """
+    descartadas = []
+
+    def upsert(lote: List[Dict[str, Any]]) -> None:
+        db.table(tabla).upsert(lote, on_conflict=on_conflict, ignore_duplicates=ignorar_duplicados).execute()
+
+    def enviar(lote: List[Dict[str, Any]]) -> None:
+        ejecutar_con_reintentos(lambda: upsert(lote), f"la carga en {tabla}")
+
+    def descartar(fila: Dict[str, Any], error: Exception) -> None:
+        descartadas.append(fila)
+        logger.error(f"Fila descartada en {tabla} ({on_conflict}={fila.get(on_conflict)}): {error}")
+
+    cargadas = enviar_con_biseccion(enviar, filas, tabla, descartar)
+    return cargadas, len(descartadas)
+
+
+def cargar_por_lotes(db, tabla: str, filas: Iterable[Dict[str, Any]], on_conflict: str,
+                     tamano_lote: int = TAMANO_LOTE_CARGA_DEFECTO,
+                     ignorar_duplicados: bool = False) -> Tuple[int, int]:
+    """
+    Carga filas en una tabla mediante upserts por lotes, aislando las filas con error.
+
+    Args:
+        db: Cliente de Supabase.
+        tabla: Nombre de la tabla de destino.
+        filas: Iterable de filas a cargar (puede ser un flujo).
+        on_conflict: Columnas de la restricción única usada para el upsert.
+        tamano_lote: Número de filas por petición.
+        ignorar_duplicados: Si es True, las filas existentes no se actualizan.
+
+    Returns:
+        Tuple[int, int]: Filas cargadas y filas descartadas por error.
+
+    Raises:
+        Exception: Un error transitorio que persiste tras agotar los reintentos.
+    """
+    total_cargadas = 0
+    total_descartadas = 0
+    inicio = time.perf_counter()
+
+    for lote in agrupar_en_lotes(filas, tamano_lote):
+        cargadas, descartadas = _enviar_con_biseccion(db, tabla, lote, on_conflict, ignorar_duplicados)
+        total_cargadas += cargadas
+        total_descartadas += descartadas
+        logger.debug(f"Carga en {tabla}: {total_cargadas} filas cargadas hasta ahora")
+
+    duracion = time.perf_counter() - inicio
+    filas_por_segundo = total_cargadas / duracion if duracion > 0 else 0
+    logger.info(f"Carga en {tabla}: {total_cargadas} filas cargadas, {total_descartadas} descartadas "
+                f"en {duracion:.2f}s ({filas_por_segundo:.0f} filas/s)")
+    return total_cargadas, total_descartadas
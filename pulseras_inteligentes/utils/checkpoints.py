@@ -0,0 +1,103 @@
+"""
+Módulo para los checkpoints (marcas de agua) de las cargas de hechos en el Data Warehouse.
+
+La marca de agua derivada de log_eventos indica cuándo se cargó el último hecho (no el
+momento del evento de origen) y se trunca a la medianoche, por lo que cada ejecución vuelve a
+leer un día completo de datos. La tabla etl_checkpoints guarda, por proceso, la marca exacta
+del último registro de origen cargado:
+
+- ultima_marca_tiempo: timestamp de origen del último registro (p. ej. en MongoDB).
+- ultimo_id: clave numérica del último registro (p. ej. id_pago).
+- ultima_clave: clave de desempate entre registros con el mismo timestamp (p. ej. el _id de MongoDB).
+
+El avance se hace con la función avanzar_checkpoint_etl (creacion_dw.sql), un upsert que solo
+reemplaza la marca guardada si la nueva es mayor, en una única sentencia.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Optional, Union
+from pulseras_inteligentes.utils.etl_funcs import extraer_ultima_fecha_insercion_hechos, logger
+
+TABLA_CHECKPOINTS = "etl_checkpoints"
+FUNCION_AVANZAR_CHECKPOINT = "avanzar_checkpoint_etl"
+
+
+def leer_checkpoint(db_dw, proceso: str) -> Optional[Dict[str, Any]]:
+    """
+    Obtiene el checkpoint guardado de un proceso.
+
+    Args:
+        db_dw: Conexión al Data Warehouse.
+        proceso: Nombre del proceso de carga.
+
+    Returns:
+        Optional[Dict[str, Any]]: Fila de etl_checkpoints, o None si el proceso no tiene checkpoint.
+    """
+    respuesta = (
+        db_dw.table(TABLA_CHECKPOINTS)
+        .select("proceso, ultima_marca_tiempo, ultimo_id, ultima_clave")
+        .eq("proceso", proceso)
+        .limit(1)
+        .execute()
+    )
+    if not respuesta.data:
+        return None
+
+    checkpoint = respuesta.data[0]
+    logger.info(f"Checkpoint de {proceso}: marca de tiempo {checkpoint['ultima_marca_tiempo']}, "
+                f"id {checkpoint['ultimo_id']}, clave {checkpoint['ultima_clave']}")
+    return checkpoint
+
+
+def leer_checkpoint_o_legado(db_dw, proceso: str, tabla_hechos: str) -> Dict[str, Any]:
+    """
+    Obtiene el checkpoint de un proceso o, si todavía no tiene, lo inicializa desde la marca
+    de agua anterior basada en log_eventos.
+
+    Args:
+        db_dw: Conexión al Data Warehouse.
+        proceso: Nombre del proceso de carga.
+        tabla_hechos: Tabla de hechos usada para la marca de agua anterior.
+
+    Returns:
+        Dict[str, Any]: Checkpoint con ultima_marca_tiempo, ultimo_id, ultima_clave y
+        'legado' (True si proviene de log_eventos).
+    """
+    checkpoint = leer_checkpoint(db_dw, proceso)
+    if checkpoint is not None:
+        return {**checkpoint, "legado": False}
+
+    ultima_fecha = extraer_ultima_fecha_insercion_hechos(db_dw, tabla_hechos) or "2000-01-01T00:00:00"
+    logger.info(f"{proceso} no tiene checkpoint; se inicia desde la marca de log_eventos: {ultima_fecha}")
+    return {
+        "proceso": proceso,
+        "ultima_marca_tiempo": ultima_fecha,
+        "ultimo_id": None,
+        "ultima_clave": None,
+        "legado": True,
+    }
+
+
+def avanzar_checkpoint(db_dw, proceso: str, ultima_marca_tiempo: Optional[Union[str, datetime]] = None,
+                       ultimo_id: Optional[int] = None, ultima_clave: Optional[Any] = None) -> None:
+    """
+    Avanza el checkpoint de un proceso si la nueva marca es mayor que la guardada.
+
+    Args:
+        db_dw: Conexión al Data Warehouse.
+        proceso: Nombre del proceso de carga.
+        ultima_marca_tiempo: Timestamp de origen del último registro cargado.
+        ultimo_id: Clave numérica del último registro cargado.
+        ultima_clave: Clave de desempate del último registro cargado (se guarda como texto).
+    """
+    if isinstance(ultima_marca_tiempo, datetime):
+        ultima_marca_tiempo = ultima_marca_tiempo.isoformat()
+
+    db_dw.rpc(FUNCION_AVANZAR_CHECKPOINT, {
+        "p_proceso": proceso,
+        "p_ultima_marca_tiempo": ultima_marca_tiempo,
+        "p_ultimo_id": ultimo_id,
+        "p_ultima_clave": str(ultima_clave) if ultima_clave is not None else None,
+    }).execute()
+    logger.debug(f"Checkpoint de {proceso} avanzado a marca de tiempo {ultima_marca_tiempo}, "
+                 f"id {ultimo_id}, clave {ultima_clave}")
@@ -0,0 +1,413 @@
+"""
+Módulo con un cliente asíncrono para escribir en el Data Warehouse (Supabase/PostgREST).
+
+El cliente de Supabase es síncrono, así que cada petición espera la respuesta de la anterior.
+Este cliente llama directamente a la API REST de PostgREST con un httpx.AsyncClient. Las
+conexiones se mantienen abiertas en un pool (HTTP/2 si el servidor lo admite). Un semáforo
+limita cuántas peticiones hay en curso, de modo que muchos lotes se envían a la vez sin
+saturar el servidor. Los errores transitorios y los de datos se tratan con la misma política
+que EscritorHechos (reintentos.py): los primeros se reintentan con espera exponencial y los
+segundos se aíslan dividiendo el lote.
+
+EscritorHechosAsync ofrece la interfaz de EscritorHechos sobre este cliente, para que una carga
+de hechos síncrona envíe sus lotes de forma concurrente.
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import httpx
+from pulseras_inteligentes.utils.conexiones_db import DW_API_KEY, DW_URL
+from pulseras_inteligentes.utils.etl_funcs import logger
+from pulseras_inteligentes.utils.escritor_hechos import (
+    EscritorHechos, MAX_BYTES_LOTE_HECHOS_DEFECTO, TAMANO_LOTE_HECHOS_DEFECTO
+)
+from pulseras_inteligentes.utils.reintentos import (
+    ESPERA_INICIAL_DEFECTO, MAX_REINTENTOS_DEFECTO, ejecutar_con_reintentos_async, enviar_con_biseccion_async
+)
+from pulseras_inteligentes.utils.extraccion_paginada import agrupar_en_lotes
+
+# Peticiones en curso a la vez y conexiones del pool
+MAX_CONCURRENCIA_DEFECTO = 16
+MAX_CONEXIONES_DEFECTO = 16
+SEGUNDOS_KEEPALIVE = 30.0
+TIMEOUT_DEFECTO = 30.0
+
+# Prefijo de la API REST de Supabase
+RUTA_REST = "/rest/v1"
+
+
+class ErrorDW(Exception):
+    """
+    Error devuelto por PostgREST, con el código de PostgREST/PostgreSQL en el atributo code
+    (el mismo que expone el cliente de Supabase).
+    """
+
+    def __init__(self, estado: int, code: Optional[str], mensaje: str, detalles: Optional[str] = None):
+        super().__init__(f"{estado} {code}: {mensaje}" + (f" ({detalles})" if detalles else ""))
+        self.estado = estado
+        self.code = code
+        self.mensaje = mensaje
+        self.detalles = detalles
+
+
+def _error_desde_respuesta(respuesta: httpx.Response) -> ErrorDW:
+    """
+    Construye un ErrorDW a partir de una respuesta de error de PostgREST.
+    """
+    try:
+        cuerpo = respuesta.json()
+    except ValueError:
+        cuerpo = None
+    if not isinstance(cuerpo, dict):
+        return ErrorDW(respuesta.status_code, None, respuesta.text or respuesta.reason_phrase)
+    return ErrorDW(respuesta.status_code, cuerpo.get("code"), cuerpo.get("message", ""), cuerpo.get("details"))
+
+
+class ClienteDWAsync:
+    """
+    Cliente asíncrono de PostgREST con pool de conexiones y límite de peticiones concurrentes.
+
+    Ejemplo:
+        async with crear_cliente_dw_async() as cliente:
+            await cliente.insertar_lotes("hechos_actividad", hechos)
+            await cliente.rpc("avanzar_checkpoint_etl", parametros)
+    """
+
+    def __init__(self, url: str, api_key: str, max_concurrencia: int = MAX_CONCURRENCIA_DEFECTO,
+                 max_conexiones: int = MAX_CONEXIONES_DEFECTO, http2: bool = True,
+                 timeout: float = TIMEOUT_DEFECTO, max_reintentos: int = MAX_REINTENTOS_DEFECTO,
+                 espera_inicial: float = ESPERA_INICIAL_DEFECTO,
+                 transporte: Optional[httpx.AsyncBaseTransport] = None):
+        """
+        Args:
+            url: URL del proyecto de Supabase del Data Warehouse.
+            api_key: Clave de la API.
+            max_concurrencia: Número máximo de peticiones en curso a la vez.
+            max_conexiones: Número máximo de conexiones abiertas en el pool.
+            http2: Si es True, se negocia HTTP/2 (varias peticiones por conexión).
+            timeout: Segundos máximos de cada petición.
+            max_reintentos: Reintentos de una petición ante errores transitorios.
+            espera_inicial: Espera antes del primer reintento; se duplica en cada intento.
+            transporte: Transporte httpx alternativo (p. ej. httpx.MockTransport para pruebas).
+        """
+        if max_concurrencia < 1:
+            raise ValueError("La concurrencia máxima debe ser mayor o igual a 1")
+
+        self.max_concurrencia = max_concurrencia
+        self.max_reintentos = max_reintentos
+        self.espera_inicial = espera_inicial
+        self._semaforo = asyncio.Semaphore(max_concurrencia)
+        self._cliente = httpx.AsyncClient(
+            base_url=url.rstrip("/") + RUTA_REST,
+            headers={"apikey": api_key, "Authorization": f"Bearer {api_key}"},
+            http2=http2,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_conexiones, max_keepalive_connections=max_conexiones,
+                                keepalive_expiry=SEGUNDOS_KEEPALIVE),
+            transport=transporte
+        )
+
+        # Filas rechazadas por errores de datos, con el error que las descartó
+        self.cuarentena: List[Dict[str, Any]] = []
+
+        # Métricas acumuladas
+        self.total_insertados = 0
+        self.total_peticiones = 0
+        self.total_reintentos = 0
+        self.segundos_peticiones = 0.0
+        self.max_en_curso = 0
+        self._en_curso = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, tipo_excepcion, excepcion, traza):
+        await self.cerrar()
+        return False
+
+    async def _peticion(self, metodo: str, ruta: str, cuerpo: Any = None, params: Optional[Dict[str, str]] = None,
+                        prefer: Optional[str] = None) -> httpx.Response:
+        """
+        Envía una petición respetando el límite de concurrencia y reintenta los errores transitorios.
+
+        La espera entre reintentos se hace fuera del semáforo para no ocupar un lugar sin enviar nada.
+
+        Raises:
+            ErrorDW: Si PostgREST responde con un error de datos o se agotan los reintentos.
+            httpx.TransportError: Si falla la red y se agotan los reintentos.
+        """
+        cabeceras = {"Prefer": prefer} if prefer else None
+
+        async def enviar() -> httpx.Response:
+            async with self._semaforo:
+                self._en_curso += 1
+                self.max_en_curso = max(self.max_en_curso, self._en_curso)
+                self.total_peticiones += 1
+                inicio = time.perf_counter()
+                try:
+                    respuesta = await self._cliente.request(metodo, ruta, json=cuerpo, params=params,
+                                                            headers=cabeceras)
+                finally:
+                    self.segundos_peticiones += time.perf_counter() - inicio
+                    self._en_curso -= 1
+            if respuesta.status_code >= 400:
+                raise _error_desde_respuesta(respuesta)
+            return respuesta
+
+        def contar_reintento():
+            self.total_reintentos += 1
+
+        return await ejecutar_con_reintentos_async(enviar, f"{metodo} {ruta}", max_reintentos=self.max_reintentos,
+                                                   espera_inicial=self.espera_inicial,
+                                                   al_reintentar=contar_reintento)
+
+    async def insertar(self, tabla: str, filas: List[Dict[str, Any]]) -> None:
+        """
+        Inserta filas en una tabla en una única petición.
+
+        Args:
+            tabla: Tabla de destino.
+            filas: Filas a insertar.
+        """
+        await self._peticion("POST", f"/{tabla}", cuerpo=filas, prefer="return=minimal")
+
+    async def upsert(self, tabla: str, filas: List[Dict[str, Any]], on_conflict: str,
+                     ignorar_duplicados: bool = False) -> None:
+        """
+        Inserta o actualiza filas en una tabla en una única petición.
+
+        Args:
+            tabla: Tabla de destino.
+            filas: Filas a cargar.
+            on_conflict: Columnas de la restricción única usada para el upsert.
+            ignorar_duplicados: Si es True, las filas existentes no se actualizan.
+        """
+        resolucion = "ignore-duplicates" if ignorar_duplicados else "merge-duplicates"
+        await self._peticion("POST", f"/{tabla}", cuerpo=filas, params={"on_conflict": on_conflict},
+                             prefer=f"resolution={resolucion},return=minimal")
+
+    async def rpc(self, funcion: str, parametros: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        Ejecuta una función de la base de datos.
+
+        Args:
+            funcion: Nombre de la función.
+            parametros: Argumentos de la función por nombre.
+
+        Returns:
+            Any: Resultado de la función, o None si no devuelve nada.
+        """
+        respuesta = await self._peticion("POST", f"/rpc/{funcion}", cuerpo=parametros or {})
+        return respuesta.json() if respuesta.content else None
+
+    async def _insertar_con_biseccion(self, tabla: str, lote: List[Dict[str, Any]]) -> int:
+        """
+        Inserta un lote y, ante un error de datos, envía sus mitades en paralelo hasta aislar las filas con error.
+
+        Returns:
+            int: Número de filas insertadas.
+        """
+        def poner_en_cuarentena(fila: Dict[str, Any], error: Exception) -> None:
+            self.cuarentena.append({"fila": fila, "error": str(error)})
+            logger.error(f"Fila en cuarentena en {tabla}: {fila} ({error})")
+
+        insertados = await enviar_con_biseccion_async(lambda parte: self.insertar(tabla, parte), lote, tabla,
+                                                      poner_en_cuarentena)
+        self.total_insertados += insertados
+        return insertados
+
+    async def insertar_lotes(self, tabla: str, filas: Iterable[Dict[str, Any]],
+                             tamano_lote: int = TAMANO_LOTE_HECHOS_DEFECTO, trabajadores: Optional[int] = None) -> int:
+        """
+        Inserta filas en lotes enviados en paralelo por un número fijo de tareas.
+
+        Los lotes pasan por una cola acotada: las filas se leen a medida que las tareas quedan
+        libres, de modo que en memoria hay a lo sumo unos 2 * trabajadores lotes aunque 'filas'
+        sea un flujo grande. Si un lote falla con un error transitorio tras agotar sus reintentos,
+        no se envían más lotes y el error se propaga cuando terminan los que estaban en curso.
+
+        Args:
+            tabla: Tabla de destino.
+            filas: Filas a insertar (puede ser un flujo).
+            tamano_lote: Número de filas por petición.
+            trabajadores: Tareas que envían lotes a la vez. Si es None se usa max_concurrencia.
+
+        Returns:
+            int: Número de filas insertadas (las rechazadas quedan en cuarentena).
+
+        Raises:
+            Exception: El primer error que no se resolvió con reintentos ni dividiendo el lote.
+        """
+        trabajadores = trabajadores or self.max_concurrencia
+        cola: asyncio.Queue = asyncio.Queue(maxsize=trabajadores)
+        errores: List[Exception] = []
+        insertados = 0
+        lotes = 0
+
+        async def trabajador() -> None:
+            nonlocal insertados
+            while True:
+                lote = await cola.get()
+                if lote is None:
+                    return
+                if errores:
+                    # Tras un error solo se vacía la cola para que el productor no quede bloqueado
+                    continue
+                try:
+                    insertados_lote = await self._insertar_con_biseccion(tabla, lote)
+                except Exception as e:
+                    errores.append(e)
+                else:
+                    insertados += insertados_lote
+
+        inicio = time.perf_counter()
+        tareas = [asyncio.create_task(trabajador()) for _ in range(trabajadores)]
+        try:
+            for lote in agrupar_en_lotes(filas, tamano_lote):
+                if errores:
+                    break
+                await cola.put(lote)
+                lotes += 1
+        finally:
+            for _ in tareas:
+                await cola.put(None)
+            await asyncio.gather(*tareas)
+
+        if errores:
+            raise errores[0]
+        duracion = time.perf_counter() - inicio
+        filas_por_segundo = insertados / duracion if duracion > 0 else 0
+        logger.debug(f"Inserción asíncrona en {tabla}: {insertados} filas en {lotes} lotes "
+                     f"en {duracion:.2f}s ({filas_por_segundo:.0f} filas/s)")
+        return insertados
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """
+        Devuelve las métricas acumuladas del cliente.
+
+        Returns:
+            Dict[str, Any]: Filas insertadas, peticiones, reintentos, filas en cuarentena,
+            máximo de peticiones en curso y segundos acumulados de peticiones.
+        """
+        return {
+            "filas": self.total_insertados,
+            "peticiones": self.total_peticiones,
+            "reintentos": self.total_reintentos,
+            "cuarentena": len(self.cuarentena),
+            "max_en_curso": self.max_en_curso,
+            "segundos": self.segundos_peticiones,
+        }
+
+    def registrar_estadisticas(self) -> None:
+        """
+        Registra en el log las métricas acumuladas del cliente.
+        """
+        logger.info(f"Cliente asíncrono del DW: {self.total_insertados} filas en {self.total_peticiones} "
+                    f"peticiones ({self.total_reintentos} reintentos), {len(self.cuarentena)} filas en cuarentena, "
+                    f"hasta {self.max_en_curso} de {self.max_concurrencia} peticiones en curso")
+
+    async def cerrar(self) -> None:
+        """
+        Cierra las conexiones del pool y registra las métricas.
+        """
+        await self._cliente.aclose()
+        self.registrar_estadisticas()
+
+
+def crear_cliente_dw_async(**opciones) -> ClienteDWAsync:
+    """
+    Crea un cliente asíncrono para el Data Warehouse con las credenciales de conexiones_db.
+
+    Args:
+        **opciones: Argumentos de ClienteDWAsync (max_concurrencia, max_conexiones, http2, ...).
+
+    Returns:
+        ClienteDWAsync: Cliente del Data Warehouse.
+    """
+    return ClienteDWAsync(DW_URL, DW_API_KEY, **opciones)
+
+
+def insertar_lotes_concurrentes(tabla: str, filas: Iterable[Dict[str, Any]],
+                                tamano_lote: int = TAMANO_LOTE_HECHOS_DEFECTO, **opciones) -> int:
+    """
+    Inserta filas en el Data Warehouse con el cliente asíncrono, desde código síncrono.
+
+    Args:
+        tabla: Tabla de destino.
+        filas: Filas a insertar.
+        tamano_lote: Número de filas por petición.
+        **opciones: Argumentos de ClienteDWAsync.
+
+    Returns:
+        int: Número de filas insertadas.
+    """
+    async def insertar():
+        async with crear_cliente_dw_async(**opciones) as cliente:
+            return await cliente.insertar_lotes(tabla, filas, tamano_lote)
+
+    return asyncio.run(insertar())
+
+
+class EscritorHechosAsync(EscritorHechos):
+    """
+    Escritor con la interfaz de EscritorHechos que envía sus lotes con el cliente asíncrono.
+
+    El buffer reúne hasta max_concurrencia lotes de tamano_lote filas y cada envío los inserta
+    a la vez por el pool de conexiones. Las marcas se confirman, como en EscritorHechos, después
+    de cada envío completo. Cada escritor tiene su propio bucle de eventos, así que puede usarse
+    desde código síncrono y desde un hilo distinto por escritor.
+
+    Ejemplo:
+        with EscritorHechosAsync("hechos_actividad", al_confirmar=avanzar) as escritor:
+            escritor.agregar_varios(hechos)
+            escritor.marcar(proceso, posicion)
+    """
+
+    def __init__(self, tabla: str, tamano_lote: int = TAMANO_LOTE_HECHOS_DEFECTO,
+                 max_concurrencia: int = MAX_CONCURRENCIA_DEFECTO,
+                 al_confirmar: Optional[Callable[[str, Any], None]] = None,
+                 cliente: Optional[ClienteDWAsync] = None, **opciones):
+        """
+        Args:
+            tabla: Tabla de hechos de destino.
+            tamano_lote: Número máximo de filas por petición.
+            max_concurrencia: Peticiones en curso a la vez (y lotes por envío del buffer).
+            al_confirmar: Función opcional que recibe cada marca (clave, valor) cuyas filas ya se escribieron.
+            cliente: Cliente asíncrono a usar (por defecto se crea uno con crear_cliente_dw_async).
+            **opciones: Argumentos de ClienteDWAsync si se crea el cliente.
+        """
+        super().__init__(None, tabla, tamano_lote=tamano_lote * max_concurrencia,
+                         max_bytes_lote=MAX_BYTES_LOTE_HECHOS_DEFECTO * max_concurrencia, al_confirmar=al_confirmar)
+        self.tamano_lote_peticion = tamano_lote
+        self._bucle = asyncio.new_event_loop()
+        self.cliente = cliente or crear_cliente_dw_async(max_concurrencia=max_concurrencia, **opciones)
+        # Las filas rechazadas por el cliente son la cuarentena del escritor
+        self.cuarentena = self.cliente.cuarentena
+
+    def _enviar_con_biseccion(self, lote: List[Dict[str, Any]]) -> int:
+        """
+        Envía el buffer en lotes concurrentes; las filas con error de datos quedan en cuarentena.
+
+        Returns:
+            int: Número de filas insertadas.
+        """
+        try:
+            return self._bucle.run_until_complete(
+                self.cliente.insertar_lotes(self.tabla, lote, self.tamano_lote_peticion)
+            )
+        finally:
+            self.total_peticiones = self.cliente.total_peticiones
+            self.total_reintentos = self.cliente.total_reintentos
+
+    def cerrar(self) -> None:
+        """
+        Envía las filas pendientes, registra el resumen y cierra el cliente y el bucle de eventos.
+        """
+        if self._bucle.is_closed():
+            return
+        try:
+            super().cerrar()
+        finally:
+            self._bucle.run_until_complete(self.cliente.cerrar())
+            self._bucle.close()
@@ -53,7 +53,7 @@ def conectar_db_transacciones() -> Any:
     """
     try:
         supabase_client = supabase.create_client(DB_OPERACIONAL_URL, DB_OPERACIONAL_API_KEY)
-        supabase_client.table('usuarios').select('*').execute()
+        supabase_client.table('usuarios').select('id_usuario').limit(1).execute()
         logger.info("Conexión con DB de transacciones establecida correctamente.")
         return supabase_client
     except Exception as e:
@@ -72,7 +72,7 @@ def conectar_DW() -> Any:
     """
     try:
         supabase_client = supabase.create_client(DW_URL, DW_API_KEY)
-        supabase_client.table('hechos_pagos').select('*').execute()
+        supabase_client.table('hechos_pagos').select('id_hecho').limit(1).execute()
         logger.info("Conexión con el DW establecida correctamente.")
         return supabase_client
     except Exception as e:
@@ -0,0 +1,252 @@
+"""
+Módulo para la escritura por lotes de hechos en el Data Warehouse (Supabase/PostgREST).
+
+Las cargas de hechos enviaban una petición insert por fila. Este módulo proporciona un
+escritor con buffer que acumula filas y las envía en lotes cuando se alcanza un número
+de filas, un tamaño en bytes o un tiempo máximo de espera. Los errores transitorios
+(red, conexiones agotadas, bloqueos) se reintentan con espera exponencial; los errores
+de datos se aíslan dividiendo el lote en mitades hasta dejar en cuarentena solo las
+filas rechazadas (ver reintentos.py).
+"""
+
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional
+from pulseras_inteligentes.utils.etl_funcs import logger
+from pulseras_inteligentes.utils.reintentos import (
+    ESPERA_INICIAL_DEFECTO, MAX_REINTENTOS_DEFECTO, ejecutar_con_reintentos, enviar_con_biseccion
+)
+
+# Valores por defecto de los límites del buffer
+TAMANO_LOTE_HECHOS_DEFECTO = 500
+MAX_BYTES_LOTE_HECHOS_DEFECTO = 1024 * 1024  # 1 MB de JSON por petición
+MAX_SEGUNDOS_BUFFER_DEFECTO = 5.0
+
+
+class EscritorHechos:
+    """
+    Escritor con buffer que inserta filas de hechos en una tabla del Data Warehouse por lotes.
+
+    Las filas se acumulan con agregar() y se envían cuando el buffer alcanza el número de
+    filas, el tamaño en bytes o la antigüedad configurados. Al cerrar se registran las
+    filas, peticiones, reintentos, filas en cuarentena y segundos de escritura de la tabla.
+
+    Con marcar() el proceso declara hasta qué registro de origen ya agregó sus filas; tras cada
+    envío exitoso esas marcas se entregan a al_confirmar (p. ej. para avanzar un checkpoint).
+
+    Ejemplo:
+        with EscritorHechos(db_dw, "hechos_pagos") as escritor:
+            for hecho in hechos:
+                escritor.agregar(hecho)
+    """
+
+    def __init__(self, db_dw, tabla: str, tamano_lote: int = TAMANO_LOTE_HECHOS_DEFECTO,
+                 max_bytes_lote: int = MAX_BYTES_LOTE_HECHOS_DEFECTO,
+                 max_segundos_buffer: float = MAX_SEGUNDOS_BUFFER_DEFECTO,
+                 max_reintentos: int = MAX_REINTENTOS_DEFECTO,
+                 espera_inicial: float = ESPERA_INICIAL_DEFECTO,
+                 al_confirmar: Optional[Callable[[str, Any], None]] = None,
+                 on_conflict: Optional[str] = None):
+        """
+        Args:
+            db_dw: Conexión al Data Warehouse.
+            tabla: Tabla de hechos de destino.
+            tamano_lote: Número máximo de filas por petición.
+            max_bytes_lote: Tamaño máximo aproximado (JSON) de una petición en bytes.
+            max_segundos_buffer: Antigüedad máxima de la fila más vieja del buffer antes de enviarlo.
+            max_reintentos: Reintentos de una petición ante errores transitorios.
+            espera_inicial: Espera antes del primer reintento; se duplica en cada intento.
+            al_confirmar: Función opcional que recibe cada marca (clave, valor) cuyas filas ya se escribieron.
+            on_conflict: Columnas de una restricción única; si se indica, las filas que ya existen
+                se ignoran en lugar de rechazarse (inserción idempotente).
+        """
+        if tamano_lote < 1:
+            raise ValueError("El tamaño de lote debe ser mayor o igual a 1")
+
+        self.db_dw = db_dw
+        self.tabla = tabla
+        self.tamano_lote = tamano_lote
+        self.max_bytes_lote = max_bytes_lote
+        self.max_segundos_buffer = max_segundos_buffer
+        self.max_reintentos = max_reintentos
+        self.espera_inicial = espera_inicial
+        self.al_confirmar = al_confirmar
+        self.on_conflict = on_conflict
+
+        # Última marca declarada por clave, pendiente de confirmar con el próximo envío
+        self._marcas_pendientes: Dict[str, Any] = {}
+
+        self._buffer: List[Dict[str, Any]] = []
+        self._bytes_buffer = 0
+        self._inicio_buffer: Optional[float] = None
+
+        # Filas rechazadas por errores de datos, con el error que las descartó
+        self.cuarentena: List[Dict[str, Any]] = []
+
+        # Métricas acumuladas
+        self.total_insertados = 0
+        self.total_peticiones = 0
+        self.total_reintentos = 0
+        self.total_lotes = 0
+        self.segundos_escritura = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo_excepcion, excepcion, traza):
+        # Si hubo un error no se descarta lo acumulado, pero sí se propaga el error
+        self.cerrar()
+        return False
+
+    def agregar(self, fila: Optional[Dict[str, Any]]) -> None:
+        """
+        Agrega una fila al buffer y envía el lote si se alcanza algún límite.
+
+        Args:
+            fila: Fila a insertar. Los valores None se ignoran.
+        """
+        if fila is None:
+            return
+
+        tamano = len(json.dumps(fila, default=str))
+
+        # Si la fila no entra en el lote actual por bytes, enviamos primero lo acumulado
+        if self._buffer and self._bytes_buffer + tamano > self.max_bytes_lote:
+            self.flush()
+
+        if not self._buffer:
+            self._inicio_buffer = time.monotonic()
+        self._buffer.append(fila)
+        self._bytes_buffer += tamano
+
+        if (len(self._buffer) >= self.tamano_lote
+                or time.monotonic() - self._inicio_buffer >= self.max_segundos_buffer):
+            self.flush()
+
+    def agregar_varios(self, filas) -> None:
+        """
+        Agrega varias filas al buffer.
+
+        Args:
+            filas: Iterable de filas a insertar.
+        """
+        for fila in filas:
+            self.agregar(fila)
+
+    def marcar(self, clave: str, valor: Any) -> None:
+        """
+        Declara que todas las filas derivadas de los registros de origen hasta 'valor' ya se agregaron.
+
+        La marca se confirma con al_confirmar después del siguiente envío exitoso, que incluye
+        todas las filas agregadas hasta ese momento.
+
+        Args:
+            clave: Identificador de la marca (p. ej. el nombre del proceso).
+            valor: Posición del último registro de origen procesado.
+        """
+        self._marcas_pendientes[clave] = valor
+
+    def _confirmar_marcas(self) -> None:
+        """
+        Entrega a al_confirmar las marcas pendientes.
+        """
+        marcas = self._marcas_pendientes
+        self._marcas_pendientes = {}
+        if self.al_confirmar is not None:
+            for clave, valor in marcas.items():
+                self.al_confirmar(clave, valor)
+
+    def _enviar_lote(self, lote: List[Dict[str, Any]]) -> None:
+        """
+        Envía un lote en una única petición.
+        """
+        self.total_peticiones += 1
+        if self.on_conflict is not None:
+            self.db_dw.table(self.tabla).upsert(lote, on_conflict=self.on_conflict, ignore_duplicates=True).execute()
+        else:
+            self.db_dw.table(self.tabla).insert(lote).execute()
+
+    def _enviar_con_reintentos(self, lote: List[Dict[str, Any]]) -> None:
+        """
+        Envía un lote, reintentando con espera exponencial ante errores transitorios.
+
+        Raises:
+            Exception: El error de datos, o el transitorio si se agotan los reintentos.
+        """
+        def contar_reintento():
+            self.total_reintentos += 1
+
+        ejecutar_con_reintentos(lambda: self._enviar_lote(lote), f"la escritura en {self.tabla}",
+                                max_reintentos=self.max_reintentos, espera_inicial=self.espera_inicial,
+                                al_reintentar=contar_reintento)
+
+    def _poner_en_cuarentena(self, fila: Dict[str, Any], error: Exception) -> None:
+        """
+        Guarda una fila rechazada por un error de datos junto con el error.
+        """
+        self.cuarentena.append({"fila": fila, "error": str(error)})
+        logger.error(f"Fila en cuarentena en {self.tabla}: {fila} ({error})")
+
+    def _enviar_con_biseccion(self, lote: List[Dict[str, Any]]) -> int:
+        """
+        Envía un lote y, ante un error de datos, lo divide en mitades hasta aislar las filas con error.
+
+        Returns:
+            int: Número de filas insertadas.
+        """
+        return enviar_con_biseccion(self._enviar_con_reintentos, lote, self.tabla, self._poner_en_cuarentena)
+
+    def flush(self) -> int:
+        """
+        Envía al Data Warehouse las filas acumuladas en el buffer.
+
+        Returns:
+            int: Número de filas insertadas en este lote.
+        """
+        if not self._buffer:
+            self._confirmar_marcas()
+            return 0
+
+        lote = self._buffer
+        self._buffer = []
+        self._bytes_buffer = 0
+        self._inicio_buffer = None
+
+        inicio = time.perf_counter()
+        insertados = self._enviar_con_biseccion(lote)
+        latencia = time.perf_counter() - inicio
+
+        self.total_lotes += 1
+        self.total_insertados += insertados
+        self.segundos_escritura += latencia
+        self._confirmar_marcas()
+
+        logger.debug(f"Lote {self.total_lotes} en {self.tabla}: {insertados} de {len(lote)} filas, "
+                     f"latencia {latencia * 1000:.1f} ms")
+        return insertados
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """
+        Devuelve las métricas acumuladas de la escritura.
+
+        Returns:
+            Dict[str, Any]: Filas insertadas, peticiones, reintentos, filas en cuarentena y segundos.
+        """
+        return {
+            "tabla": self.tabla,
+            "filas": self.total_insertados,
+            "peticiones": self.total_peticiones,
+            "reintentos": self.total_reintentos,
+            "cuarentena": len(self.cuarentena),
+            "segundos": self.segundos_escritura,
+        }
+
+    def cerrar(self) -> None:
+        """
+        Envía las filas pendientes y registra el resumen de la escritura.
+        """
+        self.flush()
+        filas_por_segundo = self.total_insertados / self.segundos_escritura if self.segundos_escritura > 0 else 0
+        logger.info(f"Escritura en {self.tabla}: {self.total_insertados} filas en {self.total_peticiones} "
+                    f"peticiones ({self.total_reintentos} reintentos), {len(self.cuarentena)} filas en cuarentena, "
+                    f"{self.segundos_escritura:.2f}s de escritura ({filas_por_segundo:.0f} filas/s)")
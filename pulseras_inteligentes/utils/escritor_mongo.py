@@ -0,0 +1,210 @@
+"""
+Módulo para la escritura por lotes de documentos en MongoDB.
+
+Este módulo proporciona un escritor con buffer que acumula documentos en memoria
+y los envía a una colección mediante insert_many, evitando un viaje de red por
+cada documento generado.
+"""
+
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+import bson
+from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError
+from pulseras_inteligentes.utils.etl_funcs import logger
+
+# Código de error de MongoDB por clave duplicada en un índice único
+CODIGO_CLAVE_DUPLICADA = 11000
+
+# Valores por defecto de tamaño de lote
+TAMANO_LOTE_DEFECTO = 1000
+MAX_BYTES_LOTE_DEFECTO = 8 * 1024 * 1024  # 8 MB, por debajo del límite de 48 MB de un mensaje
+
+
+class EscritorLotesMongo:
+    """
+    Escritor con buffer que inserta documentos en MongoDB por lotes.
+
+    Los documentos se acumulan con agregar() y se envían con
+    insert_many(ordered=False) cuando el buffer alcanza el número de documentos
+    o el tamaño en bytes configurado. Para cada lote se registra la latencia
+    y el rendimiento en documentos por segundo. Los documentos rechazados por
+    MongoDB no interrumpen la escritura: se cuentan en total_errores, y los usuarios
+    de esos documentos se guardan en usuarios_con_errores, que el llamador debe revisar
+    antes de dar por escritos sus datos. Los rechazados por clave duplicada ya estaban
+    escritos y se cuentan aparte, en total_duplicados.
+
+    Ejemplo:
+        with EscritorLotesMongo(coleccion, tamano_lote=5000) as escritor:
+            for documento in documentos:
+                escritor.agregar(documento)
+    """
+
+    def __init__(self, coleccion: Collection, tamano_lote: int = TAMANO_LOTE_DEFECTO,
+                 max_bytes_lote: int = MAX_BYTES_LOTE_DEFECTO,
+                 transformar: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None):
+        """
+        Args:
+            coleccion: Colección de MongoDB donde se insertan los documentos.
+            tamano_lote: Número máximo de documentos por lote.
+            max_bytes_lote: Tamaño máximo aproximado (BSON) de un lote en bytes.
+            transformar: Función opcional que adapta cada documento antes de almacenarlo.
+        """
+        if tamano_lote < 1:
+            raise ValueError("El tamaño de lote debe ser mayor o igual a 1")
+
+        self.coleccion = coleccion
+        self.tamano_lote = tamano_lote
+        self.max_bytes_lote = max_bytes_lote
+        self.transformar = transformar
+
+        self._buffer: List[Dict[str, Any]] = []
+        self._bytes_buffer = 0
+
+        # Métricas acumuladas
+        self.total_insertados = 0
+        self.total_errores = 0
+        self.total_duplicados = 0
+        self.total_lotes = 0
+        # Usuarios con algún documento rechazado (None si un documento no tenía usuario)
+        self.usuarios_con_errores: Set[Any] = set()
+        self.segundos_escritura = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo_excepcion, excepcion, traza):
+        # Si hubo un error no se descarta lo acumulado, pero sí se propaga el error
+        self.cerrar()
+        return False
+
+    def _tamano_documento(self, documento: Dict[str, Any]) -> int:
+        """
+        Calcula el tamaño del documento una vez codificado en BSON.
+        """
+        return len(bson.encode(documento))
+
+    @staticmethod
+    def _usuario_de(documento: Dict[str, Any]) -> Any:
+        """
+        Obtiene el id_usuario de un documento almacenado, también en el formato de series temporales.
+        """
+        if "id_usuario" in documento:
+            return documento["id_usuario"]
+        return documento.get("meta", {}).get("id_usuario")
+
+    def agregar(self, documento: Optional[Dict[str, Any]]) -> None:
+        """
+        Agrega un documento al buffer y envía el lote si se alcanza algún límite.
+
+        Args:
+            documento: Documento a insertar. Los valores None se ignoran.
+        """
+        if documento is None:
+            return
+        if self.transformar is not None:
+            documento = self.transformar(documento)
+
+        tamano = self._tamano_documento(documento)
+
+        # Si el documento no entra en el lote actual por bytes, enviamos primero lo acumulado
+        if self._buffer and self._bytes_buffer + tamano > self.max_bytes_lote:
+            self.flush()
+
+        self._buffer.append(documento)
+        self._bytes_buffer += tamano
+
+        if len(self._buffer) >= self.tamano_lote:
+            self.flush()
+
+    def agregar_varios(self, documentos) -> None:
+        """
+        Agrega varios documentos al buffer.
+
+        Args:
+            documentos: Iterable de documentos a insertar.
+        """
+        for documento in documentos:
+            self.agregar(documento)
+
+    def _enviar_lote(self, lote: List[Dict[str, Any]]) -> int:
+        """
+        Envía un lote a la colección y devuelve el número de documentos insertados.
+        """
+        try:
+            resultado = self.coleccion.insert_many(lote, ordered=False)
+            return len(resultado.inserted_ids)
+        except BulkWriteError as e:
+            # Con ordered=False MongoDB intenta todos los documentos y reporta los fallidos
+            insertados = e.details.get("nInserted", 0)
+            errores = e.details.get("writeErrors", [])
+            # Un documento rechazado por clave duplicada ya existe en la colección (p. ej. al regenerar días)
+            duplicados = sum(1 for error in errores if error.get("code") == CODIGO_CLAVE_DUPLICADA)
+            self.total_duplicados += duplicados
+            errores = [error for error in errores if error.get("code") != CODIGO_CLAVE_DUPLICADA]
+            if duplicados:
+                logger.debug(f"Lote con {duplicados} documentos ya existentes en {self.coleccion.name}")
+            if not errores:
+                return insertados
+            self.usuarios_con_errores.update(self._usuario_de(lote[error["index"]]) for error in errores)
+            logger.warning(f"Lote con {len(errores)} documentos rechazados en {self.coleccion.name}: "
+                           f"{errores[0].get('errmsg') if errores else e}")
+            return insertados
+
+    def flush(self) -> int:
+        """
+        Envía a MongoDB los documentos acumulados en el buffer.
+
+        Returns:
+            int: Número de documentos insertados en este lote.
+        """
+        if not self._buffer:
+            return 0
+
+        lote = self._buffer
+        self._buffer = []
+        self._bytes_buffer = 0
+        return self._registrar_envio(lote)
+
+    def escribir(self, documentos: List[Dict[str, Any]]) -> int:
+        """
+        Escribe inmediatamente una lista de documentos como un único lote, sin pasar por el buffer.
+
+        Args:
+            documentos: Documentos a insertar.
+
+        Returns:
+            int: Número de documentos insertados.
+        """
+        if self.transformar is not None:
+            documentos = [self.transformar(documento) for documento in documentos]
+        return self._registrar_envio(documentos) if documentos else 0
+
+    def _registrar_envio(self, lote: List[Dict[str, Any]]) -> int:
+        """
+        Envía un lote y actualiza las métricas de escritura.
+        """
+        inicio = time.perf_counter()
+        duplicados_previos = self.total_duplicados
+        insertados = self._enviar_lote(lote)
+        latencia = time.perf_counter() - inicio
+
+        self.total_lotes += 1
+        self.total_insertados += insertados
+        self.total_errores += len(lote) - insertados - (self.total_duplicados - duplicados_previos)
+        self.segundos_escritura += latencia
+
+        docs_por_segundo = insertados / latencia if latencia > 0 else float("inf")
+        logger.debug(f"Lote {self.total_lotes} en {self.coleccion.name}: {insertados} documentos, "
+                     f"latencia {latencia * 1000:.1f} ms, {docs_por_segundo:.0f} docs/s")
+        return insertados
+
+    def cerrar(self) -> None:
+        """
+        Envía los documentos pendientes y registra el resumen de la escritura.
+        """
+        self.flush()
+        docs_por_segundo = self.total_insertados / self.segundos_escritura if self.segundos_escritura > 0 else 0
+        logger.info(f"Escritura en {self.coleccion.name}: {self.total_insertados} documentos en "
+                    f"{self.total_lotes} lotes, {self.total_errores} errores, {self.total_duplicados} duplicados, "
+                    f"{self.segundos_escritura:.2f}s de escritura ({docs_por_segundo:.0f} docs/s)")
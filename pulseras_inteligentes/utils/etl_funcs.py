@@ -4,11 +4,13 @@ Módulo para gestión procedimientos relacionados a ETL en el sistema de pulsera
 Este módulo proporciona diversas funciones relacionadas al manejo de flujo ETL y operaciones específicas.
 """
 
-from datetime import datetime
+from datetime import date, datetime
 from dateutil import parser
-from typing import Optional, Union
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 from contextlib import contextmanager
 import logging
+import numpy as np
+import pandas as pd
 import traceback
 import os
 from pathlib import Path
@@ -60,6 +62,109 @@ def configurar_logger(nombre: str = __name__, nivel: int = logging.INFO,
 # Logger por defecto para su uso en todo el módulo
 logger = configurar_logger()
 
+# Zona horaria al final de una fecha ISO ('Z', '+hh:mm', '-hhmm'). Las fechas se interpretan
+# con su hora local, como con dateutil: la zona no se convierte.
+PATRON_ZONA_HORARIA = r"(?:Z|[+-]\d{2}:?\d{2})$"
+
+# Número de fechas convertidas con la ruta rápida, con dateutil y con error
+estadisticas_fechas: Dict[str, int] = {"rapidas": 0, "dateutil": 0, "errores": 0}
+
+def convertir_fecha(fecha: Union[str, datetime, date]) -> datetime:
+    """
+    Convierte una fecha en formato ISO 8601 (u otro formato reconocible) a datetime.
+    
+    Las cadenas ISO se convierten con datetime.fromisoformat, incluidas las terminadas en 'Z'
+    o con desfase horario. Solo los formatos que fromisoformat no reconoce se interpretan con
+    dateutil, y se cuentan en estadisticas_fechas['dateutil'].
+    
+    Args:
+        fecha: Fecha en formato ISO u objeto datetime/date.
+        
+    Returns:
+        datetime: Fecha convertida.
+        
+    Raises:
+        ValueError: Si la fecha no se puede interpretar.
+    """
+    if isinstance(fecha, datetime):
+        return fecha
+    if isinstance(fecha, date):
+        return datetime(fecha.year, fecha.month, fecha.day)
+    
+    try:
+        # Antes de Python 3.11 fromisoformat no acepta el sufijo 'Z'
+        resultado = datetime.fromisoformat(fecha[:-1] + "+00:00" if fecha.endswith("Z") else fecha)
+        estadisticas_fechas["rapidas"] += 1
+        return resultado
+    except (TypeError, ValueError):
+        pass
+    
+    estadisticas_fechas["dateutil"] += 1
+    try:
+        return parser.parse(fecha)
+    except (TypeError, OverflowError, parser.ParserError) as e:
+        estadisticas_fechas["errores"] += 1
+        raise ValueError(f"Fecha no reconocida: {fecha!r}") from e
+
+def extraer_fechas_y_horas(fechas: Iterable[Any]) -> Tuple[List[Optional[str]], List[Optional[str]]]:
+    """
+    Convierte una columna de fechas en claves de fecha (YYYY-MM-DD) y horas (HH:MM:SS) de una vez.
+    
+    La conversión se hace con pandas sobre toda la columna; la zona horaria de las cadenas ISO se
+    descarta antes de convertir, para conservar su hora local como extraer_hora_fecha. Los valores
+    que pandas no reconoce se convierten uno a uno con convertir_fecha.
+    
+    Args:
+        fechas: Fechas en formato ISO u objetos datetime/date. Los valores None se conservan.
+        
+    Returns:
+        Tuple[List[Optional[str]], List[Optional[str]]]: Clave de fecha y hora de cada valor,
+        o None si el valor es nulo o no se pudo interpretar.
+    """
+    # Las fechas con zona horaria se dejan con su hora local
+    valores = [
+        valor.replace(tzinfo=None) if isinstance(valor, datetime) and valor.tzinfo is not None else valor
+        for valor in fechas
+    ]
+    if not valores:
+        return [], []
+    
+    serie = pd.Series(valores, dtype=object)
+    es_cadena = np.array([isinstance(valor, str) for valor in valores], dtype=bool)
+    if es_cadena.any():
+        serie[es_cadena] = serie[es_cadena].str.replace(PATRON_ZONA_HORARIA, "", regex=True)
+    
+    convertidas = pd.to_datetime(serie, format="ISO8601", errors="coerce")
+    validas = convertidas.notna().to_numpy()
+    estadisticas_fechas["rapidas"] += int(validas.sum())
+    
+    # 'YYYY-MM-DDTHH:MM:SS' de cada fecha, formateado en NumPy (strftime es un bucle en Python)
+    textos = np.datetime_as_string(convertidas.to_numpy(dtype="datetime64[s]"), unit="s").tolist()
+    claves = [texto[:10] if valida else None for texto, valida in zip(textos, validas)]
+    horas = [texto[11:19] if valida else None for texto, valida in zip(textos, validas)]
+    
+    # Formatos no ISO: conversión individual con dateutil
+    for posicion in np.flatnonzero(~validas & serie.notna().to_numpy()):
+        try:
+            fecha = convertir_fecha(serie[posicion])
+        except ValueError as e:
+            logger.error(f"Error al convertir fecha: {e}")
+            continue
+        claves[posicion] = fecha.strftime("%Y-%m-%d")
+        horas[posicion] = fecha.strftime("%H:%M:%S")
+    
+    return claves, horas
+
+def registrar_estadisticas_fechas() -> None:
+    """
+    Registra en el log cuántas fechas se convirtieron con la ruta rápida, con dateutil y con error.
+    """
+    total = sum(estadisticas_fechas.values())
+    tasa_dateutil = estadisticas_fechas["dateutil"] / total * 100 if total else 0
+    logger.info(f"Conversión de fechas: {estadisticas_fechas['rapidas']} por la ruta ISO, "
+                f"{estadisticas_fechas['dateutil']} con dateutil ({tasa_dateutil:.1f}%), "
+                f"{estadisticas_fechas['errores']} con error")
+
 def registrar_ejecucion_proceso(nombre_proceso: str, estado: str, detalles: str = "") -> None:
     """
     Registra la ejecución de un proceso del sistema en el log.
@@ -144,13 +249,7 @@ def extraer_ultima_fecha_insercion_hechos(db_dw, nombre_tabla_hechos: str) -> Op
         fecha_operacion = respuesta_log.data[0]['fecha_operacion']
         
         # Si la fecha viene como string, parseamos; si es datetime, convertimos directamente
-        if isinstance(fecha_operacion, str):
-            # Manejar diferentes formatos de fecha que puede devolver la base de datos
-            if fecha_operacion.endswith("Z"):
-                fecha_operacion = fecha_operacion[:-1]  # Remover la 'Z'
-            fecha_dt = parser.parse(fecha_operacion)
-        else:
-            fecha_dt = fecha_operacion
+        fecha_dt = convertir_fecha(fecha_operacion)
         
         # Convertir a formato ISO (solo fecha, sin hora) para mantener compatibilidad
         fecha_iso = fecha_dt.strftime("%Y-%m-%d") + "T00:00:00"
@@ -165,6 +264,9 @@ def obtener_id_fecha(db_dw, fecha_transaccion: Union[str, datetime]) -> Optional
     """
     Obtiene el ID de fecha correspondiente desde la dimensión de fechas.
     
+    La dimensión se carga en memoria la primera vez que se usa con cada conexión
+    (ver cache_dimensiones.CacheFechas), por lo que no hay una consulta por fila.
+    
     Args:
         db_dw: Conexión a la base de datos del Data Warehouse.
         fecha_transaccion: Fecha en formato ISO o objeto datetime.
@@ -172,26 +274,11 @@ def obtener_id_fecha(db_dw, fecha_transaccion: Union[str, datetime]) -> Optional
     Returns:
         int: ID de la fecha o None si hay un error.
     """
+    # Importación diferida: cache_dimensiones depende del logger de este módulo
+    from pulseras_inteligentes.utils.cache_dimensiones import obtener_cache_fechas
+    
     try:
-        # Solo parsear si no es datetime
-        if not isinstance(fecha_transaccion, datetime):
-            fecha_transaccion = parser.parse(fecha_transaccion)
-        
-        fecha_transaccion_str = fecha_transaccion.strftime("%Y-%m-%d")
-        logger.debug(f"Buscando ID para fecha: {fecha_transaccion_str}")
-        
-        respuesta = (
-            db_dw.table("dim_fecha")
-            .select("id_fecha, fecha")
-            .eq("fecha", fecha_transaccion_str)
-            .execute()
-        )
-        
-        if not respuesta.data:
-            logger.warning(f"No se encontró ID para la fecha {fecha_transaccion_str}")
-            return None
-            
-        return respuesta.data[0]["id_fecha"]
+        return obtener_cache_fechas(db_dw).obtener(fecha_transaccion)
     except Exception as e:
         logger.error(f"Error al obtener ID de fecha: {e}")
         return None
@@ -208,20 +295,9 @@ def extraer_hora_fecha(fecha: Union[str, datetime]) -> Optional[str]:
         str: Hora en formato HH:MM:SS o None si hay error.
     """
     try:
-        # Si es un objeto datetime, usamos directamente
-        if isinstance(fecha, datetime):
-            dt = fecha
-        else:
-            # Si no es datetime, intentamos parsear la cadena ISO 8601
-            if fecha.endswith("Z"):
-                fecha = fecha[:-1]  # Eliminar la "Z" si está presente
-            dt = parser.parse(fecha)
+        # Retornar solo la hora en formato HH:MM:SS (hora local de la fecha, sin convertir la zona)
+        return convertir_fecha(fecha).strftime("%H:%M:%S")
 
-        # Retornar solo la hora en formato HH:MM:SS
-        hora_formateada = dt.strftime("%H:%M:%S")
-        logger.debug(f"Hora extraída: {hora_formateada}")
-        return hora_formateada
-
-    except Exception as e:
+    except (AttributeError, ValueError) as e:
         logger.error(f"Error al extraer hora: {e}")
         return None
\ No newline at end of file
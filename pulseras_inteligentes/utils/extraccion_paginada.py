@@ -0,0 +1,122 @@
+"""
+Módulo para la extracción paginada de tablas de Supabase (PostgREST).
+
+Una consulta sin límite devuelve como máximo el número de filas configurado en el
+servidor (max-rows) y además se carga completa en memoria. Este módulo recorre una
+tabla por keyset (clave > último valor leído, ordenado por clave) en páginas de tamaño
+fijo y entrega las filas como un flujo, de modo que la extracción usa memoria constante
+y no se trunca en silencio. Opcionalmente la página siguiente se pide en un hilo
+mientras se procesa la actual.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+from pulseras_inteligentes.utils.etl_funcs import logger
+
+# Número de filas por página por defecto (coincide con el max-rows habitual de Supabase)
+TAMANO_PAGINA_DEFECTO = 1000
+
+
+def _columnas_con_clave(columnas: str, clave: str) -> str:
+    """
+    Agrega la columna clave a la selección si no está incluida.
+    """
+    seleccionadas = [columna.strip() for columna in columnas.split(",")]
+    if columnas.strip() == "*" or clave in seleccionadas:
+        return columnas
+    return f"{columnas}, {clave}"
+
+
+def iterar_paginas(cliente, tabla: str, columnas: str, clave: str,
+                   filtros: Optional[Callable[[Any], Any]] = None,
+                   tamano_pagina: int = TAMANO_PAGINA_DEFECTO,
+                   desde: Any = None, prefetch: bool = False) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Recorre una tabla por keyset y entrega sus filas página a página.
+
+    La iteración termina al recibir una página vacía, por lo que funciona aunque el
+    servidor limite las respuestas a menos filas que tamano_pagina.
+
+    Args:
+        cliente: Cliente de Supabase.
+        tabla: Nombre de la tabla.
+        columnas: Columnas a seleccionar, con la sintaxis de select() de PostgREST.
+        clave: Columna única y ordenable usada para paginar (p. ej. la clave primaria).
+        filtros: Función opcional que recibe la consulta y le agrega filtros (eq, gt, ...).
+        tamano_pagina: Número de filas por página.
+        desde: Valor de la clave a partir del cual leer (exclusivo). None lee desde el inicio.
+        prefetch: Si es True, la página siguiente se pide en segundo plano mientras se
+            procesa la actual.
+
+    Yields:
+        List[Dict[str, Any]]: Filas de cada página, ordenadas por la clave.
+    """
+    columnas = _columnas_con_clave(columnas, clave)
+
+    def consultar_pagina(ultimo_valor):
+        consulta = cliente.table(tabla).select(columnas)
+        if filtros is not None:
+            consulta = filtros(consulta)
+        if ultimo_valor is not None:
+            consulta = consulta.gt(clave, ultimo_valor)
+        return consulta.order(clave).limit(tamano_pagina).execute().data
+
+    if not prefetch:
+        pagina = consultar_pagina(desde)
+        while pagina:
+            yield pagina
+            pagina = consultar_pagina(pagina[-1][clave])
+        return
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        futuro = pool.submit(consultar_pagina, desde)
+        while futuro is not None:
+            pagina = futuro.result()
+            if not pagina:
+                break
+            # La siguiente página se pide antes de entregar la actual
+            futuro = pool.submit(consultar_pagina, pagina[-1][clave])
+            yield pagina
+
+
+def extraer_paginado(cliente, tabla: str, columnas: str, clave: str,
+                     filtros: Optional[Callable[[Any], Any]] = None,
+                     tamano_pagina: int = TAMANO_PAGINA_DEFECTO,
+                     desde: Any = None, prefetch: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Recorre una tabla por keyset y entrega sus filas una a una.
+
+    Acepta los mismos argumentos que iterar_paginas. Al agotarse registra el total de
+    filas y páginas leídas.
+
+    Yields:
+        Dict[str, Any]: Filas de la tabla, ordenadas por la clave.
+    """
+    total_filas = 0
+    total_paginas = 0
+    for pagina in iterar_paginas(cliente, tabla, columnas, clave, filtros, tamano_pagina, desde, prefetch):
+        total_paginas += 1
+        total_filas += len(pagina)
+        yield from pagina
+
+    logger.info(f"Extracción paginada de {tabla}: {total_filas} filas en {total_paginas} páginas")
+
+
+def agrupar_en_lotes(elementos: Iterable[Any], tamano_lote: int) -> Iterator[List[Any]]:
+    """
+    Agrupa un iterable en listas de hasta tamano_lote elementos, sin materializarlo completo.
+
+    Args:
+        elementos: Iterable de elementos.
+        tamano_lote: Número máximo de elementos por lote.
+
+    Yields:
+        List[Any]: Lotes de elementos.
+    """
+    iterador = iter(elementos)
+    while True:
+        lote = list(islice(iterador, tamano_lote))
+        if not lote:
+            return
+        yield lote
@@ -0,0 +1,370 @@
+"""
+Módulo para ejecutar un proceso ETL como un pipeline de etapas concurrentes.
+
+Las cargas de hechos extraían, transformaban y cargaban cada bloque en secuencia, de modo
+que el cursor de origen, la CPU y la conexión HTTP al Data Warehouse pasaban la mayor parte
+del tiempo esperando. Este módulo ejecuta la extracción, la transformación y la carga en
+hilos separados, unidos por colas acotadas:
+
+- extracción: un hilo que recorre la fuente y entrega sus elementos (p. ej. páginas o bloques);
+- transformación: un hilo que convierte cada elemento (búsquedas en caché, filas de hechos);
+- carga: uno o varios hilos que escriben los elementos transformados.
+
+Las colas acotadas aplican contrapresión: si la carga es más lenta, la extracción se detiene
+al llenarse la cola en lugar de acumular datos en memoria. Si una etapa falla, el resto se
+detiene y el error se propaga al llamador. Como los hilos de carga terminan en cualquier
+orden, la confirmación de cada elemento (p. ej. el avance de un checkpoint) se hace en el
+orden de extracción y solo cuando todos los elementos anteriores ya se cargaron.
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from pulseras_inteligentes.utils.etl_funcs import logger
+
+# Elementos en espera por cola entre etapas
+TAMANO_COLA_DEFECTO = 4
+
+# Hilos de carga por defecto
+CARGADORES_DEFECTO = 2
+
+# Cada cuánto revisan los hilos bloqueados si el pipeline se detuvo
+INTERVALO_REVISION = 0.1
+
+# Marca de fin de los elementos de una cola
+_FIN = object()
+
+
+class EstadisticasEtapa:
+    """
+    Tiempo ocupado (procesando) y en espera (bloqueada en una cola) de una etapa del pipeline.
+    """
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self.elementos = 0
+        self.segundos_ocupada = 0.0
+        self.segundos_espera = 0.0
+        self._lock = threading.Lock()
+
+    def sumar(self, elementos: int = 0, ocupada: float = 0.0, espera: float = 0.0) -> None:
+        """
+        Acumula elementos y tiempos (las etapas con varios hilos comparten sus estadísticas).
+        """
+        with self._lock:
+            self.elementos += elementos
+            self.segundos_ocupada += ocupada
+            self.segundos_espera += espera
+
+    def como_dict(self) -> Dict[str, Any]:
+        """
+        Devuelve las estadísticas como diccionario.
+        """
+        total = self.segundos_ocupada + self.segundos_espera
+        return {
+            "etapa": self.nombre,
+            "elementos": self.elementos,
+            "segundos_ocupada": self.segundos_ocupada,
+            "segundos_espera": self.segundos_espera,
+            "ocupacion": self.segundos_ocupada / total if total > 0 else 0.0,
+        }
+
+
+class _PipelineDetenido(Exception):
+    """
+    Se lanza dentro de una etapa cuando otra etapa falló y el pipeline debe terminar.
+    """
+
+
+class PipelineEtapas:
+    """
+    Pipeline de extracción, transformación y carga en hilos unidos por colas acotadas.
+
+    Ejemplo:
+        pipeline = PipelineEtapas(
+            fuente=iterar_paginas(...),
+            transformar=lambda pagina: construir_hechos(pagina),
+            cargar=lambda hechos, indice: escritores[indice].agregar_varios(hechos),
+            cargadores=2,
+        )
+        estadisticas = pipeline.ejecutar()
+    """
+
+    def __init__(self, fuente: Iterable[Any], transformar: Callable[[Any], Any],
+                 cargar: Callable[[Any, int], None], cargadores: int = CARGADORES_DEFECTO,
+                 tamano_cola: int = TAMANO_COLA_DEFECTO,
+                 al_confirmar: Optional[Callable[[Any], None]] = None, nombre: str = "pipeline"):
+        """
+        Args:
+            fuente: Iterable con los elementos a procesar; se recorre en el hilo de extracción.
+            transformar: Función que convierte cada elemento extraído.
+            cargar: Función que escribe un elemento transformado. Recibe además el número del
+                hilo de carga (de 0 a cargadores - 1), p. ej. para usar un escritor por hilo.
+            cargadores: Número de hilos de carga.
+            tamano_cola: Número máximo de elementos en espera entre dos etapas.
+            al_confirmar: Función opcional que recibe cada elemento transformado, en el orden de
+                extracción, una vez cargados él y todos los anteriores.
+            nombre: Nombre del pipeline para el log.
+        """
+        if cargadores < 1:
+            raise ValueError("El número de hilos de carga debe ser mayor o igual a 1")
+        if tamano_cola < 1:
+            raise ValueError("El tamaño de las colas debe ser mayor o igual a 1")
+
+        self.fuente = fuente
+        self.transformar = transformar
+        self.cargar = cargar
+        self.cargadores = cargadores
+        self.al_confirmar = al_confirmar
+        self.nombre = nombre
+
+        self._cola_transformacion: queue.Queue = queue.Queue(maxsize=tamano_cola)
+        self._cola_carga: queue.Queue = queue.Queue(maxsize=tamano_cola)
+        self._detener = threading.Event()
+        self._errores = []
+        self._lock_errores = threading.Lock()
+
+        # Confirmación en orden: elementos cargados pendientes de que terminen los anteriores.
+        # Un único hilo de carga a la vez entrega los elementos listos a al_confirmar
+        self._lock_confirmacion = threading.Lock()
+        self._cargados: Dict[int, Any] = {}
+        self._siguiente_confirmacion = 0
+        self._confirmando = False
+
+        self.estadisticas = {
+            "extraccion": EstadisticasEtapa("extraccion"),
+            "transformacion": EstadisticasEtapa("transformacion"),
+            "carga": EstadisticasEtapa("carga"),
+        }
+
+    def _registrar_error(self, etapa: str, error: BaseException) -> None:
+        """
+        Guarda el error de una etapa y detiene el resto del pipeline.
+        """
+        with self._lock_errores:
+            self._errores.append((etapa, error))
+        self._detener.set()
+        logger.error(f"Error en la etapa de {etapa} del pipeline {self.nombre}: {error}")
+
+    def _poner(self, cola: queue.Queue, elemento: Any, estadisticas: EstadisticasEtapa) -> None:
+        """
+        Agrega un elemento a una cola, esperando mientras esté llena y el pipeline siga activo.
+        """
+        inicio = time.perf_counter()
+        try:
+            while True:
+                if self._detener.is_set():
+                    raise _PipelineDetenido()
+                try:
+                    cola.put(elemento, timeout=INTERVALO_REVISION)
+                    return
+                except queue.Full:
+                    continue
+        finally:
+            estadisticas.sumar(espera=time.perf_counter() - inicio)
+
+    def _tomar(self, cola: queue.Queue, estadisticas: EstadisticasEtapa) -> Any:
+        """
+        Toma un elemento de una cola, esperando mientras esté vacía y el pipeline siga activo.
+        """
+        inicio = time.perf_counter()
+        try:
+            while True:
+                if self._detener.is_set():
+                    raise _PipelineDetenido()
+                try:
+                    return cola.get(timeout=INTERVALO_REVISION)
+                except queue.Empty:
+                    continue
+        finally:
+            estadisticas.sumar(espera=time.perf_counter() - inicio)
+
+    def _extraer(self) -> None:
+        """
+        Hilo de extracción: recorre la fuente y numera sus elementos.
+        """
+        estadisticas = self.estadisticas["extraccion"]
+        iterador = iter(self.fuente)
+        secuencia = 0
+        try:
+            while True:
+                inicio = time.perf_counter()
+                try:
+                    elemento = next(iterador)
+                except StopIteration:
+                    estadisticas.sumar(ocupada=time.perf_counter() - inicio)
+                    break
+                estadisticas.sumar(elementos=1, ocupada=time.perf_counter() - inicio)
+
+                self._poner(self._cola_transformacion, (secuencia, elemento), estadisticas)
+                secuencia += 1
+            self._poner(self._cola_transformacion, _FIN, estadisticas)
+        except _PipelineDetenido:
+            pass
+        except BaseException as e:
+            self._registrar_error("extraccion", e)
+        finally:
+            # Libera el cursor o la conexión de la fuente si se detuvo antes de agotarla
+            cerrar = getattr(iterador, "close", None)
+            if cerrar is not None:
+                cerrar()
+
+    def _transformar(self) -> None:
+        """
+        Hilo de transformación: convierte cada elemento y lo envía a los hilos de carga.
+        """
+        estadisticas = self.estadisticas["transformacion"]
+        try:
+            while True:
+                item = self._tomar(self._cola_transformacion, estadisticas)
+                if item is _FIN:
+                    break
+                secuencia, elemento = item
+
+                inicio = time.perf_counter()
+                transformado = self.transformar(elemento)
+                estadisticas.sumar(elementos=1, ocupada=time.perf_counter() - inicio)
+
+                self._poner(self._cola_carga, (secuencia, transformado), estadisticas)
+
+            # Una marca de fin por cada hilo de carga
+            for _ in range(self.cargadores):
+                self._poner(self._cola_carga, _FIN, estadisticas)
+        except _PipelineDetenido:
+            pass
+        except BaseException as e:
+            self._registrar_error("transformacion", e)
+
+    def _tomar_confirmables(self) -> List[Any]:
+        """
+        Saca, en orden, los elementos cargados que ya no tienen anteriores pendientes.
+        Debe llamarse con _lock_confirmacion tomado.
+        """
+        listos = []
+        while self._siguiente_confirmacion in self._cargados:
+            listos.append(self._cargados.pop(self._siguiente_confirmacion))
+            self._siguiente_confirmacion += 1
+        return listos
+
+    def _confirmar(self, secuencia: int, transformado: Any) -> None:
+        """
+        Registra un elemento cargado y confirma, en orden, los que ya no tienen anteriores pendientes.
+
+        al_confirmar se llama fuera del lock (p. ej. avanza un checkpoint con una petición HTTP),
+        de modo que los demás hilos de carga siguen registrando elementos y cargando. Si otro hilo
+        ya está confirmando, este solo registra el elemento y aquel lo entregará en su turno.
+        """
+        with self._lock_confirmacion:
+            self._cargados[secuencia] = transformado
+            if self._confirmando:
+                return
+            listos = self._tomar_confirmables()
+            if not listos:
+                return
+            self._confirmando = True
+
+        try:
+            while listos:
+                if self.al_confirmar is not None:
+                    for elemento in listos:
+                        self.al_confirmar(elemento)
+                with self._lock_confirmacion:
+                    listos = self._tomar_confirmables()
+                    if not listos:
+                        self._confirmando = False
+        except BaseException:
+            with self._lock_confirmacion:
+                self._confirmando = False
+            raise
+
+    def _cargar(self, indice: int) -> None:
+        """
+        Hilo de carga: escribe los elementos transformados y los confirma.
+        """
+        estadisticas = self.estadisticas["carga"]
+        try:
+            while True:
+                item = self._tomar(self._cola_carga, estadisticas)
+                if item is _FIN:
+                    break
+                secuencia, transformado = item
+
+                inicio = time.perf_counter()
+                self.cargar(transformado, indice)
+                self._confirmar(secuencia, transformado)
+                estadisticas.sumar(elementos=1, ocupada=time.perf_counter() - inicio)
+        except _PipelineDetenido:
+            pass
+        except BaseException as e:
+            self._registrar_error("carga", e)
+
+    def registrar_estadisticas(self, segundos: float) -> None:
+        """
+        Registra en el log el tiempo ocupado y en espera de cada etapa.
+
+        Args:
+            segundos: Duración total del pipeline.
+        """
+        for estadisticas in self.estadisticas.values():
+            datos = estadisticas.como_dict()
+            logger.info(f"Pipeline {self.nombre}, etapa de {datos['etapa']}: {datos['elementos']} elementos, "
+                        f"{datos['segundos_ocupada']:.2f}s ocupada, {datos['segundos_espera']:.2f}s en espera "
+                        f"({datos['ocupacion'] * 100:.0f}% de ocupación)")
+        logger.info(f"Pipeline {self.nombre} completado en {segundos:.2f}s con {self.cargadores} hilos de carga")
+
+    def ejecutar(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Ejecuta el pipeline hasta agotar la fuente o hasta que falle una etapa.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Estadísticas de cada etapa (elementos, segundos ocupada y en espera).
+
+        Raises:
+            Exception: El primer error ocurrido en una etapa, después de detener las demás.
+        """
+        hilos = [threading.Thread(target=self._extraer, name=f"{self.nombre}-extraccion", daemon=True),
+                 threading.Thread(target=self._transformar, name=f"{self.nombre}-transformacion", daemon=True)]
+        hilos += [threading.Thread(target=self._cargar, args=(indice,), name=f"{self.nombre}-carga-{indice}", daemon=True)
+                  for indice in range(self.cargadores)]
+
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        try:
+            for hilo in hilos:
+                # join con tiempo límite para que la interrupción del usuario llegue al hilo principal
+                while hilo.is_alive():
+                    hilo.join(timeout=INTERVALO_REVISION)
+        except BaseException:
+            self._detener.set()
+            raise
+
+        self.registrar_estadisticas(time.perf_counter() - inicio)
+        if self._errores:
+            _, error = self._errores[0]
+            raise error
+        return {nombre: estadisticas.como_dict() for nombre, estadisticas in self.estadisticas.items()}
+
+
+def ejecutar_pipeline(fuente: Iterable[Any], transformar: Callable[[Any], Any], cargar: Callable[[Any, int], None],
+                      cargadores: int = CARGADORES_DEFECTO, tamano_cola: int = TAMANO_COLA_DEFECTO,
+                      al_confirmar: Optional[Callable[[Any], None]] = None,
+                      nombre: str = "pipeline") -> Dict[str, Dict[str, Any]]:
+    """
+    Ejecuta un pipeline de extracción, transformación y carga en hilos unidos por colas acotadas.
+
+    Args:
+        fuente: Iterable con los elementos a procesar.
+        transformar: Función que convierte cada elemento extraído.
+        cargar: Función que escribe un elemento transformado; recibe además el número del hilo de carga.
+        cargadores: Número de hilos de carga.
+        tamano_cola: Número máximo de elementos en espera entre dos etapas.
+        al_confirmar: Función opcional llamada en orden de extracción con cada elemento ya cargado.
+        nombre: Nombre del pipeline para el log.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Estadísticas de cada etapa.
+    """
+    return PipelineEtapas(fuente, transformar, cargar, cargadores=cargadores, tamano_cola=tamano_cola,
+                          al_confirmar=al_confirmar, nombre=nombre).ejecutar()
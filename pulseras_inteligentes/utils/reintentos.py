@@ -0,0 +1,221 @@
+"""
+Módulo con la política común de reintentos y aislamiento de errores en la escritura por lotes.
+
+Las escrituras en el Data Warehouse (EscritorHechos, carga_lotes y el cliente asíncrono) tratan
+los errores de la misma forma:
+
+- Los errores transitorios (red, conexiones agotadas, bloqueos) se reintentan con espera
+  exponencial y, si se agotan los reintentos, se propagan sin tocar el lote.
+- Los errores de datos se aíslan dividiendo el lote en mitades hasta dejar en cuarentena solo
+  las filas rechazadas.
+
+Cada función tiene una variante síncrona y otra asíncrona que comparten el cálculo de la espera
+y la decisión de dividir o descartar un lote.
+"""
+
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import httpx
+from pulseras_inteligentes.utils.etl_funcs import logger
+
+# Reintentos ante errores transitorios
+MAX_REINTENTOS_DEFECTO = 5
+ESPERA_INICIAL_DEFECTO = 0.5
+ESPERA_MAXIMA = 30.0
+
+# Códigos de error de PostgREST y PostgreSQL que indican un fallo transitorio:
+# PGRST000-003 (conexión con la base), 40001 (serialización), 40P01 (deadlock),
+# 53300 (demasiadas conexiones) y 57014 (consulta cancelada por timeout)
+CODIGOS_ERROR_TRANSITORIO = {"PGRST000", "PGRST001", "PGRST002", "PGRST003", "40001", "40P01", "53300", "57014"}
+
+# Respuestas HTTP que indican sobrecarga o indisponibilidad momentánea del servidor o de la pasarela
+ESTADOS_HTTP_TRANSITORIOS = {429, 502, 503, 504}
+
+
+def _estado_http(error: Exception) -> Optional[int]:
+    """
+    Obtiene el estado HTTP de un error, si lo tiene.
+
+    Cuando la respuesta de error no es JSON (p. ej. la de una pasarela), el cliente de Supabase
+    deja el estado HTTP como entero en el atributo code.
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code
+    estado = getattr(error, "estado", None)
+    if isinstance(estado, int):
+        return estado
+    code = getattr(error, "code", None)
+    return code if isinstance(code, int) else None
+
+
+def es_error_transitorio(error: Exception) -> bool:
+    """
+    Indica si un error de escritura puede resolverse reintentando la misma petición.
+
+    Args:
+        error: Excepción lanzada por el cliente de Supabase.
+
+    Returns:
+        bool: True si el error es de red, un código transitorio de PostgREST/PostgreSQL o una
+            respuesta HTTP de sobrecarga.
+    """
+    if isinstance(error, httpx.TransportError):
+        return True
+    if _estado_http(error) in ESTADOS_HTTP_TRANSITORIOS:
+        return True
+    return getattr(error, "code", None) in CODIGOS_ERROR_TRANSITORIO
+
+
+def calcular_espera(intento: int, espera_inicial: float = ESPERA_INICIAL_DEFECTO) -> float:
+    """
+    Calcula la espera antes de un reintento: exponencial, acotada y con variación aleatoria.
+
+    Args:
+        intento: Número de reintentos ya hechos (0 para el primero).
+        espera_inicial: Espera antes del primer reintento.
+
+    Returns:
+        float: Segundos de espera.
+    """
+    return min(espera_inicial * 2 ** intento, ESPERA_MAXIMA) * random.uniform(0.5, 1.0)
+
+
+def _debe_reintentar(error: Exception, intento: int, max_reintentos: int,
+                     es_transitorio: Callable[[Exception], bool]) -> bool:
+    """
+    Indica si un error admite un nuevo intento.
+    """
+    return es_transitorio(error) and intento < max_reintentos
+
+
+def ejecutar_con_reintentos(operacion: Callable[[], Any], descripcion: str,
+                            max_reintentos: int = MAX_REINTENTOS_DEFECTO,
+                            espera_inicial: float = ESPERA_INICIAL_DEFECTO,
+                            es_transitorio: Callable[[Exception], bool] = es_error_transitorio,
+                            al_reintentar: Optional[Callable[[], None]] = None) -> Any:
+    """
+    Ejecuta una operación, reintentando con espera exponencial ante errores transitorios.
+
+    Args:
+        operacion: Función sin argumentos que envía la petición.
+        descripcion: Texto que identifica la operación en los mensajes de log.
+        max_reintentos: Reintentos ante errores transitorios.
+        espera_inicial: Espera antes del primer reintento; se duplica en cada intento.
+        es_transitorio: Función que clasifica los errores.
+        al_reintentar: Función opcional llamada antes de cada reintento (p. ej. para contarlos).
+
+    Returns:
+        Any: Resultado de la operación.
+
+    Raises:
+        Exception: El error de datos, o el transitorio si se agotan los reintentos.
+    """
+    intento = 0
+    while True:
+        try:
+            return operacion()
+        except Exception as e:
+            if not _debe_reintentar(e, intento, max_reintentos, es_transitorio):
+                raise
+            espera = calcular_espera(intento, espera_inicial)
+            intento += 1
+            if al_reintentar is not None:
+                al_reintentar()
+            logger.warning(f"Error transitorio en {descripcion} (intento {intento} de {max_reintentos}), "
+                           f"reintentando en {espera:.2f}s: {e}")
+            time.sleep(espera)
+
+
+async def ejecutar_con_reintentos_async(operacion: Callable[[], Awaitable[Any]], descripcion: str,
+                                        max_reintentos: int = MAX_REINTENTOS_DEFECTO,
+                                        espera_inicial: float = ESPERA_INICIAL_DEFECTO,
+                                        es_transitorio: Callable[[Exception], bool] = es_error_transitorio,
+                                        al_reintentar: Optional[Callable[[], None]] = None) -> Any:
+    """
+    Variante asíncrona de ejecutar_con_reintentos; la espera no bloquea el bucle de eventos.
+    """
+    intento = 0
+    while True:
+        try:
+            return await operacion()
+        except Exception as e:
+            if not _debe_reintentar(e, intento, max_reintentos, es_transitorio):
+                raise
+            espera = calcular_espera(intento, espera_inicial)
+            intento += 1
+            if al_reintentar is not None:
+                al_reintentar()
+            logger.warning(f"Error transitorio en {descripcion} (intento {intento} de {max_reintentos}), "
+                           f"reintentando en {espera:.2f}s: {e}")
+            await asyncio.sleep(espera)
+
+
+def _dividir_lote(lote: List[Dict[str, Any]], error: Exception, descripcion: str,
+                  es_transitorio: Callable[[Exception], bool],
+                  al_rechazar: Callable[[Dict[str, Any], Exception], None]) -> List[List[Dict[str, Any]]]:
+    """
+    Decide qué hacer con un lote rechazado: propagar el error, descartar la fila o dividirlo.
+
+    Returns:
+        List[List[Dict[str, Any]]]: Mitades a reenviar (vacía si la fila se descartó).
+
+    Raises:
+        Exception: El error, si es transitorio.
+    """
+    if es_transitorio(error):
+        # Agotados los reintentos el problema no es de los datos: no se divide el lote
+        raise error
+    if len(lote) == 1:
+        al_rechazar(lote[0], error)
+        return []
+
+    logger.debug(f"Lote de {len(lote)} filas rechazado en {descripcion}, se divide para aislar el error: {error}")
+    mitad = len(lote) // 2
+    return [lote[:mitad], lote[mitad:]]
+
+
+def enviar_con_biseccion(enviar: Callable[[List[Dict[str, Any]]], Any], lote: List[Dict[str, Any]],
+                         descripcion: str, al_rechazar: Callable[[Dict[str, Any], Exception], None],
+                         es_transitorio: Callable[[Exception], bool] = es_error_transitorio) -> int:
+    """
+    Envía un lote y, ante un error de datos, lo divide en mitades hasta aislar las filas con error.
+
+    Args:
+        enviar: Función que envía un lote (con sus propios reintentos) y lanza una excepción si falla.
+        lote: Filas a enviar.
+        descripcion: Texto que identifica el destino en los mensajes de log.
+        al_rechazar: Función que recibe cada fila rechazada por un error de datos y el error.
+        es_transitorio: Función que clasifica los errores.
+
+    Returns:
+        int: Número de filas enviadas.
+
+    Raises:
+        Exception: El error transitorio que persistió tras los reintentos de enviar.
+    """
+    try:
+        enviar(lote)
+        return len(lote)
+    except Exception as e:
+        mitades = _dividir_lote(lote, e, descripcion, es_transitorio, al_rechazar)
+    return sum(enviar_con_biseccion(enviar, mitad, descripcion, al_rechazar, es_transitorio) for mitad in mitades)
+
+
+async def enviar_con_biseccion_async(enviar: Callable[[List[Dict[str, Any]]], Awaitable[Any]],
+                                     lote: List[Dict[str, Any]], descripcion: str,
+                                     al_rechazar: Callable[[Dict[str, Any], Exception], None],
+                                     es_transitorio: Callable[[Exception], bool] = es_error_transitorio) -> int:
+    """
+    Variante asíncrona de enviar_con_biseccion; las mitades de un lote rechazado se envían en paralelo.
+    """
+    try:
+        await enviar(lote)
+        return len(lote)
+    except Exception as e:
+        mitades = _dividir_lote(lote, e, descripcion, es_transitorio, al_rechazar)
+    enviados = await asyncio.gather(
+        *(enviar_con_biseccion_async(enviar, mitad, descripcion, al_rechazar, es_transitorio) for mitad in mitades)
+    )
+    return sum(enviados)
@@ -0,0 +1,152 @@
+"""
+Pruebas del cliente asíncrono del Data Warehouse (utils/cliente_dw_async.py) contra un
+servidor PostgREST simulado en memoria con httpx.MockTransport.
+"""
+
+import asyncio
+import json
+import httpx
+import pytest
+from pulseras_inteligentes.utils.cliente_dw_async import RUTA_REST, ClienteDWAsync, EscritorHechosAsync
+
+
+def transporte_postgrest_simulado(tablas, latencia=0.0, fallos_transitorios=0):
+    """
+    Imita a PostgREST: las inserciones con una columna NULL se rechazan como la restricción
+    NOT NULL de PostgreSQL (código 23502) y las primeras peticiones responden 503.
+    """
+    estado = {"fallos_pendientes": fallos_transitorios}
+
+    async def atender(peticion):
+        await asyncio.sleep(latencia)
+        if peticion.headers.get("apikey") is None:
+            return httpx.Response(401, json={"code": "PGRST301", "message": "Falta la clave de la API"})
+        if estado["fallos_pendientes"] > 0:
+            estado["fallos_pendientes"] -= 1
+            return httpx.Response(503, text="Service Unavailable")
+
+        ruta = peticion.url.path[len(RUTA_REST):]
+        cuerpo = json.loads(peticion.content)
+        if ruta.startswith("/rpc/"):
+            return httpx.Response(200, json={"funcion": ruta[len("/rpc/"):], "parametros": cuerpo})
+
+        tabla = ruta.strip("/")
+        for fila in cuerpo:
+            nulas = [columna for columna, valor in fila.items() if valor is None]
+            if nulas:
+                return httpx.Response(400, json={
+                    "code": "23502",
+                    "message": f'null value in column "{nulas[0]}" of relation "{tabla}" violates not-null constraint',
+                    "details": None
+                })
+        tablas.setdefault(tabla, []).extend(cuerpo)
+        return httpx.Response(201)
+
+    return httpx.MockTransport(atender)
+
+
+def crear_cliente(tablas, **opciones):
+    transporte = transporte_postgrest_simulado(
+        tablas, **{clave: opciones.pop(clave) for clave in ("latencia", "fallos_transitorios") if clave in opciones}
+    )
+    return ClienteDWAsync("http://postgrest.local", "clave-prueba", espera_inicial=0.001,
+                          transporte=transporte, **opciones)
+
+
+def hechos_prueba(cantidad):
+    return [{"id_usuario": i % 50 + 1, "id_actividad": 1, "id_fecha": None if i % 1000 == 999 else 1,
+             "hora_registro": "10:00:00"} for i in range(cantidad)]
+
+
+def test_insertar_lotes_aisla_errores_reintenta_y_respeta_la_concurrencia():
+    tablas = {}
+    hechos = hechos_prueba(5000)
+    rechazadas = sum(1 for hecho in hechos if hecho["id_fecha"] is None)
+
+    async def ejecutar():
+        async with crear_cliente(tablas, max_concurrencia=4, latencia=0.005, fallos_transitorios=2) as cliente:
+            insertados = await cliente.insertar_lotes("hechos_actividad", hechos, tamano_lote=250)
+            resultado_rpc = await cliente.rpc("avanzar_checkpoint_etl", {"p_proceso": "PRUEBA"})
+        return cliente, insertados, resultado_rpc
+
+    cliente, insertados, resultado_rpc = asyncio.run(ejecutar())
+
+    assert insertados == len(hechos) - rechazadas == len(tablas["hechos_actividad"])
+    assert len(cliente.cuarentena) == rechazadas
+    assert cliente.total_reintentos == 2
+    assert 1 < cliente.max_en_curso <= 4
+    assert resultado_rpc == {"funcion": "avanzar_checkpoint_etl", "parametros": {"p_proceso": "PRUEBA"}}
+
+
+def test_insertar_lotes_lee_el_flujo_a_medida_que_avanza():
+    tablas = {}
+    tamano_lote, trabajadores = 10, 3
+    contador = {"leidas": 0, "max_pendientes": 0}
+
+    def flujo():
+        for i in range(2000):
+            contador["leidas"] += 1
+            pendientes = contador["leidas"] - len(tablas.get("hechos_actividad", []))
+            contador["max_pendientes"] = max(contador["max_pendientes"], pendientes)
+            yield {"id_usuario": 1, "id_actividad": 1, "id_fecha": 1, "hora_registro": "10:00:00", "orden": i}
+
+    async def ejecutar():
+        async with crear_cliente(tablas, max_concurrencia=trabajadores, latencia=0.001) as cliente:
+            return await cliente.insertar_lotes("hechos_actividad", flujo(), tamano_lote=tamano_lote)
+
+    assert asyncio.run(ejecutar()) == 2000
+    # Cola acotada, un lote en cada tarea y el lote que se está armando
+    assert contador["max_pendientes"] <= (2 * trabajadores + 1) * tamano_lote
+
+
+def test_insertar_lotes_propaga_el_error_al_agotar_los_reintentos():
+    tablas = {}
+    leidas = []
+
+    def flujo():
+        for i in range(1000):
+            leidas.append(i)
+            yield {"id_usuario": 1, "id_actividad": 1, "id_fecha": 1, "hora_registro": "10:00:00"}
+
+    async def ejecutar():
+        async with crear_cliente(tablas, max_concurrencia=2, max_reintentos=1, fallos_transitorios=1000) as cliente:
+            await cliente.insertar_lotes("hechos_actividad", flujo(), tamano_lote=10)
+
+    with pytest.raises(Exception, match="503"):
+        asyncio.run(ejecutar())
+    assert "hechos_actividad" not in tablas
+    assert len(leidas) < 1000
+
+
+def test_escritor_async_confirma_las_marcas_despues_de_escribir():
+    tablas = {}
+    confirmadas = []
+
+    def confirmar(clave, valor):
+        confirmadas.append((clave, valor, len(tablas.get("hechos_actividad", []))))
+
+    escritor = EscritorHechosAsync("hechos_actividad", tamano_lote=20, max_concurrencia=3, al_confirmar=confirmar,
+                                   cliente=crear_cliente(tablas, max_concurrencia=3))
+    hechos = [dict(hecho, id_fecha=1) for hecho in hechos_prueba(1000)]
+    with escritor:
+        for bloque in range(5):
+            escritor.agregar_varios(hechos[bloque * 200:(bloque + 1) * 200])
+            escritor.marcar("PRUEBA", bloque)
+
+    assert escritor.total_insertados == len(tablas["hechos_actividad"]) == 1000
+    assert escritor.total_peticiones >= 1000 // 20
+    # Cada marca se confirma con todas las filas agregadas antes de ella ya escritas
+    assert [valor for _, valor, _ in confirmadas] == list(range(5))
+    assert all(escritas >= (valor + 1) * 200 for _, valor, escritas in confirmadas)
+
+
+def test_escritor_async_deja_en_cuarentena_las_filas_con_error():
+    tablas = {}
+    escritor = EscritorHechosAsync("hechos_actividad", tamano_lote=100, max_concurrencia=2,
+                                   cliente=crear_cliente(tablas, max_concurrencia=2))
+    with escritor:
+        escritor.agregar_varios(hechos_prueba(2000))
+
+    assert escritor.total_insertados == 1998
+    assert [registro["fila"]["id_fecha"] for registro in escritor.cuarentena] == [None, None]
+    assert escritor.estadisticas()["cuarentena"] == 2
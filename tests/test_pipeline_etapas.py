@@ -0,0 +1,110 @@
+"""
+Pruebas del pipeline de extracción, transformación y carga en hilos (utils/pipeline_etapas.py).
+"""
+
+import itertools
+import random
+import threading
+import time
+import pytest
+from pulseras_inteligentes.utils.pipeline_etapas import PipelineEtapas, ejecutar_pipeline
+
+
+class ErrorEtapa(Exception):
+    pass
+
+
+@pytest.mark.parametrize("etapa", ["extraccion", "transformacion", "carga", "confirmacion"])
+def test_el_error_de_una_etapa_detiene_el_pipeline_y_se_propaga(etapa):
+    extraidos = []
+
+    def fuente():
+        # Fuente infinita: el pipeline solo termina si se detiene tras el error
+        for elemento in itertools.count():
+            if etapa == "extraccion" and elemento == 5:
+                raise ErrorEtapa(etapa)
+            extraidos.append(elemento)
+            yield elemento
+
+    def transformar(elemento):
+        if etapa == "transformacion" and elemento == 5:
+            raise ErrorEtapa(etapa)
+        return elemento
+
+    def cargar(elemento, indice):
+        if etapa == "carga" and elemento == 5:
+            raise ErrorEtapa(etapa)
+
+    def confirmar(elemento):
+        if etapa == "confirmacion" and elemento == 5:
+            raise ErrorEtapa(etapa)
+
+    with pytest.raises(ErrorEtapa, match=etapa):
+        ejecutar_pipeline(fuente(), transformar, cargar, cargadores=2, tamano_cola=2, al_confirmar=confirmar)
+    assert len(extraidos) < 100
+
+
+def test_las_colas_acotadas_frenan_la_extraccion():
+    tamano_cola, cargadores = 2, 2
+    contador = {"extraidos": 0, "cargados": 0, "max_pendientes": 0}
+    lock = threading.Lock()
+
+    def fuente():
+        for elemento in range(60):
+            with lock:
+                contador["extraidos"] += 1
+                pendientes = contador["extraidos"] - contador["cargados"]
+                contador["max_pendientes"] = max(contador["max_pendientes"], pendientes)
+            yield elemento
+
+    def cargar(elemento, indice):
+        time.sleep(0.005)
+        with lock:
+            contador["cargados"] += 1
+
+    estadisticas = ejecutar_pipeline(fuente(), lambda elemento: elemento, cargar,
+                                     cargadores=cargadores, tamano_cola=tamano_cola)
+
+    # Dos colas llenas, un elemento en cada etapa y uno por hilo de carga
+    assert contador["max_pendientes"] <= 2 * tamano_cola + cargadores + 2
+    assert estadisticas["carga"]["elementos"] == 60
+    assert estadisticas["extraccion"]["segundos_espera"] > 0
+
+
+def test_la_confirmacion_respeta_el_orden_de_extraccion():
+    cargados = set()
+    confirmados = []
+    lock = threading.Lock()
+
+    def cargar(elemento, indice):
+        time.sleep(random.uniform(0, 0.003))
+        with lock:
+            cargados.add(elemento)
+
+    def confirmar(elemento):
+        # Al confirmar un elemento, él y todos los anteriores ya están cargados
+        with lock:
+            assert cargados.issuperset(range(elemento + 1))
+        confirmados.append(elemento)
+
+    ejecutar_pipeline(range(200), lambda elemento: elemento, cargar, cargadores=4, tamano_cola=3,
+                      al_confirmar=confirmar)
+    assert confirmados == list(range(200))
+
+
+def test_la_confirmacion_no_bloquea_a_los_otros_hilos_de_carga():
+    cargado_posterior = threading.Event()
+
+    def cargar(elemento, indice):
+        if elemento == 6:
+            cargado_posterior.set()
+
+    def confirmar(elemento):
+        # Mientras se confirma el primer elemento, otros hilos deben poder seguir cargando
+        if elemento == 0:
+            assert cargado_posterior.wait(timeout=5), "La confirmación bloqueó a los hilos de carga"
+
+    pipeline = PipelineEtapas(range(20), lambda elemento: elemento, cargar, cargadores=2, tamano_cola=2,
+                              al_confirmar=confirmar)
+    estadisticas = pipeline.ejecutar()
+    assert estadisticas["carga"]["elementos"] == 20
@@ -0,0 +1,164 @@
+"""
+Pruebas de la política de reintentos y cuarentena compartida por las escrituras en el Data Warehouse.
+
+Se usa un cliente falso con la interfaz de Supabase (table().insert/upsert().execute()) que falla
+según un guion y rechaza las filas marcadas como inválidas, como haría una restricción de PostgreSQL.
+"""
+
+import asyncio
+import httpx
+import pytest
+from pulseras_inteligentes.utils import reintentos
+from pulseras_inteligentes.utils.carga_lotes import cargar_por_lotes
+from pulseras_inteligentes.utils.escritor_hechos import EscritorHechos
+
+
+class ErrorPostgrest(Exception):
+    """
+    Error con código de PostgREST/PostgreSQL, como los del cliente de Supabase.
+    """
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+class ClienteFalso:
+    """
+    Cliente de Supabase en memoria que lanza los errores de 'fallos' en las primeras peticiones.
+    """
+
+    def __init__(self, fallos=()):
+        self.fallos = list(fallos)
+        self.filas = []
+        self.peticiones = 0
+        self._lote = None
+
+    def table(self, tabla):
+        return self
+
+    def insert(self, filas):
+        self._lote = filas
+        return self
+
+    def upsert(self, filas, **opciones):
+        self._lote = filas
+        return self
+
+    def execute(self):
+        self.peticiones += 1
+        if self.fallos:
+            raise self.fallos.pop(0)
+        if any(fila.get("invalida") for fila in self._lote):
+            raise ErrorPostgrest("23502")
+        self.filas.extend(self._lote)
+
+
+@pytest.fixture(autouse=True)
+def sin_esperas(monkeypatch):
+    monkeypatch.setattr(reintentos.time, "sleep", lambda segundos: None)
+
+
+def filas_prueba(cantidad, invalidas=()):
+    return [{"id": i, "invalida": i in invalidas} for i in range(cantidad)]
+
+
+def test_escritor_reintenta_errores_transitorios_y_escribe():
+    db = ClienteFalso([httpx.ConnectError("sin red"), ErrorPostgrest("40P01")])
+    with EscritorHechos(db, "hechos_prueba", tamano_lote=10) as escritor:
+        escritor.agregar_varios(filas_prueba(10))
+
+    assert len(db.filas) == 10
+    assert escritor.total_reintentos == 2
+    assert escritor.total_peticiones == 3
+    assert escritor.cuarentena == []
+
+
+def test_escritor_propaga_el_error_al_agotar_los_reintentos():
+    db = ClienteFalso([httpx.ConnectError("sin red")] * 4)
+    escritor = EscritorHechos(db, "hechos_prueba", tamano_lote=10, max_reintentos=3)
+    escritor.agregar_varios(filas_prueba(5))
+
+    with pytest.raises(httpx.ConnectError):
+        escritor.flush()
+    assert db.peticiones == 4
+    assert db.filas == []
+    assert escritor.cuarentena == []
+
+
+def test_escritor_aisla_en_cuarentena_solo_las_filas_con_error():
+    db = ClienteFalso()
+    with EscritorHechos(db, "hechos_prueba", tamano_lote=16) as escritor:
+        escritor.agregar_varios(filas_prueba(16, invalidas={3, 11}))
+
+    assert sorted(fila["id"] for fila in db.filas) == [i for i in range(16) if i not in (3, 11)]
+    assert [registro["fila"]["id"] for registro in escritor.cuarentena] == [3, 11]
+    assert all("23502" in registro["error"] for registro in escritor.cuarentena)
+
+
+@pytest.mark.parametrize("error", [
+    ErrorPostgrest(503),
+    httpx.HTTPStatusError("Bad Gateway", request=httpx.Request("POST", "http://dw"),
+                          response=httpx.Response(502)),
+])
+def test_las_respuestas_de_la_pasarela_se_reintentan_sin_dividir_el_lote(error):
+    # Con un cuerpo de error que no es JSON, el cliente de Supabase deja el estado HTTP como code
+    assert reintentos.es_error_transitorio(error)
+
+    db = ClienteFalso([error])
+    with EscritorHechos(db, "hechos_prueba", tamano_lote=10) as escritor:
+        escritor.agregar_varios(filas_prueba(10))
+
+    assert db.peticiones == 2
+    assert len(db.filas) == 10
+    assert escritor.total_reintentos == 1
+    assert escritor.cuarentena == []
+
+    db = ClienteFalso([error] * (reintentos.MAX_REINTENTOS_DEFECTO + 1))
+    with pytest.raises(type(error)):
+        cargar_por_lotes(db, "dim_prueba", filas_prueba(8), on_conflict="id")
+    # Agotados los reintentos se propaga el error sin dividir el lote en filas
+    assert db.peticiones == reintentos.MAX_REINTENTOS_DEFECTO + 1
+    assert db.filas == []
+
+
+def test_carga_lotes_reintenta_errores_transitorios():
+    db = ClienteFalso([ErrorPostgrest("PGRST001")])
+    assert cargar_por_lotes(db, "dim_prueba", filas_prueba(8), on_conflict="id") == (8, 0)
+    assert db.peticiones == 2
+
+
+def test_carga_lotes_propaga_el_error_al_agotar_los_reintentos():
+    db = ClienteFalso([httpx.ReadTimeout("timeout")] * (reintentos.MAX_REINTENTOS_DEFECTO + 1))
+    with pytest.raises(httpx.ReadTimeout):
+        cargar_por_lotes(db, "dim_prueba", filas_prueba(8), on_conflict="id")
+    assert db.filas == []
+
+
+def test_carga_lotes_descarta_solo_las_filas_con_error():
+    db = ClienteFalso()
+    assert cargar_por_lotes(db, "dim_prueba", filas_prueba(9, invalidas={0}), on_conflict="id",
+                            tamano_lote=4) == (8, 1)
+    assert sorted(fila["id"] for fila in db.filas) == list(range(1, 9))
+
+
+def test_biseccion_async_aisla_filas_y_propaga_errores_transitorios():
+    rechazadas = []
+
+    async def enviar(lote):
+        if any(fila["invalida"] for fila in lote):
+            raise ErrorPostgrest("23505")
+
+    enviadas = asyncio.run(reintentos.enviar_con_biseccion_async(
+        enviar, filas_prueba(8, invalidas={5}), "prueba", lambda fila, error: rechazadas.append(fila["id"])
+    ))
+    assert enviadas == 7
+    assert rechazadas == [5]
+
+    async def sin_red(lote):
+        raise httpx.ConnectError("sin red")
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(reintentos.enviar_con_biseccion_async(sin_red, filas_prueba(4), "prueba",
+                                                          lambda fila, error: rechazadas.append(fila["id"])))
+    assert rechazadas == [5]